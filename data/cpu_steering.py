@@ -0,0 +1,341 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script applies the CPU steering plan of the Pi network
+processing : receive and transmit packet steering of each
+interface, interrupts affinity and receive flow steering, so
+that network softirqs stay away from the limenurse daemon CPUs.
+It measures the per CPU softirq load before and after.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from configparser       import ConfigParser
+from glob               import glob
+from os                 import path, cpu_count
+from time               import sleep, monotonic
+from sys                import exit
+from logging            import basicConfig, info, error, INFO
+
+# Steering section options which are not interfaces
+OPTIONS         = ['daemon', 'flow_entries', 'measure']
+
+# Network softirqs of /proc/softirqs
+SOFTIRQS        = ['NET_RX', 'NET_TX']
+
+
+def parse_cpus(cpus) :
+    """
+    Return the sorted CPU numbers of a list, such as 1-2,3.
+
+    Parameters:
+    - cpus: comma separated CPU numbers and ranges.
+    """
+    result = set()
+    for part in cpus.split(',') :
+        part = part.strip()
+        if len(part) == 0 : continue
+        first, separator, last = part.partition('-')
+        result.update(range(int(first), int(last if separator else first) + 1))
+    result = sorted(result)
+    return result
+
+
+def cpu_mask(cpus) :
+    """Return the sysfs hexadecimal mask of CPU numbers."""
+    result = f'{sum(1 << cpu for cpu in cpus):x}'
+    return result
+
+
+def read_softirqs(proc='/proc') :
+    """
+    Return the network softirq counts of each CPU, indexed by softirq.
+
+    Parameters:
+    - proc: proc filesystem mount point.
+    """
+    result = {}
+    with open(path.join(proc, 'softirqs'), 'r', encoding='utf-8') as f :
+        for line in f :
+            fields = line.split()
+            if len(fields) > 1 and fields[0].rstrip(':') in SOFTIRQS :
+                result[fields[0].rstrip(':')] = [int(count) for count in fields[1:]]
+    return result
+
+
+def softirq_load(duration, proc='/proc') :
+    """
+    Return the network softirqs raised per second on each CPU over a duration, indexed by softirq.
+
+    Parameters:
+    - duration: sampling duration in seconds.
+    - proc: proc filesystem mount point.
+    """
+    started = monotonic()
+    before = read_softirqs(proc)
+    sleep(duration)
+    after = read_softirqs(proc)
+    elapsed = monotonic() - started
+    result = { softirq : [(last - first) / elapsed for first, last in zip(before[softirq], counts)] for softirq, counts in after.items() }
+    return result
+
+
+def log_load(title, load, daemon) :
+    """
+    Log a softirq load per CPU, and the share of it landing on the daemon CPUs.
+
+    Parameters:
+    - title: name of the sample.
+    - load: softirqs per second of each CPU, indexed by softirq.
+    - daemon: CPUs of the limenurse daemon.
+    """
+    for cpu in range(len(load[SOFTIRQS[0]])) :
+        info(f"{title} - CPU{cpu}{' (daemon)' if cpu in daemon else ''} : " + ', '.join(f'{softirq} {load[softirq][cpu]:.0f}/s' for softirq in SOFTIRQS))
+    total = sum(sum(load[softirq]) for softirq in SOFTIRQS)
+    shared = sum(load[softirq][cpu] for softirq in SOFTIRQS for cpu in daemon if cpu < len(load[softirq]))
+    info(f"{title} - {shared / total * 100 if total > 0 else 0:.1f}% of the network softirqs on the daemon CPUs")
+
+
+class CpuSteering :
+    """
+    Apply and check the CPU steering plan.
+
+    The gadget interfaces share one USB device controller interrupt, and the
+    Limelights one USB host controller interrupt : without steering, all
+    their packets are processed on the CPU taking the interrupt, the same
+    one as the daemon forwarding them in the worst case. The plan gives each
+    interrupt and each interface its CPUs. Receive packet steering moves the
+    protocol processing of the packets received on an interface to its CPUs,
+    transmit packet steering picks the queue of the sending CPU, and receive
+    flow steering follows the CPU of the socket reading a flow. The daemon
+    CPUs shall be used by no interface nor interrupt. As for the routing
+    ruleset, the live values are compared to the plan, and only the differing
+    ones are written.
+    """
+
+    def __init__(self, sys='/sys', proc='/proc') :
+        """
+        Initialize an empty plan.
+
+        Parameters:
+        - sys: sys filesystem mount point.
+        - proc: proc filesystem mount point.
+        """
+        self.__sys = sys
+        self.__proc = proc
+        self.__daemon = []
+        self.__interfaces = {}
+        self.__irqs = {}
+        self.__flow_entries = 0
+        self.__measure = 0
+        self.__is_ready = False
+
+    def configure(self, sections, cpus=None) :
+        """
+        Configure the plan. Return False if it is invalid.
+
+        Parameters:
+        - sections: steering plan, with
+            - steering: daemon CPUs, CPUs of each interface, flow_entries and measure
+            - irqs: CPUs of the interrupts whose name contains each pattern
+        - cpus: number of CPUs of the Pi, None to read it from the kernel.
+        """
+
+        result = True
+
+        if cpus is None : cpus = cpu_count()
+        steering = sections['steering'] if sections.has_section('steering') else sections[sections.default_section]
+        irqs = sections['irqs'] if sections.has_section('irqs') else {}
+
+        try :
+            self.__daemon = parse_cpus(steering.get('daemon', ''))
+            self.__interfaces = { interface : parse_cpus(value) for interface, value in steering.items() if interface not in OPTIONS }
+            self.__irqs = { pattern : parse_cpus(value) for pattern, value in irqs.items() }
+            self.__flow_entries = steering.getint('flow_entries', 0)
+            self.__measure = steering.getfloat('measure', 0)
+        except ValueError as e :
+            error(f"Invalid CPU steering plan : {e}")
+            return False
+
+        for name, used in list(self.__interfaces.items()) + [(f'interrupts {pattern}', cpus) for pattern, cpus in self.__irqs.items()] :
+            if len(used) == 0 or max(used) >= cpus :
+                error(f"CPUs of {name} shall be between 0 and {cpus - 1}")
+                result = False
+            elif len(set(used) & set(self.__daemon)) > 0 :
+                error(f"{name} shall not use the daemon CPUs {','.join(str(cpu) for cpu in self.__daemon)}")
+                result = False
+        if len(self.__daemon) > 0 and max(self.__daemon) >= cpus :
+            error(f"Daemon CPUs shall be between 0 and {cpus - 1}")
+            result = False
+
+        self.__is_ready = result
+        return result
+
+    def daemon(self) :
+        """Return the CPUs of the limenurse daemon."""
+        return list(self.__daemon)
+
+    def measure(self) :
+        """Return the duration in seconds of the softirq load sampling, 0 to skip it."""
+        return self.__measure
+
+    def plan(self) :
+        """
+        Return the values of the plan, indexed by the sysfs or procfs file they are written to,
+        for the interfaces and interrupts present on the Pi.
+        """
+
+        result = {}
+
+        for interface, cpus in self.__interfaces.items() :
+            queues = path.join(self.__sys, 'class', 'net', interface, 'queues')
+            receive = sorted(glob(path.join(queues, 'rx-*')))
+            for queue in receive :
+                result[path.join(queue, 'rps_cpus')] = cpu_mask(cpus)
+                result[path.join(queue, 'rps_flow_cnt')] = str(self.__flow_entries // len(receive))
+            for queue in sorted(glob(path.join(queues, 'tx-*'))) :
+                if path.exists(path.join(queue, 'xps_cpus')) : result[path.join(queue, 'xps_cpus')] = cpu_mask(cpus)
+
+        result[path.join(self.__proc, 'sys', 'net', 'core', 'rps_sock_flow_entries')] = str(self.__flow_entries)
+
+        for irq, name in self.__interrupts() :
+            for pattern, cpus in self.__irqs.items() :
+                if pattern in name :
+                    result[path.join(self.__proc, 'irq', irq, 'smp_affinity_list')] = ','.join(str(cpu) for cpu in cpus)
+                    break
+
+        return result
+
+    def diff(self, plan) :
+        """
+        Return the files of a plan whose live value differs from the planned one.
+
+        Parameters:
+        - plan: values indexed by file, as returned by plan.
+        """
+        result = []
+        for filename, value in plan.items() :
+            if self.__normalize(filename, self.__read(filename)) != self.__normalize(filename, value) :
+                result.append(filename)
+        return result
+
+    def check(self) :
+        """Compare the live steering to the plan, logging the drift. Return True if they match."""
+
+        result = False
+
+        if self.__is_ready :
+            plan = self.plan()
+            drift = self.diff(plan)
+            for filename in drift :
+                error(f"CPU steering drift : {filename} is {self.__read(filename)} instead of {plan[filename]}")
+            if len(drift) == 0 :
+                info("CPU steering up to date")
+            result = len(drift) == 0
+
+        return result
+
+    def apply(self, dry_run=False) :
+        """
+        Write the plan values which differ from the live ones. Return True if they all could be written.
+
+        Parameters:
+        - dry_run: True to log the values without writing them.
+        """
+
+        result = False
+
+        if self.__is_ready :
+            result = True
+            plan = self.plan()
+            for filename in self.diff(plan) :
+                if dry_run :
+                    info(f"CPU steering : {filename} = {plan[filename]}")
+                    continue
+                try :
+                    with open(filename, 'w', encoding='utf-8') as f :
+                        f.write(plan[filename] + '\n')
+                    info(f"CPU steering : {filename} set to {plan[filename]}")
+                except OSError as e :
+                    # Some interrupts, such as chained ones, cannot be moved
+                    error(f"Failed to set {filename} to {plan[filename]} : {e}")
+                    result = False
+
+        return result
+
+    def __interrupts(self) :
+        """Return the (number, name) of the interrupts of the Pi, the name being the columns after the counts."""
+        result = []
+        filename = path.join(self.__proc, 'interrupts')
+        if path.exists(filename) :
+            with open(filename, 'r', encoding='utf-8') as f :
+                lines = f.read().splitlines()
+            cpus = len(lines[0].split()) if len(lines) > 0 else 0
+            for line in lines[1:] :
+                fields = line.split()
+                if len(fields) > 0 and fields[0].rstrip(':').isdigit() :
+                    result.append((fields[0].rstrip(':'), ' '.join(fields[1 + cpus:])))
+        return result
+
+    @staticmethod
+    def __read(filename) :
+        """Return the content of a file, None if it cannot be read."""
+        result = None
+        try :
+            with open(filename, 'r', encoding='utf-8') as f :
+                result = f.read().strip()
+        except OSError :
+            pass
+        return result
+
+    @staticmethod
+    def __normalize(filename, value) :
+        """Return a value in a comparable form : masks as numbers, CPU lists as sets."""
+        result = value
+        if value is None : return result
+        if filename.endswith('_cpus') : result = int(value.replace(',', ''), 16)
+        elif filename.endswith('smp_affinity_list') : result = parse_cpus(value)
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    # Command-line interface to select the action and the steering plan
+    parser = ArgumentParser(description="Limelight network CPU steering")
+    parser.add_argument("action", choices=["check", "apply", "report", "option"], help="Check the live steering drift, apply the plan, measure the softirq load, or print the daemon CPUs")
+    parser.add_argument("--config", dest="config", default="/etc/limenurse/steering.ini", help="Steering plan file")
+    parser.add_argument("--duration", dest="duration", type=float, default=None, help="Softirq load sampling duration in seconds, the plan measure by default")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Log the values to write without writing them")
+
+    args = parser.parse_args()
+
+    # Interrupt patterns and interface names are case sensitive
+    sections = ConfigParser()
+    sections.optionxform = str
+    sections.read(args.config)
+
+    # The load report only needs the daemon CPUs, it measures any plan, even one this Pi cannot apply
+    steering = CpuSteering()
+    if not steering.configure(sections) and args.action != "report" :
+        exit(1)
+
+    duration = args.duration if args.duration is not None else steering.measure()
+    if args.action == "check" :
+        exit(0 if steering.check() else 1)
+    elif args.action == "option" :
+        print(','.join(str(cpu) for cpu in steering.daemon()))
+    elif args.action == "report" :
+        log_load("Softirq load", softirq_load(duration or 1), steering.daemon())
+    else :
+        if duration > 0 and not args.dry_run : log_load("Before steering", softirq_load(duration), steering.daemon())
+        result = steering.apply(dry_run=args.dry_run)
+        if duration > 0 and not args.dry_run : log_load("After steering", softirq_load(duration), steering.daemon())
+        exit(0 if result else 1)
@@ -0,0 +1,51 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module defines the interface implemented by the plugins
+hosted by the LimeNurse daemon. All plugins run on the daemon
+asyncio event loop and share its interface state service and
+metrics registry.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+
+class DaemonPlugin :
+    """
+    Base class of LimeNurse plugins.
+
+    The daemon calls configure() once, then start() until it succeeds with
+    an increasing delay between attempts, then stop() on exit. Plugins
+    shall never block the event loop.
+    """
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the plugin.
+
+        Parameters:
+        - options: configparser section holding the plugin options.
+        - interfaces: InterfaceMonitor shared by all plugins.
+        - metrics: MetricsRegistry shared by all plugins.
+        """
+        raise NotImplementedError()
+
+    async def start(self) :
+        """
+        Acquire the plugin resources.
+        Return True once the plugin is fully operational. A plugin returning
+        False shall have released what it could acquire, since start() will
+        be called again later.
+        """
+        return True
+
+    async def stop(self) :
+        """Release the plugin resources."""
+
+    def is_alive(self) :
+        """Return False if the plugin is stuck and the daemon shall be restarted."""
+        return True
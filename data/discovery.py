@@ -0,0 +1,160 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the Limelight discovery optimizations
+used by the UDP forwarder plugin.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from re                 import compile as regex, escape
+
+
+class DiscoveryCoalescer :
+    """
+    Merge identical discovery requests received from several clients.
+
+    The first request of a kind is sent to the limelight, identical requests
+    arriving within the coalescing window only register their sender, so
+    that the single limelight answer is delivered to all of them.
+    """
+
+    def __init__(self, window, timeout):
+        """
+        Initialize the coalescer.
+
+        Parameters:
+        - window: delay in seconds during which identical requests are merged, 0 to disable merging.
+        - timeout: delay in seconds during which requesters wait for answers.
+        """
+        self.__window = window
+        self.__timeout = timeout
+
+        # Last time each kind of request was sent to the limelight
+        self.__sent = {}
+
+        # Clients waiting for an answer : (interface, ip) -> time of their last request
+        self.__requesters = {}
+
+    def request(self, payload, requester, now) :
+        """
+        Register a discovery request.
+        Return True if the request shall be sent to the limelight, False if an
+        identical one was sent recently enough for its answer to be shared.
+
+        Parameters:
+        - payload: request datagram content.
+        - requester: (interface, ip) of the client asking, None for a request whose answer is not awaited by any client.
+        - now: current monotonic time.
+        """
+        result = True
+        if requester is not None : self.__requesters[requester] = now
+        sent = self.__sent.get(payload)
+        if sent is not None and now - sent <= self.__window :
+            result = False
+        else :
+            self.__sent[payload] = now
+        return result
+
+    def requesters(self, now) :
+        """
+        Return the set of (interface, ip) clients waiting for a discovery answer.
+
+        Parameters:
+        - now: current monotonic time.
+        """
+        for requester, asked in list(self.__requesters.items()) :
+            if now - asked > self.__timeout : del self.__requesters[requester]
+        for payload, sent in list(self.__sent.items()) :
+            if now - sent > self.__window : del self.__sent[payload]
+        return set(self.__requesters.keys())
+
+
+class DiscoveryCache :
+    """
+    Remember the limelight discovery answer, so that the Pi can answer
+    discovery requests by itself while the limelight is known to be up.
+
+    Answers are rewritten once per source interface when they are learnt,
+    replacing the limelight address with the gateway address the clients of
+    this interface use to reach it.
+    """
+
+    def __init__(self, ttl, limelight, gateways):
+        """
+        Initialize the cache.
+
+        Parameters:
+        - ttl: delay in seconds during which a learnt answer, and the last limelight traffic, stay valid. 0 disables the cache.
+        - limelight: limelight IP address.
+        - gateways: dictionary of the gateway IP address indexed by source interface.
+        """
+        self.__ttl = ttl
+        # Whole address only : 172.29.0.1 shall not match the start of 172.29.0.10
+        self.__limelight = regex(rb'(?<![\d.])' + escape(limelight.encode('ascii')) + rb'(?![\d.])')
+        self.__gateways = { interface : gateway.encode('ascii') for interface, gateway in gateways.items() }
+
+        self.__answers = {}
+        self.__learnt = None
+        self.__seen = None
+
+    def is_enabled(self) :
+        """Return True if the cache is in use."""
+        return self.__ttl > 0
+
+    def store(self, payload, now) :
+        """
+        Learn a discovery answer from the limelight.
+
+        Parameters:
+        - payload: answer datagram content.
+        - now: current monotonic time.
+        """
+        self.__answers = { interface : self.rewrite(interface, payload) for interface in self.__gateways }
+        self.__learnt = now
+        self.__seen = now
+
+    def rewrite(self, interface, payload) :
+        """
+        Return a discovery answer with the limelight address replaced by the gateway address of a source interface.
+
+        Parameters:
+        - interface: source interface the answer is sent on.
+        - payload: answer datagram content.
+        """
+        result = self.__limelight.sub(self.__gateways[interface], payload)
+        return result
+
+    def seen(self, now) :
+        """
+        Record traffic from the limelight, proving it is still up.
+
+        Parameters:
+        - now: current monotonic time.
+        """
+        self.__seen = now
+
+    def answer(self, interface, now) :
+        """
+        Return the answer to send to a client of the given interface, or None
+        if no answer is known or if the limelight was not heard of recently.
+
+        Parameters:
+        - interface: source interface of the discovery request.
+        - now: current monotonic time.
+        """
+        result = None
+        if self.__learnt is not None and now - self.__learnt <= self.__ttl and now - self.__seen <= self.__ttl :
+            result = self.__answers.get(interface)
+        return result
+
+    def clear(self) :
+        """Forget the learnt answer, typically when the limelight link goes down."""
+        self.__answers = {}
+        self.__learnt = None
+        self.__seen = None
@@ -0,0 +1,142 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements a minimal unicast DNS server, answering
+the published names on an interface gateway address for the
+clients which do not resolve them through mDNS.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop
+from struct             import pack, unpack_from, error as struct_error
+from socket             import socket, inet_aton, AF_INET, SOCK_DGRAM
+from time               import perf_counter
+from logging            import info, error, debug
+
+# Local includes
+from mdns_probe         import decode_name, TYPE_A, CLASS_IN
+
+TYPE_ANY        = 255
+FLAGS_QUERY     = 0x8000
+FLAGS_OPCODE    = 0x7800
+FLAGS_RECURSION = 0x0100
+FLAGS_ANSWER    = 0x8400
+RCODE_REFUSED   = 5
+
+
+class UnicastDnsServer :
+    """
+    Answer the A queries for the published names with their address among
+    those of the interface the server is bound to. Other queries are refused, nothing
+    is forwarded upstream.
+    """
+
+    def __init__(self, interface, ip, names, metrics, ttl=10, port=53):
+        """
+        Initialize the server.
+
+        Parameters:
+        - interface: interface on which the server answers.
+        - ip: IPv4 address of the interface, on which the server listens.
+        - names: dictionary of the IPv4 address to answer, indexed by name.
+        - metrics: shared metrics registry.
+        - ttl: time to live in seconds of the answers, short so that address changes propagate quickly.
+        - port: UDP port to listen on.
+        """
+        self.__interface = interface
+        self.__ip = ip
+        self.__port = port
+        self.__socket = None
+
+        # Answer record, indexed by lowercase name. The name is a pointer to the question, at offset 12
+        self.__table = {}
+        for name, address in names.items() :
+            self.__table[name.rstrip('.').lower()] = b'\xc0\x0c' + pack('!HHIH', TYPE_A, CLASS_IN, ttl, 4) + inet_aton(address)
+
+        self.__statistics = {}
+        for counter in ['queries', 'answers', 'refused'] :
+            self.__statistics[counter] = metrics.counter('resolver_dns_' + counter, interface=interface)
+        self.__latency = metrics.summary('resolver_dns_answer_latency_seconds', interface=interface)
+
+    def start(self) :
+        """Open the server socket. Return False if the port is not available."""
+
+        result = True
+
+        try :
+            self.__socket = socket(AF_INET, SOCK_DGRAM)
+            self.__socket.bind((self.__ip, self.__port))
+            self.__socket.setblocking(False)
+            get_running_loop().add_reader(self.__socket.fileno(), self.__receive)
+            info(f"Serving DNS on {self.__ip}:{self.__port} for {', '.join(self.__table.keys())}")
+        except OSError as e :
+            error(f"Failed to serve DNS on {self.__ip}:{self.__port} : {e}")
+            if self.__socket is not None : self.__socket.close()
+            self.__socket = None
+            result = False
+
+        return result
+
+    def stop(self) :
+        """Close the server socket."""
+        if self.__socket is not None :
+            get_running_loop().remove_reader(self.__socket.fileno())
+            self.__socket.close()
+        self.__socket = None
+
+    def __receive(self) :
+        """Answer the pending queries."""
+        while self.__socket is not None :
+            try :
+                packet, sender = self.__socket.recvfrom(4096)
+            except BlockingIOError :
+                break
+            except OSError as e :
+                error(f"DNS reception failed on {self.__interface} : {e}")
+                break
+
+            try :
+                received = perf_counter()
+                answer = self.__answer(packet)
+                if answer is not None :
+                    self.__socket.sendto(answer, sender)
+                    self.__latency.observe(perf_counter() - received)
+            except (IndexError, ValueError, struct_error) :
+                debug(f"Malformed DNS query from {sender[0]} on {self.__interface}")
+            except OSError as e :
+                error(f"Failed to answer DNS query from {sender[0]} on {self.__interface} : {e}")
+
+    def __answer(self, packet) :
+        """Return the response to a query, or None if the packet shall be ignored."""
+
+        result = None
+
+        identifier, flags, questions = unpack_from('!HHH', packet)
+        if flags & (FLAGS_QUERY | FLAGS_OPCODE) == 0 and questions == 1 :
+
+            self.__statistics['queries'].inc()
+
+            name, offset = decode_name(packet, 12)
+            kind, klass = unpack_from('!HH', packet, offset)
+            question = packet[12:offset + 4]
+            record = self.__table.get(name)
+            flags = FLAGS_ANSWER | (flags & FLAGS_RECURSION)
+
+            if record is None :
+                # Not ours, and no recursion
+                result = pack('!HHHHHH', identifier, (flags & ~0x0400) | RCODE_REFUSED, 1, 0, 0, 0) + question
+                self.__statistics['refused'].inc()
+            elif kind in (TYPE_A, TYPE_ANY) :
+                result = pack('!HHHHHH', identifier, flags, 1, 1, 0, 0) + question + record
+                self.__statistics['answers'].inc()
+            else :
+                # Name exists, with no record of this type
+                result = pack('!HHHHHH', identifier, flags, 1, 0, 0, 0) + question
+
+        return result
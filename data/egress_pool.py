@@ -0,0 +1,120 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the pool of connected UDP sockets used
+by the UDP forwarder plugin to send packets out.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from collections        import OrderedDict
+from socket             import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, SO_REUSEADDR, SO_BINDTODEVICE
+
+
+class EgressSocketPool :
+    """
+    Keep one connected UDP socket per destination (interface, ip, port).
+
+    Sockets are bound to their egress interface and connected to their
+    destination when first needed, so that sending a packet needs neither
+    an address parse nor a route lookup. The least recently used socket is
+    closed when the pool is full, and sockets unused for too long are closed
+    as well.
+    """
+
+    def __init__(self, capacity, idle_timeout, port=None):
+        """
+        Initialize an empty pool.
+
+        Parameters:
+        - capacity: maximal number of sockets kept open.
+        - idle_timeout: delay in seconds after which an unused socket is closed.
+        - port: local port the sockets are bound to, None for an ephemeral port.
+        """
+        self.__capacity = capacity
+        self.__idle_timeout = idle_timeout
+        self.__port = port
+
+        # Sockets and their last use, indexed by (interface, ip, port), least recently used first
+        self.__sockets = OrderedDict()
+
+    def __len__(self) :
+        """Return the number of open sockets."""
+        return len(self.__sockets)
+
+    def send(self, interface, ip, port, data, now) :
+        """
+        Send a datagram to a destination through an interface.
+
+        Parameters:
+        - interface: egress interface.
+        - ip: destination IP address.
+        - port: destination UDP port.
+        - data: datagram content.
+        - now: current monotonic time.
+        """
+        key = (interface, ip, port)
+        self.__expire(now, key not in self.__sockets)
+        entry = self.__sockets.get(key)
+        if entry is None :
+            entry = [self.__open(interface, ip, port), now]
+            self.__sockets[key] = entry
+        else :
+            entry[1] = now
+            self.__sockets.move_to_end(key)
+
+        try :
+            entry[0].send(data)
+        except ConnectionRefusedError :
+            # Error reported by an ICMP unreachable about a previous datagram, the current one was not sent
+            entry[0].send(data)
+        except OSError :
+            self.__close(key)
+            raise
+
+    def flush(self, interface=None) :
+        """
+        Close the sockets of an interface, typically when its address changes or when it goes down.
+
+        Parameters:
+        - interface: interface whose sockets shall be closed, None for all the sockets.
+        """
+        for key in [key for key in self.__sockets if interface is None or key[0] == interface] :
+            self.__close(key)
+
+    def __open(self, interface, ip, port) :
+        """Create a socket bound to an interface and connected to a destination."""
+        sock = socket(AF_INET, SOCK_DGRAM)
+        try :
+            sock.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+            sock.setsockopt(SOL_SOCKET, SO_BINDTODEVICE, interface.encode('ascii'))
+            if self.__port is not None :
+                sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+                sock.bind(('0.0.0.0', self.__port))
+            sock.setblocking(False)
+            sock.connect((ip, port))
+        except Exception :
+            sock.close()
+            raise
+        return sock
+
+    def __expire(self, now, opening) :
+        """
+        Close the sockets unused for too long and, when a socket is about to
+        be opened, the least recently used ones beyond the pool capacity.
+        Sockets are ordered by last use, so only the oldest ones are checked.
+        """
+        while len(self.__sockets) > 0 :
+            key, (sock, used) = next(iter(self.__sockets.items()))
+            if now - used <= self.__idle_timeout and (not opening or len(self.__sockets) < self.__capacity) : break
+            self.__close(key)
+
+    def __close(self, key) :
+        """Close and forget a socket."""
+        sock, used = self.__sockets.pop(key)
+        sock.close()
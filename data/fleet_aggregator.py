@@ -0,0 +1,231 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script aggregates the metrics reported by the LimeNurse
+Pis of a robot fleet, and displays them top-style, one line
+per robot. It runs on the laptop plugged on the robots switch,
+with python only.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from json               import dump
+from os                 import replace
+from select             import select
+from socket             import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR
+from sys                import stdout, exit
+from time               import monotonic
+from logging            import basicConfig, error, INFO
+
+# Local includes
+from fleet_reporter     import decode, FLEET_PORT
+
+# Metrics displayed by default, each column summing the metric over all its labels
+COLUMNS         = [
+    ('forwarder_packets_forwarded', 'UDP FWD/s', True),
+    ('forwarder_packets_out_of_scope', 'SCOPED/s', True),
+    ('accounting_bytes', 'Mbit/s', True),
+    ('guard_latency_seconds', 'LINK ms', False),
+    ('guard_video_rate_bits', 'VIDEO Mbit/s', False),
+]
+
+
+def total(metrics, name) :
+    """
+    Return the sum of a metric over all its labels, None if the robot does not report it.
+
+    Parameters:
+    - metrics: metrics snapshot of a robot.
+    - name: metric name.
+    """
+    result = None
+    for key, value in metrics.items() :
+        if key == name or key.startswith(name + '{') :
+            if isinstance(value, dict) : value = value.get('sum', 0)
+            result = (result or 0) + value
+    return result
+
+
+class Robot :
+    """Last reports of a robot of the fleet."""
+
+    __slots__ = ('robot', 'host', 'address', 'received', 'previous', 'current', 'reports', 'lost')
+
+    def __init__(self, robot, host, address):
+        """
+        Initialize the robot with no report.
+
+        Parameters:
+        - robot: robot id.
+        - host: Pi host name.
+        - address: address the reports come from.
+        """
+        self.robot = robot
+        self.host = host
+        self.address = address
+        self.received = None
+        self.previous = None
+        self.current = None
+        self.reports = 0
+        self.lost = 0
+
+
+class FleetAggregator :
+    """
+    Collect the robots reports.
+
+    The latest two reports of each robot are kept, so that counters are shown
+    as rates. Lost reports are counted from the gaps of the report sequence
+    numbers, and a robot whose reports stopped is shown as stale.
+    """
+
+    def __init__(self, stale=15.0) :
+        """
+        Initialize the aggregator with no robot.
+
+        Parameters:
+        - stale: delay in seconds without report after which a robot is shown as stale.
+        """
+        self.__stale = stale
+        self.__robots = {}
+        self.__rejected = 0
+
+    def receive(self, payload, address, now) :
+        """
+        Record a report datagram. Return the robot it comes from, None if it is not a report.
+
+        Parameters:
+        - payload: datagram content.
+        - address: address the datagram comes from.
+        - now: reception time, monotonic.
+        """
+
+        result = None
+
+        report = decode(payload)
+        if report is None :
+            self.__rejected += 1
+            return result
+
+        key = str(report['robot'])
+        robot = self.__robots.get(key)
+        if robot is None or (robot.current is not None and report['sequence'] <= robot.current['sequence']) :
+            # New robot, or its daemon restarted with a new sequence
+            robot = Robot(key, report.get('host', ''), address)
+            self.__robots[key] = robot
+        elif robot.current is not None :
+            robot.lost += report['sequence'] - robot.current['sequence'] - 1
+
+        robot.host = report.get('host', robot.host)
+        robot.address = address
+        robot.previous = robot.current
+        robot.current = report
+        robot.received = now
+        robot.reports += 1
+        result = robot
+
+        return result
+
+    def robots(self) :
+        """Return the robots, sorted by id."""
+        return [self.__robots[key] for key in sorted(self.__robots, key=lambda key : (len(key), key))]
+
+    def merged(self) :
+        """Return the metrics of all the robots in one snapshot, each metric labelled with its robot."""
+        result = {}
+        for robot in self.robots() :
+            for key, value in robot.current['metrics'].items() :
+                name, brace, labels = key.partition('{')
+                label = f'robot="{robot.robot}"'
+                result[f'{name}{{{label},{labels}' if brace else f'{name}{{{label}}}'] = value
+        return result
+
+    def render(self, now) :
+        """
+        Return the table of the robots.
+
+        Parameters:
+        - now: display time, monotonic.
+        """
+
+        lines = [f'Fleet of {len(self.__robots)} robots, {self.__rejected} invalid datagrams',
+                 '',
+                 f'{"ROBOT":<6} {"HOST":<16} {"ADDRESS":<15} {"AGE":>5} {"LOST":>5} ' + ' '.join(f'{title:>12}' for name, title, rate in COLUMNS)]
+        for robot in self.robots() :
+            age = now - robot.received
+            cells = []
+            for name, title, rate in COLUMNS :
+                value = self.__value(robot, name, rate)
+                cells.append(f'{"-":>12}' if value is None else f'{value:>12.1f}')
+            stale = ' stale' if age > self.__stale else ''
+            lines.append(f'{robot.robot:<6} {robot.host[:16]:<16} {robot.address:<15} {age:>5.0f} {robot.lost:>5} ' + ' '.join(cells) + stale)
+
+        result = '\n'.join(lines)
+        return result
+
+    @staticmethod
+    def __value(robot, name, rate) :
+        """Return a column value of a robot : a counter rate between its last two reports, or a gauge in display units."""
+
+        result = total(robot.current['metrics'], name)
+        if result is None : return result
+
+        if rate :
+            if robot.previous is None : return None
+            before = total(robot.previous['metrics'], name) or 0
+            result = (result - before) / max(robot.current['time'] - robot.previous['time'], 1e-3)
+        if name.endswith('_bytes') : result = result * 8 / 1e6
+        elif name.endswith('_bits') : result = result / 1e6
+        elif name.endswith('_seconds') : result = result * 1000
+
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    parser = ArgumentParser(description='Display the metrics of the LimeNurse robots of the fleet')
+    parser.add_argument('--port', type=int, default=FLEET_PORT, help='UDP port the robots report to')
+    parser.add_argument('--interval', type=float, default=5.0, help='Delay in seconds between two refreshes')
+    parser.add_argument('--stale', type=float, default=15.0, help='Delay in seconds without report after which a robot is stale')
+    parser.add_argument('--export', default=None, help='Json file receiving the merged metrics of all the robots at each refresh')
+    parser.add_argument('--count', type=int, default=0, help='Number of refreshes, 0 to run until interrupted')
+    arguments = parser.parse_args()
+
+    aggregator = FleetAggregator(arguments.stale)
+    try :
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        sock.bind(('', arguments.port))
+    except OSError as e :
+        error(f"Failed to listen on port {arguments.port} : {e}")
+        exit(1)
+
+    try :
+        refreshes = 0
+        refresh = monotonic() + arguments.interval
+        while arguments.count == 0 or refreshes < arguments.count :
+            readable, writable, errors = select([sock], [], [], max(0, refresh - monotonic()))
+            if len(readable) > 0 :
+                payload, address = sock.recvfrom(65535)
+                aggregator.receive(payload, address[0], monotonic())
+                continue
+            refresh = monotonic() + arguments.interval
+            # Clear the terminal between refreshes, as top does
+            print(('\033[H\033[2J' if stdout.isatty() else '') + aggregator.render(monotonic()), flush=True)
+            if arguments.export is not None :
+                with open(arguments.export + '.tmp', 'w', encoding='utf-8') as f :
+                    dump(aggregator.merged(), f, indent=1, sort_keys=True)
+                replace(arguments.export + '.tmp', arguments.export)
+            refreshes += 1
+    except KeyboardInterrupt :
+        pass
+    finally :
+        sock.close()
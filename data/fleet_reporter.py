@@ -0,0 +1,197 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This plugin reports the daemon metrics of a robot of the
+fleet over UDP, so that a laptop plugged on the switch of
+several robots follows all of them from one aggregator.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, sleep
+from json               import dumps, loads
+from socket             import socket, gethostname, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, SO_BINDTODEVICE
+from time               import time, perf_counter
+from zlib               import compress, decompress, error as CompressionError
+from logging            import info, error
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+
+# UDP port the fleet aggregator listens to, outside of the Limelight ports
+FLEET_PORT      = 5890
+
+# Version of the report format, reports of another version being ignored by the aggregator
+VERSION         = 1
+
+# Largest UDP payload of an IPv4 datagram
+MAX_REPORT      = 65507
+
+
+def encode(robot, host, sequence, metrics) :
+    """
+    Return a report datagram : compressed json of the robot identity and its metrics snapshot.
+
+    Parameters:
+    - robot: robot id.
+    - host: Pi host name.
+    - sequence: report number, for the aggregator to count the lost ones.
+    - metrics: metrics snapshot, values indexed by metric identifier.
+    """
+    result = compress(dumps({ 'version' : VERSION, 'robot' : robot, 'host' : host, 'sequence' : sequence,
+                              'time' : time(), 'metrics' : metrics }, separators=(',', ':')).encode('utf-8'))
+    return result
+
+
+def decode(payload) :
+    """
+    Return the report carried by a datagram, None if it is not a valid report of this version.
+
+    Parameters:
+    - payload: datagram content.
+    """
+    result = None
+    try :
+        report = loads(decompress(payload).decode('utf-8'))
+        # The aggregator counts the lost reports from the sequence and computes the rates from the time, booleans are not numbers there
+        if isinstance(report, dict) and report.get('version') == VERSION and 'robot' in report and isinstance(report.get('metrics'), dict) and \
+           type(report.get('sequence')) is int and type(report.get('time')) in (int, float) :
+            result = report
+    except (ValueError, CompressionError) :
+        pass
+    return result
+
+
+class FleetReporter(DaemonPlugin) :
+    """
+    Send the daemon metrics to the fleet aggregator periodically.
+
+    Each report is a single compressed datagram carrying the robot id and
+    the whole metrics snapshot, broadcast on the laptop switch by default, so
+    that any laptop running the aggregator collects every robot without
+    configuration. Reports are sent from a socket bound to the laptop
+    interface, and never reach the Limelights : the UDP forwarder of the other
+    robots leaves the fleet port alone.
+    """
+
+    def __init__(self):
+        """Initialize the reporter with no socket."""
+        self.__is_running = False
+        self.__task = None
+        self.__socket = None
+
+        self.__robot = None
+        self.__host = gethostname()
+        self.__interface = 'eth0'
+        self.__collector = ('255.255.255.255', FLEET_PORT)
+        self.__period = 5.0
+        self.__sequence = 0
+
+        self.__statistics = {}
+        self.__metrics = None
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the reporter.
+
+        Parameters:
+        - options: fleet section, with
+            - robot: robot id
+            - interface: interface the reports are sent on
+            - collector: address:port the reports are sent to, the aggregator one or a broadcast
+            - period: delay in seconds between two reports
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
+        """
+
+        self.__robot = options.get('robot')
+        self.__interface = options.get('interface', 'eth0')
+        address, port = options.get('collector', f'255.255.255.255:{FLEET_PORT}').strip().split(':')
+        self.__collector = (address, int(port))
+        self.__period = options.getfloat('period', 5.0)
+
+        self.__metrics = metrics
+        for counter in ['reports', 'errors', 'oversized'] :
+            self.__statistics[counter] = metrics.counter('fleet_' + counter)
+        self.__statistics['size'] = metrics.gauge('fleet_report_bytes')
+
+    async def start(self) :
+        """Open the reporting socket and start reporting. Return False while the interface is missing."""
+
+        result = True
+
+        info("Starting fleet reporter")
+
+        try :
+            self.__socket = socket(AF_INET, SOCK_DGRAM)
+            self.__socket.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+            self.__socket.setsockopt(SOL_SOCKET, SO_BINDTODEVICE, self.__interface.encode('ascii'))
+            self.__socket.setblocking(False)
+        except OSError as e :
+            error(f"Failed to open fleet reporting socket on {self.__interface} : {e}")
+            if self.__socket is not None : self.__socket.close()
+            self.__socket = None
+            result = False
+
+        if result :
+            self.__is_running = True
+            self.__task = get_running_loop().create_task(self.__run())
+            info(f"Reporting robot {self.__robot} metrics to {self.__collector[0]}:{self.__collector[1]} every {self.__period:.1f}s")
+
+        return result
+
+    async def stop(self) :
+        """Stop reporting and close the socket."""
+
+        info("Stopping fleet reporter")
+
+        self.__is_running = False
+        if self.__task is not None :
+            self.__task.cancel()
+            try :
+                await self.__task
+            except BaseException :
+                pass
+        self.__task = None
+
+        if self.__socket is not None : self.__socket.close()
+        self.__socket = None
+
+    def is_alive(self) :
+        """Return False if the reporting task ended while the reporter runs."""
+        return not self.__is_running or (self.__task is not None and not self.__task.done())
+
+    async def __run(self) :
+        """Send a report periodically."""
+        while self.__is_running :
+            started = perf_counter()
+            self.report()
+            await sleep(max(0, started + self.__period - perf_counter()))
+
+    def report(self) :
+        """Send the current metrics snapshot. Return True if it was sent."""
+
+        result = False
+
+        self.__sequence += 1
+        payload = encode(self.__robot, self.__host, self.__sequence, self.__metrics.snapshot())
+        self.__statistics['size'].set(len(payload))
+        if len(payload) > MAX_REPORT :
+            error(f"Fleet report of {len(payload)} bytes exceeds a datagram, not sent")
+            self.__statistics['oversized'].inc()
+        else :
+            try :
+                self.__socket.sendto(payload, self.__collector)
+                self.__statistics['reports'].inc()
+                result = True
+            except OSError as e :
+                # Laptop link down or send buffer full : the next report carries the same counters
+                self.__statistics['errors'].inc()
+                error(f"Failed to send fleet report : {e}")
+
+        return result
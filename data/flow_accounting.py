@@ -0,0 +1,527 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This plugin accounts the traffic of the flows DNAT'd to the
+Limelights by the routing ruleset, per client, ingress interface,
+Limelight and port, from the kernel connection tracking table.
+Run as a script, it displays the accounted traffic top-style
+from the daemon metrics.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, sleep as pause
+from argparse           import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from errno              import ENOBUFS
+from json               import load
+from os                 import path
+from re                 import compile as regex
+from struct             import pack, unpack_from
+from socket             import socket, inet_ntoa, AF_INET, AF_NETLINK, SOCK_RAW, SOL_SOCKET, SO_RCVBUF
+from sys                import exit, stdout
+from time               import sleep
+from logging            import basicConfig, info, error, debug, INFO
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+from topology           import gateway_address
+
+NETLINK_NETFILTER       = 12
+
+# nfnetlink conntrack messages, multicast groups and netlink flags
+NFNL_SUBSYS_CTNETLINK   = 1
+IPCTNL_MSG_CT_NEW       = 0
+IPCTNL_MSG_CT_GET       = 1
+IPCTNL_MSG_CT_DELETE    = 2
+NFNLGRP_CONNTRACK_NEW     = 1
+NFNLGRP_CONNTRACK_DESTROY = 3
+NLMSG_ERROR             = 2
+NLMSG_DONE              = 3
+NLM_F_REQUEST           = 0x1
+NLM_F_DUMP              = 0x300
+NLMSG_HEADER_SIZE       = 16
+NFGENMSG_SIZE           = 4
+
+# conntrack attributes
+CTA_TUPLE_ORIG          = 1
+CTA_TUPLE_REPLY         = 2
+CTA_COUNTERS_ORIG       = 9
+CTA_COUNTERS_REPLY      = 10
+CTA_TUPLE_IP            = 1
+CTA_TUPLE_PROTO         = 2
+CTA_IP_V4_SRC           = 1
+CTA_IP_V4_DST           = 2
+CTA_PROTO_DST_PORT      = 3
+CTA_COUNTERS_PACKETS    = 1
+CTA_COUNTERS_BYTES      = 2
+NLA_TYPE_MASK           = 0x3fff
+CT_DELETE               = (NFNL_SUBSYS_CTNETLINK << 8) | IPCTNL_MSG_CT_DELETE
+
+# Requests sent in a single datagram, so that their answers fit in the socket buffer
+BATCH                   = 64
+
+# Limelight services by port, for display
+SERVICES = { 5800 : 'video', 5801 : 'ui', 5802 : 'video', 5805 : 'results', 5806 : 'results', 5807 : 'rest' }
+
+# Accounting metric identifiers, as exported by the metrics registry
+METRIC = regex(r'^accounting_(bytes|packets)\{client="([^"]*)",direction="(up|down)",interface="([^"]*)",limelight="([^"]*)",port="(\d+)"\}$')
+
+
+def attributes(data, offset, end) :
+    """
+    Return the netlink attributes between two offsets, as a dictionary of
+    (payload offset, payload end) indexed by attribute type.
+    """
+    result = {}
+    while offset + 4 <= end :
+        length, kind = unpack_from('=HH', data, offset)
+        if length < 4 : break
+        result[kind & NLA_TYPE_MASK] = (offset + 4, offset + length)
+        offset += (length + 3) & ~3
+    return result
+
+
+class FlowAccounting(DaemonPlugin) :
+    """
+    Account the Limelight flows from ctnetlink.
+
+    Flows are learnt from the conntrack new and destroy events, and only
+    the connections from a client to a Limelight gateway address DNAT'd to
+    the Limelight are tracked. Each period, the counters of the tracked
+    connections are requested by tuple in a single batch, so that the cost
+    only depends on the number of Limelight flows, not on the conntrack
+    table size, and the difference with their previous value is added to
+    the counters of their client, ingress interface, Limelight and port.
+    The final counters carried by destroy events account the end of the
+    closed connections. The whole table is only dumped at startup and when
+    events were lost.
+    """
+
+    def __init__(self):
+        """Initialize the accounting with no flow tracked."""
+        self.__events = None
+        self.__queries = None
+        self.__executor = None
+        self.__is_running = False
+        self.__is_failed = False
+        self.__task = None
+        self.__resync_task = None
+        self.__sequence = 0
+
+        # Limelight reached at each gateway address : gateway -> (interface, limelight)
+        self.__sources = {}
+        self.__period = 2.0
+
+        # Tracked connections : original tuple attribute -> [aggregate key, orig packets, orig bytes, reply packets, reply bytes]
+        self.__flows = {}
+
+        self.__statistics = {}
+        self.__metrics = None
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the accounting.
+
+        Parameters:
+        - options: accounting section, with
+            - sources: comma separated list of interface:gateway whose connections are DNAT'd to the first Limelight.
+            - destination: comma separated list of interface:ip of the limelights. Clients reach the n-th
+              limelight at the n-th address after the gateway of their interface.
+            - period: delay in seconds between two counter updates.
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
+        """
+
+        limelights = [destination.strip().split(':')[1] for destination in options.get('destination').split(',')]
+        self.__sources = {}
+        for source in options.get('sources').split(',') :
+            interface, gateway = source.strip().split(':')
+            for index, limelight in enumerate(limelights) :
+                self.__sources[gateway_address(gateway, index)] = (interface, limelight)
+        self.__period = options.getfloat('period', 2.0)
+
+        self.__metrics = metrics
+        for counter in ['events', 'resyncs', 'errors'] :
+            self.__statistics[counter] = metrics.counter('accounting_' + counter)
+        self.__statistics['flows'] = metrics.gauge('accounting_flows')
+
+    async def start(self) :
+        """Subscribe to the conntrack events and read the current Limelight flows."""
+
+        result = False
+
+        info("Starting flow accounting")
+
+        if not self.__is_counting() :
+            error("Connection tracking accounting is disabled, set net.netfilter.nf_conntrack_acct to 1")
+
+        try :
+            # Queries wait for the kernel answers : they run in their own thread, one at a time
+            self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='accounting')
+
+            # Subscribe before dumping, so that no flow is missed in between
+            self.__events = socket(AF_NETLINK, SOCK_RAW, NETLINK_NETFILTER)
+            self.__events.setsockopt(SOL_SOCKET, SO_RCVBUF, 1024 * 1024)
+            self.__events.bind((0, (1 << (NFNLGRP_CONNTRACK_NEW - 1)) | (1 << (NFNLGRP_CONNTRACK_DESTROY - 1))))
+            self.__events.setblocking(False)
+
+            self.__queries = socket(AF_NETLINK, SOCK_RAW, NETLINK_NETFILTER)
+            self.__queries.setsockopt(SOL_SOCKET, SO_RCVBUF, 1024 * 1024)
+            self.__queries.bind((0, 0))
+            self.__queries.settimeout(1.0)
+
+            self.__flows = {}
+            await self.__resync()
+
+            get_running_loop().add_reader(self.__events.fileno(), self.__receive)
+            self.__is_running = True
+            self.__is_failed = False
+            self.__task = get_running_loop().create_task(self.__run())
+
+            info(f"Accounting flows to {', '.join(sorted(set(source[1] for source in self.__sources.values())))} from "
+                 f"{', '.join(sorted(set(source[0] for source in self.__sources.values())))}, {len(self.__flows)} already open")
+            result = True
+
+        except OSError as e :
+            # nf_conntrack not loaded yet : no ruleset using connection tracking
+            error(f"Failed to subscribe to conntrack events : {e}")
+            await self.stop()
+
+        return result
+
+    async def stop(self) :
+        """Stop accounting and release the netlink sockets."""
+
+        info("Stopping flow accounting")
+
+        self.__is_running = False
+        for task in [self.__task, self.__resync_task] :
+            if task is not None :
+                task.cancel()
+                try :
+                    await task
+                except BaseException :
+                    pass
+        self.__task = None
+        self.__resync_task = None
+
+        if self.__events is not None :
+            get_running_loop().remove_reader(self.__events.fileno())
+            self.__events.close()
+        self.__events = None
+        if self.__queries is not None :
+            # Close the query socket once the query still running in the executor, if any, is over
+            await get_running_loop().run_in_executor(self.__executor, self.__queries.close)
+        self.__queries = None
+        if self.__executor is not None : self.__executor.shutdown(wait=False)
+        self.__executor = None
+
+    def is_alive(self) :
+        """Return False if the events reception failed or the counter updates stopped while accounting."""
+        return not self.__is_running or (not self.__is_failed and self.__task is not None and not self.__task.done())
+
+    async def __run(self) :
+        """Request the counters of all tracked flows periodically."""
+        while self.__is_running :
+            await pause(self.__period)
+            try :
+                await self.__update()
+            except Exception as e :
+                error(f"Flow accounting update failed : {e}")
+                self.__statistics['errors'].inc()
+            self.__statistics['flows'].set(len(self.__flows))
+
+    def __is_counting(self) :
+        """Return True if conntrack maintains per connection counters."""
+        result = False
+        try :
+            with open('/proc/sys/net/netfilter/nf_conntrack_acct', 'r') as f :
+                result = f.read().strip() == '1'
+        except OSError :
+            result = False
+        return result
+
+    def __receive(self) :
+        """Process the pending conntrack events. If events were lost, dump the table again."""
+
+        lost = False
+
+        while True :
+            try :
+                data = self.__events.recv(65536)
+            except BlockingIOError :
+                break
+            except OSError as e :
+                if e.errno != ENOBUFS :
+                    # The socket is unusable : stop reading it, the daemon watchdog reports the failure
+                    error(f"Conntrack events reception failed : {e}")
+                    get_running_loop().remove_reader(self.__events.fileno())
+                    self.__is_failed = True
+                    break
+                # The kernel dropped events, resynchronize everything
+                error(f"Conntrack events lost : {e}")
+                lost = True
+                continue
+
+            for kind, flow, counters in self.__parse(data) :
+                self.__statistics['events'].inc()
+                if kind == CT_DELETE :
+                    self.__close(flow, counters)
+                elif flow is not None :
+                    self.__open(flow, counters)
+
+        # Only one dump at a time, the queries being serialized anyway
+        if lost and self.__is_running and (self.__resync_task is None or self.__resync_task.done()) :
+            self.__statistics['resyncs'].inc()
+            self.__resync_task = get_running_loop().create_task(self.__recover())
+
+    async def __recover(self) :
+        """Dump the conntrack table again after events were lost."""
+        try :
+            await self.__resync()
+        except Exception as e :
+            error(f"Flow accounting resynchronization failed : {e}")
+            self.__statistics['errors'].inc()
+
+    async def __resync(self) :
+        """Dump the whole conntrack table to learn the open Limelight flows."""
+        answers = await self.__execute([self.__request(NLM_F_REQUEST | NLM_F_DUMP, b'')], dump=True)
+        for kind, flow, counters in answers :
+            if flow is not None : self.__open(flow, counters)
+
+    async def __update(self) :
+        """Request the tracked flows counters by tuple and account their differences."""
+
+        tuples = list(self.__flows.keys())
+        for start in range(0, len(tuples), BATCH) :
+            requests = [self.__request(NLM_F_REQUEST, original) for original in tuples[start:start + BATCH]]
+            answered = set()
+            for kind, flow, counters in await self.__execute(requests) :
+                if flow is not None and flow[0] in self.__flows :
+                    self.__account(flow[0], counters)
+                    answered.add(flow[0])
+            # Flows no longer in the table whose destroy event was lost
+            for original in tuples[start:start + BATCH] :
+                if original not in answered : self.__flows.pop(original, None)
+
+    def __open(self, flow, counters) :
+        """Start tracking a Limelight flow, accounting the traffic it already carried."""
+        original, key = flow
+        if original not in self.__flows :
+            debug(f"Accounting flow from {key[0]} on {key[1]} to {key[2]} port {key[3]}")
+            self.__flows[original] = [key, 0, 0, 0, 0]
+        self.__account(original, counters)
+
+    def __close(self, flow, counters) :
+        """Account the final counters of a closed flow and stop tracking it."""
+        if flow is not None and flow[0] in self.__flows :
+            self.__account(flow[0], counters)
+            del self.__flows[flow[0]]
+
+    def __account(self, original, counters) :
+        """Add the counters increase of a tracked flow to its client, interface, Limelight and port counters."""
+        state = self.__flows[original]
+        client, interface, limelight, port = state[0]
+        for index, (metric, direction) in enumerate([('packets', 'up'), ('bytes', 'up'), ('packets', 'down'), ('bytes', 'down')]) :
+            value = counters[index]
+            # Counters only decrease when they were reset, then all the traffic they count is new
+            delta = value - state[index + 1] if value >= state[index + 1] else value
+            if delta > 0 :
+                self.__metrics.counter('accounting_' + metric, client=client, interface=interface, limelight=limelight, port=port, direction=direction).inc(delta)
+            state[index + 1] = value
+
+    def __request(self, flags, payload) :
+        """Return a ctnetlink get request with its own sequence number."""
+        self.__sequence = (self.__sequence + 1) & 0xffffffff
+        header = pack('=IHHII', NLMSG_HEADER_SIZE + NFGENMSG_SIZE + len(payload), (NFNL_SUBSYS_CTNETLINK << 8) | IPCTNL_MSG_CT_GET,
+                      flags, self.__sequence, 0)
+        result = header + pack('=BBH', AF_INET, 0, 0) + payload
+        return result
+
+    async def __execute(self, requests, dump=False) :
+        """Run a query in the executor thread, so that the event loop never waits for the kernel answers."""
+        result = await get_running_loop().run_in_executor(self.__executor, self.__query, requests, dump)
+        return result
+
+    def __query(self, requests, dump=False) :
+        """
+        Send requests in one datagram and return the flows of their answers. The kernel
+        answers a get request with its connection, or with an error if the connection is
+        no longer in the table, and a dump with connections until its done message.
+        Blocking, it runs in the executor thread.
+        """
+
+        result = []
+
+        self.__queries.send(b''.join(requests))
+        pending = 1 if dump else len(requests)
+        while pending > 0 :
+            data = self.__queries.recv(65536)
+            for kind, flow, counters in self.__parse(data) :
+                if kind in (NLMSG_ERROR, NLMSG_DONE) :
+                    pending -= 1
+                else :
+                    result.append((kind, flow, counters))
+                    if not dump : pending -= 1
+
+        return result
+
+    def __parse(self, data) :
+        """
+        Parse the netlink messages of a datagram. Return a list of (kind, flow, counters),
+        where flow is (original tuple attribute, (client, interface, limelight, port)) for Limelight
+        flows and None for the others, counters is [orig packets, orig bytes, reply packets, reply bytes].
+        Kind is the netlink message type, control messages having no flow nor counters.
+        """
+
+        result = []
+
+        offset = 0
+        while offset + NLMSG_HEADER_SIZE <= len(data) :
+            length, kind = unpack_from('=IH', data, offset)
+            if length < NLMSG_HEADER_SIZE : break
+            end = offset + length
+            if kind in (NLMSG_ERROR, NLMSG_DONE) :
+                result.append((kind, None, None))
+            elif kind >> 8 == NFNL_SUBSYS_CTNETLINK :
+                items = attributes(data, offset + NLMSG_HEADER_SIZE + NFGENMSG_SIZE, end)
+                flow = self.__flow(data, items)
+                counters = [0, 0, 0, 0]
+                for index, counter in [(0, CTA_COUNTERS_ORIG), (2, CTA_COUNTERS_REPLY)] :
+                    if counter in items :
+                        values = attributes(data, *items[counter])
+                        for shift, attribute in [(0, CTA_COUNTERS_PACKETS), (1, CTA_COUNTERS_BYTES)] :
+                            if attribute in values : counters[index + shift] = unpack_from('>Q', data, values[attribute][0])[0]
+                result.append((kind, flow, counters))
+            offset += (length + 3) & ~3
+
+        return result
+
+    def __flow(self, data, items) :
+        """Return (original tuple attribute, (client, interface, limelight, port)) if a connection is DNAT'd to a Limelight, else None."""
+
+        result = None
+
+        if CTA_TUPLE_ORIG in items and CTA_TUPLE_REPLY in items :
+            original = self.__tuple(data, *items[CTA_TUPLE_ORIG])
+            reply = self.__tuple(data, *items[CTA_TUPLE_REPLY])
+            if original is not None and reply is not None and original[1] in self.__sources and reply[0] == self.__sources[original[1]][1] :
+                start, end = items[CTA_TUPLE_ORIG]
+                interface, limelight = self.__sources[original[1]]
+                # Keep the whole attribute, header included, to request the connection by tuple
+                result = (bytes(data[start - 4:end]), (original[0], interface, limelight, str(original[2])))
+
+        return result
+
+    def __tuple(self, data, start, end) :
+        """Return (source, destination, destination port) of a conntrack tuple, None if it is not IPv4."""
+
+        result = None
+
+        items = attributes(data, start, end)
+        if CTA_TUPLE_IP in items :
+            addresses = attributes(data, *items[CTA_TUPLE_IP])
+            if CTA_IP_V4_SRC in addresses and CTA_IP_V4_DST in addresses :
+                port = 0
+                if CTA_TUPLE_PROTO in items :
+                    protocol = attributes(data, *items[CTA_TUPLE_PROTO])
+                    if CTA_PROTO_DST_PORT in protocol : port = unpack_from('>H', data, protocol[CTA_PROTO_DST_PORT][0])[0]
+                result = (inet_ntoa(data[addresses[CTA_IP_V4_SRC][0]:addresses[CTA_IP_V4_SRC][0] + 4]),
+                          inet_ntoa(data[addresses[CTA_IP_V4_DST][0]:addresses[CTA_IP_V4_DST][0] + 4]), port)
+
+        return result
+
+
+class FlowTop :
+    """Display the Limelight traffic accounted by the daemon, busiest flows first."""
+
+    def __init__(self, metrics_path) :
+        """
+        Initialize the display.
+
+        Parameters:
+        - metrics_path: metrics file exported by the daemon.
+        """
+        self.__path = metrics_path
+
+    def read(self) :
+        """
+        Return the export time of the metrics file and its accounting counters, as a dictionary
+        of [up bytes, down bytes, up packets, down packets] indexed by (client, interface, limelight, port).
+        """
+
+        result = (path.getmtime(self.__path), {})
+
+        with open(self.__path, 'r', encoding='utf-8') as f :
+            metrics = load(f)
+        for key, value in metrics.items() :
+            match = METRIC.match(key)
+            if match is None : continue
+            metric, client, direction, interface, limelight, port = match.groups()
+            counters = result[1].setdefault((client, interface, limelight, int(port)), [0, 0, 0, 0])
+            counters[(0 if metric == 'bytes' else 2) + (0 if direction == 'up' else 1)] = value
+
+        return result
+
+    def render(self, previous, current) :
+        """
+        Return the table of the flows throughput between two reads, busiest first.
+
+        Parameters:
+        - previous: earlier result of read.
+        - current: latest result of read.
+        """
+
+        elapsed = max(current[0] - previous[0], 1e-3)
+        rows = []
+        for key, counters in current[1].items() :
+            before = previous[1].get(key, [0, 0, 0, 0])
+            rates = [(value - before[index]) / elapsed for index, value in enumerate(counters)]
+            rows.append((rates[0] + rates[1], key, rates, counters))
+        rows.sort(key=lambda row : (-row[0], row[1]))
+
+        lines = [f'Limelight traffic over {elapsed:.1f}s, {len(rows)} client flows',
+                 '',
+                 f'{"CLIENT":<16} {"IF":<5} {"LIMELIGHT":<15} {"PORT":<13} {"DOWN Mbit/s":>11} {"UP Mbit/s":>10} {"PKT/s":>8} {"TOTAL MB":>10}']
+        for total, (client, interface, limelight, port), rates, counters in rows :
+            service = f'{port} {SERVICES.get(port, "")}'.strip()
+            lines.append(f'{client:<16} {interface:<5} {limelight:<15} {service:<13} {rates[1] * 8 / 1e6:>11.2f} {rates[0] * 8 / 1e6:>10.2f} '
+                         f'{rates[2] + rates[3]:>8.0f} {(counters[0] + counters[1]) / 1e6:>10.1f}')
+
+        result = '\n'.join(lines)
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    parser = ArgumentParser(description='Display the Limelight traffic per client, interface, Limelight and port')
+    parser.add_argument('--metrics', default='/run/limenurse/metrics.json', help='Metrics file exported by the limenurse daemon')
+    parser.add_argument('--interval', type=float, default=5.0, help='Delay in seconds between two refreshes, at least the daemon metrics period')
+    parser.add_argument('--count', type=int, default=0, help='Number of refreshes, 0 to run until interrupted')
+    arguments = parser.parse_args()
+
+    top = FlowTop(arguments.metrics)
+    try :
+        previous = top.read()
+        refreshes = 0
+        while arguments.count == 0 or refreshes < arguments.count :
+            sleep(arguments.interval)
+            current = top.read()
+            if current[0] == previous[0] : continue
+            # Clear the terminal between refreshes, as top does
+            print(('\033[H\033[2J' if stdout.isatty() else '') + top.render(previous, current), flush=True)
+            previous = current
+            refreshes += 1
+    except KeyboardInterrupt :
+        pass
+    except OSError as e :
+        error(f"Failed to read {arguments.metrics} : {e}")
+        exit(1)
@@ -0,0 +1,220 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the interface state service shared by
+all the plugins hosted by the LimeNurse daemon. It is the only
+place where interfaces status and IPv4 addresses are retrieved,
+and notifies plugins as soon as the kernel reports a change.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop
+from collections        import namedtuple
+from errno              import ENOBUFS
+from fcntl              import ioctl
+from struct             import pack, unpack_from, unpack
+from socket             import socket, inet_ntoa, if_indextoname, AF_INET, AF_NETLINK, SOCK_DGRAM, SOCK_RAW, NETLINK_ROUTE
+from logging            import info, error, debug
+
+# Interface status : up flag and IPv4 address (None when not assigned)
+InterfaceState = namedtuple('InterfaceState', ['up', 'address'])
+
+SIOCGIFFLAGS = 0x8913
+SIOCGIFADDR  = 0x8915
+IFF_UP       = 0x1
+
+# rtnetlink multicast groups and messages
+RTMGRP_LINK         = 0x1
+RTMGRP_IPV4_IFADDR  = 0x10
+RTM_NEWLINK         = 16
+RTM_DELLINK         = 17
+RTM_NEWADDR         = 20
+RTM_DELADDR         = 21
+NLMSG_HEADER_SIZE   = 16
+
+
+class InterfaceMonitor :
+    """
+    Follow the watched interfaces on the daemon event loop and notify
+    the subscribed plugins of any change of status or address.
+
+    Changes are received from the kernel through a rtnetlink socket
+    subscribed to link and IPv4 address events, so that nothing runs
+    while interfaces are stable. An optional periodic check can be kept
+    as a safety net.
+    """
+
+    def __init__(self, period=0):
+        """
+        Initialize the monitor.
+
+        Parameters:
+        - period: period in seconds of the safety check of all interfaces, 0 to rely on kernel events only.
+        """
+        self.__period = period
+        self.__socket = None
+        self.__netlink = None
+        self.__timer = None
+        self.__is_failed = False
+        self.__states = {}
+        self.__callbacks = {}
+
+    def watch(self, interface, callback=None) :
+        """
+        Start monitoring an interface.
+
+        Parameters:
+        - interface: name of the interface to monitor.
+        - callback: optional callable(interface, state) invoked on each change.
+        """
+        if interface not in self.__callbacks :
+            self.__callbacks[interface] = []
+            self.__states[interface] = InterfaceState(False, None)
+        if callback is not None :
+            self.__callbacks[interface].append(callback)
+        if self.__socket is not None :
+            self.__states[interface] = self.__read(interface)
+
+    def state(self, interface) :
+        """Return the last known state of an interface."""
+        return self.__states.get(interface, InterfaceState(False, None))
+
+    def is_up(self, interface) :
+        """Return True if the interface was up at last check."""
+        return self.state(interface).up
+
+    def address(self, interface) :
+        """Return the interface IPv4 address at last check, or None."""
+        return self.state(interface).address
+
+    def refresh(self) :
+        """Read all watched interfaces now and notify changes."""
+        for interface in self.__callbacks :
+            self.__update(interface)
+
+    async def start(self) :
+        """Subscribe to kernel events and read the initial states."""
+        self.__socket = socket(AF_INET, SOCK_DGRAM)
+
+        # Subscribe before reading, so that no change is missed in between
+        self.__netlink = socket(AF_NETLINK, SOCK_RAW, NETLINK_ROUTE)
+        self.__netlink.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        self.__netlink.setblocking(False)
+        get_running_loop().add_reader(self.__netlink.fileno(), self.__receive)
+        self.__is_failed = False
+
+        for interface in self.__callbacks :
+            self.__states[interface] = self.__read(interface)
+        if self.__period > 0 : self.__schedule()
+
+    async def stop(self) :
+        """Stop following interfaces and release resources."""
+        if self.__timer is not None : self.__timer.cancel()
+        self.__timer = None
+        if self.__netlink is not None :
+            get_running_loop().remove_reader(self.__netlink.fileno())
+            self.__netlink.close()
+        self.__netlink = None
+        if self.__socket is not None : self.__socket.close()
+        self.__socket = None
+
+    def is_alive(self) :
+        """Return False if the kernel events can no longer be received."""
+        return not self.__is_failed
+
+    def __schedule(self) :
+        """Arm the next safety check."""
+        self.__timer = get_running_loop().call_later(self.__period, self.__poll)
+
+    def __poll(self) :
+        """Timer callback."""
+        self.refresh()
+        self.__schedule()
+
+    def __receive(self) :
+        """
+        Process the pending rtnetlink messages and update the interfaces they
+        relate to. If events were lost, all the interfaces are read again.
+        """
+        interfaces = set()
+        lost = False
+
+        while True :
+            try :
+                data = self.__netlink.recv(65536)
+            except BlockingIOError :
+                break
+            except OSError as e :
+                if e.errno != ENOBUFS :
+                    # The socket is unusable : stop reading it, the daemon watchdog reports the failure
+                    error(f"Interface events reception failed : {e}")
+                    get_running_loop().remove_reader(self.__netlink.fileno())
+                    self.__is_failed = True
+                    break
+                # The kernel dropped events, resynchronize everything
+                error(f"Interface events lost : {e}")
+                lost = True
+                continue
+
+            offset = 0
+            while offset + NLMSG_HEADER_SIZE <= len(data) :
+                length, kind = unpack_from('=IH', data, offset)
+                if length < NLMSG_HEADER_SIZE : break
+                if kind in (RTM_NEWADDR, RTM_DELADDR) :
+                    # ifaddrmsg : family, prefix length, flags, scope, index
+                    interfaces.add(self.__name(unpack_from('=BBBBI', data, offset + NLMSG_HEADER_SIZE)[4]))
+                elif kind in (RTM_NEWLINK, RTM_DELLINK) :
+                    # ifinfomsg : family, padding, type, index, flags, change
+                    interfaces.add(self.__name(unpack_from('=BBHiII', data, offset + NLMSG_HEADER_SIZE)[3]))
+                offset += (length + 3) & ~3
+
+        debug(f"Interface events received for {', '.join(str(interface) for interface in interfaces)}")
+        if lost or None in interfaces :
+            self.refresh()
+        else :
+            for interface in interfaces :
+                if interface in self.__callbacks : self.__update(interface)
+
+    def __name(self, index) :
+        """Return the name of an interface from its index, or None if it no longer exists."""
+        try :
+            return if_indextoname(index)
+        except OSError :
+            return None
+
+    def __update(self, interface) :
+        """Read an interface state and notify its change."""
+        state = self.__read(interface)
+        if state != self.__states[interface] :
+            info(f"Interface {interface} is now {'up' if state.up else 'down'} with address {state.address}")
+            self.__states[interface] = state
+            for callback in self.__callbacks[interface] :
+                try :
+                    callback(interface, state)
+                except Exception as e :
+                    error(f"Interface {interface} change processing failed : {e}")
+
+    def __read(self, interface) :
+        """Read the interface state using SIOCGIFFLAGS and SIOCGIFADDR."""
+
+        up = False
+        address = None
+
+        ifreq = pack('256s', interface[:15].encode('utf-8'))
+        try :
+            flags = unpack('H', ioctl(self.__socket.fileno(), SIOCGIFFLAGS, ifreq)[16:18])[0]
+            up = (flags & IFF_UP) != 0
+        except OSError :
+            up = False
+        try :
+            address = inet_ntoa(ioctl(self.__socket.fileno(), SIOCGIFADDR, ifreq)[20:24])
+        except OSError :
+            address = None
+
+        return InterfaceState(up, address)
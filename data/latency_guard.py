@@ -0,0 +1,271 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This plugin keeps the latency of the Limelight link inside a
+budget, by lowering the rate of the video streams sent to the
+laptop when the link latency degrades, and raising it back once
+the latency recovered.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, create_subprocess_exec, wait_for, sleep, gather, TimeoutError as WaitTimeout
+from asyncio.subprocess import PIPE
+from collections        import deque
+from time               import perf_counter
+from socket             import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_BINDTODEVICE
+from logging            import info, error
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+from traffic_priority   import parse_rate, is_video_class, CLASSES, BULK, QUANTUM, CLASS
+
+
+class LatencyGuard(DaemonPlugin) :
+    """
+    Throttle the laptop video streams while the Limelight link is loaded.
+
+    The latency of the link is sampled by timing TCP connections to the
+    Limelight results port through eth1 : the connection handshake goes
+    through the same Limelight link buffer as the Control Hub results.
+    With several Limelights, all of them are probed at once and the slowest
+    one makes the sample. When the highest latency of the last samples
+    exceeds the budget, the ceil of the video classes of the traffic priority scheme is cut down on
+    the laptop interfaces, multiplicatively, down to a minimal rate. Once
+    the latency is back well below the budget, it is raised again step by
+    step up to its nominal value.
+    """
+
+    def __init__(self):
+        """Initialize the guard with no interface throttled."""
+        self.__is_running = False
+        self.__task = None
+        self.__monitor = None
+
+        self.__probes = []
+        self.__budget = 0.01
+        self.__period = 0.5
+        self.__samples = deque(maxlen=5)
+        self.__interfaces = []
+        self.__min_rate = None
+        self.__max_rate = None
+        self.__decrease = 0.7
+        self.__increase = 0.05
+
+        # Nominal (rate, ceil) of the video classes, indexed by interface then class, and current ceil
+        self.__nominal = {}
+        self.__rate = None
+
+        self.__statistics = {}
+        self.__metrics = None
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the guard.
+
+        Parameters:
+        - options: guard section, with
+            - probe: comma separated list of interface:address:port of the Limelight endpoints timed
+            - budget: latency budget in seconds
+            - period: delay in seconds between two probes
+            - window: number of samples whose highest latency is compared to the budget
+            - interfaces: comma separated laptop interfaces whose video class is throttled
+            - min_rate: lowest video rate, as a tc rate
+            - max_rate: highest video rate, as a tc rate, the video class ceil installed by default
+            - decrease: factor applied to the video rate when the budget is exceeded
+            - increase: share of the highest video rate added back when the latency recovered
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
+        """
+
+        self.__probes = []
+        for probe in options.get('probe', 'eth1:172.29.0.1:5807').split(',') :
+            interface, address, port = probe.strip().split(':')
+            self.__probes.append((interface, address, int(port)))
+        self.__budget = options.getfloat('budget', 0.01)
+        self.__period = options.getfloat('period', 0.5)
+        self.__samples = deque(maxlen=options.getint('window', 5))
+        self.__interfaces = [name.strip() for name in options.get('interfaces', 'eth0').split(',')]
+        self.__min_rate = parse_rate(options.get('min_rate', '5mbit'))
+        self.__max_rate = parse_rate(options['max_rate']) if options.get('max_rate') else None
+        self.__decrease = options.getfloat('decrease', 0.7)
+        self.__increase = options.getfloat('increase', 0.05)
+
+        self.__monitor = interfaces
+        for interface, address, port in self.__probes :
+            interfaces.watch(interface)
+
+        self.__metrics = metrics
+        for counter in ['probes', 'probe_failures', 'errors'] :
+            self.__statistics[counter] = metrics.counter('guard_' + counter)
+        for direction in ['down', 'up'] :
+            self.__statistics[direction] = metrics.counter('guard_adjustments', direction=direction)
+        self.__statistics['latency'] = metrics.summary('guard_probe_latency_seconds')
+        self.__statistics['window'] = metrics.gauge('guard_latency_seconds')
+        self.__statistics['rate'] = metrics.gauge('guard_video_rate_bits')
+
+    async def start(self) :
+        """
+        Read the nominal video classes of the laptop interfaces and start probing.
+        Return False while the traffic priority scheme is not installed.
+        """
+
+        result = True
+
+        info("Starting latency guard")
+
+        self.__nominal = {}
+        for interface in self.__interfaces :
+            nominal = await self.__read(interface)
+            if len(nominal) == 0 :
+                error(f"No traffic priority video class on {interface}")
+                result = False
+            else :
+                self.__nominal[interface] = nominal
+
+        if result :
+            # A configured highest rate is the nominal ceil, the one read may be a throttled one left by a crash
+            if self.__max_rate is None : self.__max_rate = min(ceil for classes in self.__nominal.values() for rate, ceil in classes.values())
+            self.__nominal = { interface : { classid : (min(rate, self.__max_rate), self.__max_rate) for classid, (rate, ceil) in classes.items() }
+                               for interface, classes in self.__nominal.items() }
+            self.__rate = self.__max_rate
+            self.__statistics['rate'].set(self.__rate)
+            self.__samples.clear()
+            self.__is_running = True
+            self.__task = get_running_loop().create_task(self.__run())
+            info(f"Guarding {', '.join(f'{address}:{port}' for interface, address, port in self.__probes)} latency under {self.__budget * 1000:.1f}ms, "
+                 f"video on {', '.join(self.__interfaces)} between {self.__min_rate / 1e6:.1f} and {self.__max_rate / 1e6:.1f}Mbit/s")
+
+        return result
+
+    async def stop(self) :
+        """Stop probing and restore the nominal video classes."""
+
+        info("Stopping latency guard")
+
+        self.__is_running = False
+        if self.__task is not None :
+            self.__task.cancel()
+            try :
+                await self.__task
+            except BaseException :
+                pass
+        self.__task = None
+
+        for interface, classes in self.__nominal.items() :
+            for classid, (rate, ceil) in classes.items() :
+                await self.__change(interface, classid, rate, ceil)
+
+    def is_alive(self) :
+        """Return False if the probing task ended while the guard runs."""
+        return not self.__is_running or (self.__task is not None and not self.__task.done())
+
+    async def __run(self) :
+        """Probe the link periodically and adjust the video rate to the sampled latency."""
+        while self.__is_running :
+            started = perf_counter()
+            try :
+                probes = [probe for probe in self.__probes if self.__monitor.is_up(probe[0])]
+                if len(probes) > 0 :
+                    await self.__sample(probes)
+            except Exception as e :
+                error(f"Latency guard iteration failed : {e}")
+                self.__statistics['errors'].inc()
+            await sleep(max(0, started + self.__period - perf_counter()))
+
+    async def __sample(self, probes) :
+        """Take a latency sample of the slowest Limelight link, and adjust the video rate once the window is full."""
+
+        latency = 0
+        for measure in await gather(*[self.__connect(probe) for probe in probes]) :
+            self.__statistics['probes'].inc()
+            if measure is None :
+                # Connection lost or timed out : the link is at least as slow as the timeout
+                self.__statistics['probe_failures'].inc()
+                measure = self.__timeout()
+            else :
+                self.__statistics['latency'].observe(measure)
+            latency = max(latency, measure)
+
+        self.__samples.append(latency)
+        if len(self.__samples) < self.__samples.maxlen : return
+
+        worst = max(self.__samples)
+        self.__statistics['window'].set(worst)
+
+        rate = self.__rate
+        if worst > self.__budget :
+            rate = max(self.__min_rate, int(self.__rate * self.__decrease))
+        elif worst < self.__budget / 2 :
+            rate = min(self.__max_rate, self.__rate + int(self.__max_rate * self.__increase))
+
+        if rate != self.__rate :
+            direction = 'down' if rate < self.__rate else 'up'
+            info(f"Link latency {worst * 1000:.1f}ms, video rate {direction} to {rate / 1e6:.1f}Mbit/s")
+            applied = True
+            for interface, classes in self.__nominal.items() :
+                for classid, (nominal, ceil) in classes.items() :
+                    applied = await self.__change(interface, classid, min(nominal, rate), rate) and applied
+            if applied :
+                self.__rate = rate
+                self.__statistics['rate'].set(rate)
+                self.__statistics[direction].inc()
+            # Judge the new rate on fresh samples only
+            self.__samples.clear()
+
+    async def __connect(self, probe) :
+        """Return the duration of a TCP connection to a probed endpoint, or None if it failed."""
+
+        result = None
+
+        interface, address, port = probe
+        sock = socket(AF_INET, SOCK_STREAM)
+        try :
+            sock.setsockopt(SOL_SOCKET, SO_BINDTODEVICE, interface.encode('ascii'))
+            sock.setblocking(False)
+            started = perf_counter()
+            await wait_for(get_running_loop().sock_connect(sock, (address, port)), self.__timeout())
+            result = perf_counter() - started
+        except (OSError, WaitTimeout) :
+            pass
+        finally :
+            sock.close()
+
+        return result
+
+    def __timeout(self) :
+        """Return the delay after which a probe is considered lost."""
+        return max(self.__budget * 10, self.__period)
+
+    async def __read(self, interface) :
+        """Return the (rate, ceil) of the video classes of an interface, indexed by class."""
+        result = {}
+        output = await self.__tc('class', 'show', 'dev', interface)
+        for line in (output or '').splitlines() :
+            match = CLASS.match(line)
+            if match is not None and is_video_class(match.group(1)) :
+                result[match.group(1)] = (parse_rate(match.group(3)), parse_rate(match.group(4)))
+        return result
+
+    async def __change(self, interface, classid, rate, ceil) :
+        """Change in place the rates of a video class of an interface, return True on success."""
+        output = await self.__tc('class', 'change', 'dev', interface, 'parent', '1:1', 'classid', classid, 'htb',
+                                 'rate', f'{rate}bit', 'ceil', f'{ceil}bit', 'prio', str(CLASSES[BULK][0]), 'quantum', str(QUANTUM))
+        if output is None : self.__statistics['errors'].inc()
+        return output is not None
+
+    async def __tc(self, *arguments) :
+        """Run a tc command without blocking the event loop. Return its output, or None if it failed."""
+        result = None
+        process = await create_subprocess_exec('tc', *arguments, stdout=PIPE, stderr=PIPE)
+        output, errors = await process.communicate()
+        if process.returncode == 0 :
+            result = output.decode()
+        else :
+            error(f"tc {' '.join(arguments)} failed : {errors.decode().strip()}")
+        return result
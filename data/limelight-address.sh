@@ -19,6 +19,7 @@ if ip link show usb0 > /dev/null 2>&1; then
     ip addr flush dev usb0 || true
     ip -6 addr flush dev usb0 scope global || true
     ip addr add $USB_IP_GATEWAY_LINUX/24 dev usb0
+    ip link set usb0 mtu $USB_MTU_LINUX || echo "  ⚠️  usb0 does not support MTU $USB_MTU_LINUX, keeping $(cat /sys/class/net/usb0/mtu)"
     ip link set usb0 up
     echo "  ➡️  usb0 interface got IP $USB_IP_GATEWAY_LINUX"
 else
@@ -39,6 +40,7 @@ if ip link show usb1 > /dev/null 2>&1; then
     ip addr flush dev usb1 || true
     ip -6 addr flush dev usb1 scope global || true
     ip addr add $USB_IP_GATEWAY_WINDOWS/24 dev usb1
+    ip link set usb1 mtu $USB_MTU_WINDOWS || echo "  ⚠️  usb1 does not support MTU $USB_MTU_WINDOWS, keeping $(cat /sys/class/net/usb1/mtu)"
     ip link set usb1 up
     echo "  ➡️  usb1 interface got IP $USB_IP_GATEWAY_WINDOWS"
 else
@@ -58,7 +60,8 @@ if ip link show eth0 > /dev/null 2>&1; then
     echo "  🔧 Setting static IP for eth0..."
     ip addr flush dev eth0 || true
     ip -6 addr flush dev eth0 scope global || true
-    ip addr add $ETH_IP_GATEWAY/24 dev eth0
+    ip addr add $ETH_IP_GATEWAY/$ETH_IP_PREFIX dev eth0
+    ip link set eth0 mtu $ETH_MTU || echo "  ⚠️  eth0 does not support MTU $ETH_MTU, keeping $(cat /sys/class/net/eth0/mtu)"
     ip link set eth0 up
 
     echo "  ➡️  eth interface got IP $ETH_IP_GATEWAY"
@@ -1,53 +1,103 @@
 #!/bin/bash
 set -e
 
-echo ""
-echo "❶ Flushing old iptables rules..."
+COMPILER_PATH=/usr/local/lib/limenurse/routing_compiler.py
+PRIORITY_PATH=/usr/local/lib/limenurse/traffic_priority.py
+TOPOLOGY_SCRIPT_PATH=/usr/local/lib/limenurse/topology.py
+MTU_PROBE_PATH=/usr/local/lib/limenurse/mtu_probe.py
+STEERING_PATH=/usr/local/lib/limenurse/cpu_steering.py
+STEERING_CONFIG_PATH=/etc/limenurse/steering.ini
+ENV_PATH=/etc/limenurse/routing.env
+TOPOLOGY_PATH=/etc/limenurse/topology.ini
+
+# Compare the live ruleset and priority scheme to the configured ones, without changing them
+if [ "$1" == "--check" ]; then
+    status=0
+    python3 $COMPILER_PATH check --env $ENV_PATH --topology $TOPOLOGY_PATH || status=1
+    python3 $PRIORITY_PATH check --env $ENV_PATH --topology $TOPOLOGY_PATH || status=1
+    python3 $MTU_PROBE_PATH check --env $ENV_PATH --topology $TOPOLOGY_PATH || status=1
+    python3 $STEERING_PATH check --config $STEERING_CONFIG_PATH || status=1
+    exit $status
+fi
+
+# Report the flowtable devices and the offloaded flows, without changing the rules
+if [ "$1" == "--status" ]; then
+
+    echo ""
+    echo "Flowtable status"
+
+    if ! nft list flowtable ip limelight fastpath > /dev/null 2>&1; then
+        echo "  ❌ No limelight fast path flowtable loaded"
+        exit 1
+    fi
+
+    devices=$(nft list flowtable ip limelight fastpath | sed -n 's/.*devices = { \(.*\) }.*/\1/p')
+    echo "  ➡️  Flowtable devices : $devices"
+
+    if command -v conntrack > /dev/null 2>&1; then
+        offloaded=$(conntrack -L 2>/dev/null | grep -c "\[OFFLOAD\]" || true)
+        tracked=$(conntrack -C 2>/dev/null || echo "?")
+    elif [ -r /proc/net/nf_conntrack ]; then
+        offloaded=$(grep -c "\[OFFLOAD\]" /proc/net/nf_conntrack || true)
+        tracked=$(wc -l < /proc/net/nf_conntrack)
+    else
+        offloaded="?"
+        tracked="?"
+    fi
+    echo "  ➡️  Offloaded flows : $offloaded / $tracked tracked connections"
 
-iptables -F
-iptables -t nat -F
-iptables -X
-echo "   ✅ Flushed."
+    slowpath=$(nft list chain ip limelight forward | sed -n 's/.*flow add @fastpath counter packets \([0-9]*\) bytes \([0-9]*\).*/\1 packets, \2 bytes/p')
+    echo "  ➡️  Packets offered to the fast path from the slow path : ${slowpath:-0 packets, 0 bytes}"
+
+    exit 0
+fi
 
 echo ""
-echo "❷ Enabling IP forwarding"
+echo "❶ Enabling IP forwarding"
 
 sysctl -w net.ipv4.ip_forward=1 > /dev/null
 echo "   ✅ Enabled."
 
-echo ""
-echo "❸ Adding DNAT rule for all traffic from usb0 and eth0 → Limelight on eth1"
-
-iptables -t nat -A PREROUTING -i usb0 -d $USB_IP_GATEWAY_LINUX -j DNAT --to-destination 172.29.0.1
-iptables -t raw -A PREROUTING -i usb0 -p tcp --dport 22 -j DROP
-iptables -t nat -A PREROUTING -i usb1 -d $USB_IP_GATEWAY_WINDOWS -j DNAT --to-destination 172.29.0.1
-iptables -t raw -A PREROUTING -i usb1 -p tcp --dport 22 -j DROP
-iptables -t nat -A PREROUTING -i eth0 -d $ETH_IP_GATEWAY -p tcp ! --dport 22 -j DNAT --to-destination 172.29.0.1
-echo "   ✅ PREROUTING rule set."
+# Clients reach the n-th Limelight at the n-th address after their interface gateway
+python3 $TOPOLOGY_SCRIPT_PATH addresses --env $ENV_PATH --topology $TOPOLOGY_PATH
+echo "   ✅ Limelight gateway addresses and link MTUs set."
 
 echo ""
-echo "❹ Enabling FORWARDING rules between usb0 and eth1 and eth0 and eth1 and usb1 and eth1"
+echo "❷ Applying routing ruleset changes"
 
-iptables -A FORWARD -i usb0 -o eth1 -j ACCEPT
-iptables -A FORWARD -i usb1 -o eth1 -j ACCEPT
-iptables -A FORWARD -i eth0 -o eth1 -j ACCEPT
-iptables -A FORWARD -i eth1 -o usb0 -m state --state RELATED,ESTABLISHED -j ACCEPT
-iptables -A FORWARD -i eth1 -o usb1 -m state --state RELATED,ESTABLISHED -j ACCEPT
-iptables -A FORWARD -i eth1 -o eth0 -m state --state RELATED,ESTABLISHED -j ACCEPT
+# Only the chains differing from the compiled ruleset are replaced, in a single transaction
+python3 $COMPILER_PATH apply --env $ENV_PATH --topology $TOPOLOGY_PATH
 
-echo "   ✅ Forwarding rules set."
+# Connection tracking is loaded by the ruleset, count the traffic of each connection for the flow accounting
+sysctl -w net.netfilter.nf_conntrack_acct=1 > /dev/null
+echo "   ✅ Ruleset up to date."
 
 echo ""
-echo "❺ Adding POSTROUTING MASQUERADE (if Limelight needs it)..."
+echo "❸ Applying traffic priority"
 
-iptables -t nat -A POSTROUTING -o eth1 -j MASQUERADE
+# Control Hub results first, video streams shaped below the Limelight link rate
+python3 $PRIORITY_PATH apply --env $ENV_PATH --topology $TOPOLOGY_PATH
+echo "   ✅ Traffic priority up to date."
 
-echo "   ✅ MASQUERADE set."
+echo ""
+echo "❹ Applying CPU steering"
+
+# Network softirqs away from the limenurse daemon CPUs, the softirq load being logged before and after
+if python3 $STEERING_PATH apply --config $STEERING_CONFIG_PATH; then
+    echo "   ✅ CPU steering up to date."
+else
+    echo "   ⚠️  CPU steering plan not fully applied, network softirqs may share the daemon CPUs"
+fi
 
-echo "❻ Launching UDP forwarders"
-python3 /usr/local/bin/udp_forwarder.py --from-ip1 $USB_IP_GATEWAY_LINUX  --from-ip2 $USB_IP_GATEWAY_WINDOWS  --from-ip3 $ETH_IP_GATEWAY --from-interface1 usb0 --from-interface2 usb1 --from-interface3 eth0 --to-ip 172.29.0.1 --to-interface eth1 > /var/log/udp_forwarder.log 2>&1 &  # usb0
+echo ""
+echo "❺ Checking fast path"
 
-echo "   ✅ UDP forwarders started"
+if nft list flowtable ip limelight fastpath > /dev/null 2>&1; then
+    devices=$(nft list flowtable ip limelight fastpath | sed -n 's/.*devices = { \(.*\) }.*/\1/p')
+    echo "   ✅ Flowtable fastpath in use on $devices."
+else
+    echo "   ⚠️  No flowtable, all flows use the netfilter slow path"
+fi
 
 echo ""
-echo "✅ All rules successfully configured!"
\ No newline at end of file
+echo "✅ All rules successfully configured!"
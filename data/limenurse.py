@@ -0,0 +1,234 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script implements the LimeNurse daemon, hosting all the
+Pi python services as plugins running on a single asyncio event
+loop, and sharing the interface state service, the metrics registry,
+the logging, the signal handling and the systemd supervision.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import run, get_running_loop, sleep, wait_for, Event, gather, TimeoutError as WaitTimeout
+from importlib          import import_module
+from configparser       import ConfigParser
+from argparse           import ArgumentParser
+from glob               import glob
+from os                 import path, sched_setaffinity
+from sys                import exit
+from time               import monotonic
+from signal             import SIGINT, SIGTERM
+from logging            import info, error, DEBUG, Formatter, getLogger
+from logging.handlers   import RotatingFileHandler
+
+# Local includes
+from supervision        import SystemdNotifier, Backoff
+from runtime_profiler   import RuntimeProfiler
+from interface_monitor  import InterfaceMonitor
+from metrics_registry   import MetricsRegistry
+from cpu_steering       import parse_cpus
+
+# Available plugins : configuration section name -> (module, class)
+PLUGINS = {
+    'forwarder' : ('udp_forwarder', 'UdpForwarder'),
+    'resolver'  : ('name_resolver', 'NameResolver'),
+    'guard'     : ('latency_guard', 'LatencyGuard'),
+    'accounting': ('flow_accounting', 'FlowAccounting'),
+    'proxy'     : ('tcp_proxy', 'TcpProxy'),
+    'fleet'     : ('fleet_reporter', 'FleetReporter'),
+}
+
+
+class LimeNurse :
+
+    def __init__(self):
+        """Initialize the daemon with no plugin."""
+
+        self.__plugins = {}
+        self.__interfaces = None
+        self.__metrics = MetricsRegistry()
+        self.__notifier = SystemdNotifier()
+        self.__stopping = None
+
+        self.__metrics_path = None
+        self.__metrics_period = 5.0
+
+    def configure(self, folder) :
+        """
+        Configure the daemon and its plugins from the configuration files.
+
+        Parameters:
+        - folder: folder containing the *.conf files. Each section configures the plugin of the same
+          name, the daemon section configures the daemon itself.
+        """
+
+        result = True
+
+        config = ConfigParser()
+        files = config.read(sorted(glob(path.join(folder, '*.conf'))))
+
+        daemon = config['daemon'] if config.has_section('daemon') else config[config.default_section]
+
+        handler = RotatingFileHandler(daemon.get('log', '/var/log/limenurse.log'), maxBytes=5*1024*1024, backupCount=3)
+        formatter = Formatter('%(asctime)s - line %(lineno)d - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        getLogger().setLevel(DEBUG)
+        getLogger().addHandler(handler)
+
+        info(f" Configuring from {', '.join(files)}")
+
+        self.__interfaces = InterfaceMonitor(daemon.getfloat('interfaces_period', 0))
+        self.__metrics_path = daemon.get('metrics', '/run/limenurse/metrics.json')
+        self.__metrics_period = daemon.getfloat('metrics_period', 5.0)
+
+        # Keep the event loop, its executor threads and its subprocesses on the CPUs left free of network softirqs
+        try :
+            cpus = parse_cpus(daemon.get('cpus', ''))
+            if len(cpus) > 0 :
+                sched_setaffinity(0, cpus)
+                info(f" Running on CPUs {','.join(str(cpu) for cpu in cpus)}")
+        except (OSError, ValueError) as e :
+            error(f"Failed to run on CPUs {daemon.get('cpus')} : {e}")
+
+        for section in config.sections() :
+            if section == 'daemon' : continue
+            if section not in PLUGINS :
+                error(f"Unknown plugin {section}, ignoring its configuration")
+                continue
+            try :
+                module, name = PLUGINS[section]
+                plugin = getattr(import_module(module), name)()
+                plugin.configure(config[section], self.__interfaces, self.__metrics)
+                self.__plugins[section] = plugin
+                info(f" Plugin {section} configured")
+            except Exception as e :
+                error(f"Failed to configure plugin {section} : {e}")
+                result = False
+
+        if len(self.__plugins) == 0 :
+            error("No plugin configured")
+            result = False
+
+        return result
+
+    async def run(self) :
+        """
+        Start all plugins, notify systemd once they are all operational,
+        then serve until a termination signal is received.
+        """
+
+        launch = monotonic()
+        loop = get_running_loop()
+
+        self.__stopping = Event()
+        loop.add_signal_handler(SIGTERM, self.__handle_signal)
+        loop.add_signal_handler(SIGINT, self.__handle_signal)
+
+        profiler = RuntimeProfiler('limenurse', self.__metrics.snapshot)
+        profiler.install()
+
+        await self.__interfaces.start()
+
+        # Plugins are started concurrently, so that one waiting for its
+        # interfaces does not delay the others
+        await gather(*[self.__start(name, plugin) for name, plugin in self.__plugins.items()])
+
+        if not self.__stopping.is_set() :
+            info(f"LimeNurse ready after {monotonic() - launch:.3f}s with plugins {', '.join(self.__plugins.keys())}")
+            self.__notifier.ready(f"Running {', '.join(self.__plugins.keys())}, ready after {monotonic() - launch:.3f}s")
+            self.__metrics.gauge('daemon_time_to_ready_seconds').set(monotonic() - launch)
+
+            watchdog = loop.create_task(self.__watchdog())
+            export = loop.create_task(self.__export())
+
+            await self.__stopping.wait()
+
+            watchdog.cancel()
+            export.cancel()
+
+        self.__notifier.stopping()
+        for name, plugin in self.__plugins.items() :
+            try :
+                await plugin.stop()
+            except Exception as e :
+                error(f"Failed to stop plugin {name} : {e}")
+        await self.__interfaces.stop()
+        self.__metrics.export(self.__metrics_path)
+        self.__notifier.close()
+
+    async def __start(self, name, plugin) :
+        """Start a plugin, retrying with an exponential backoff until it succeeds or the daemon stops."""
+
+        backoff = Backoff()
+        started = False
+
+        while not started and not self.__stopping.is_set() :
+            try :
+                started = await plugin.start()
+            except Exception as e :
+                error(f"Plugin {name} failed to start : {e}")
+                started = False
+            if not started :
+                delay = backoff.next()
+                self.__notifier.extend_timeout(delay + 10)
+                self.__notifier.status(f"Waiting for {name}, attempt {backoff.attempts()}, next one in {delay:.1f}s")
+                info(f"Plugin {name} not started, retrying in {delay:.1f}s")
+                await self.__wait(delay)
+
+    async def __wait(self, delay) :
+        """Sleep for the given delay, or less if the daemon is stopping."""
+        try :
+            await wait_for(self.__stopping.wait(), delay)
+        except WaitTimeout :
+            pass
+
+    async def __watchdog(self) :
+        """
+        Ping the systemd watchdog from the event loop, so that a blocked loop
+        or a stuck plugin leads systemd to restart the daemon.
+        """
+        interval = self.__notifier.watchdog_interval()
+        while True :
+            await sleep(interval)
+            alive = True
+            if not self.__interfaces.is_alive() :
+                error("Interface monitor is stuck")
+                alive = False
+            for name, plugin in self.__plugins.items() :
+                if not plugin.is_alive() :
+                    error(f"Plugin {name} is stuck")
+                    alive = False
+            if alive : self.__notifier.watchdog()
+
+    async def __export(self) :
+        """Publish the metrics periodically."""
+        while True :
+            self.__metrics.export(self.__metrics_path)
+            await sleep(self.__metrics_period)
+
+    def __handle_signal(self) :
+        """Handle termination signals to cleanly stop the daemon."""
+        info("Signal received, exiting...")
+        self.__stopping.set()
+
+
+if __name__ == "__main__":
+
+    # Instantiate the daemon
+    daemon = LimeNurse()
+
+    # Command-line interface to specify the configuration folder
+    parser = ArgumentParser(description="LimeNurse daemon hosting the Limelight bridge services")
+    parser.add_argument("--config", dest="config", default="/etc/limenurse", help="Folder containing the configuration files")
+
+    args = parser.parse_args()
+
+    if not daemon.configure(args.config) :
+        exit(1)
+
+    run(daemon.run())
@@ -0,0 +1,159 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the mDNS messages encoding and decoding,
+and a minimal mDNS client, used to check from the Pi itself that
+a published name is resolvable, and to measure how long it takes
+after an address change.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, wait_for, TimeoutError as WaitTimeout
+from struct             import pack, unpack_from, error as struct_error
+from random             import randint
+from time               import monotonic
+from socket             import socket, inet_aton, AF_INET, SOCK_DGRAM, IPPROTO_IP, IP_MULTICAST_IF
+
+MDNS_ADDRESS = '224.0.0.251'
+MDNS_PORT    = 5353
+TYPE_A       = 1
+CLASS_IN     = 1
+
+
+def encode_name(name) :
+    """Return the DNS wire encoding of a dotted name."""
+    result = b''
+    for label in name.rstrip('.').split('.') :
+        result += pack('B', len(label)) + label.encode('utf-8')
+    return result + b'\x00'
+
+
+def decode_name(packet, offset) :
+    """
+    Decode a possibly compressed DNS name.
+    Return the lowercase dotted name and the offset following it in the packet.
+
+    Parameters:
+    - packet: DNS message.
+    - offset: offset of the name in the message.
+    """
+    labels = []
+    end = None
+    jumps = 0
+    while True :
+        length = packet[offset]
+        if length & 0xC0 == 0xC0 :
+            # Compression pointer
+            if end is None : end = offset + 2
+            offset = unpack_from('!H', packet, offset)[0] & 0x3FFF
+            jumps += 1
+            if jumps > 16 : raise ValueError('Compression loop')
+            continue
+        offset += 1
+        if length == 0 : break
+        labels.append(packet[offset:offset + length].decode('utf-8', 'replace').lower())
+        offset += length
+    return '.'.join(labels), (end if end is not None else offset)
+
+
+def query(name, identifier=0) :
+    """
+    Return a mDNS query for the A record of a name.
+
+    Parameters:
+    - name: name to resolve.
+    - identifier: query identifier, echoed by responders to legacy unicast queries.
+    """
+    return pack('!HHHHHH', identifier, 0, 1, 0, 0, 0) + encode_name(name) + pack('!HH', TYPE_A, CLASS_IN)
+
+
+def records(packet) :
+    """
+    Return the list of (name, address) A records found in the answer,
+    authority and additional sections of a DNS message, or an empty list
+    if the packet is not a valid message.
+
+    Parameters:
+    - packet: DNS message.
+    """
+    result = []
+    try :
+        questions, answered, authorities, additionals = unpack_from('!HHHH', packet, 4)
+        offset = 12
+        for i in range(questions) :
+            name, offset = decode_name(packet, offset)
+            offset += 4
+        for i in range(answered + authorities + additionals) :
+            name, offset = decode_name(packet, offset)
+            kind, klass, ttl, length = unpack_from('!HHIH', packet, offset)
+            offset += 10
+            if kind == TYPE_A and length == 4 and ttl > 0 :
+                result.append((name, packet[offset:offset + 4]))
+            offset += length
+    except (IndexError, ValueError, struct_error) :
+        pass
+    return result
+
+
+def answers(packet) :
+    """
+    Return the list of (name, address) A records of a DNS response, or an
+    empty list if the packet is not a valid response.
+
+    Parameters:
+    - packet: DNS message.
+    """
+    result = []
+    if len(packet) >= 12 and unpack_from('!H', packet, 2)[0] & 0x8000 :
+        result = records(packet)
+    return result
+
+
+async def time_to_resolvable(name, address, since=None, timeout=5.0, interval=0.1) :
+    """
+    Query a name from the given local address until an answer carries
+    this address. Return the time elapsed since the given instant in
+    seconds, or None on timeout.
+
+    Queries are sent from an ephemeral port, so that responders answer
+    them directly (legacy unicast, RFC 6762 §6.7).
+
+    Parameters:
+    - name: name to resolve.
+    - address: expected IPv4 address, also used as the query source.
+    - since: monotonic time of the address change, now by default.
+    - timeout: delay in seconds after which the name is considered unresolvable.
+    - interval: delay in seconds between two queries.
+    """
+
+    result = None
+    loop = get_running_loop()
+    start = since if since is not None else monotonic()
+    expected = (name.rstrip('.').lower(), inet_aton(address))
+
+    sock = socket(AF_INET, SOCK_DGRAM)
+    try :
+        sock.setblocking(False)
+        sock.setsockopt(IPPROTO_IP, IP_MULTICAST_IF, inet_aton(address))
+        sock.bind((address, 0))
+
+        while result is None and monotonic() - start < timeout :
+            identifier = randint(1, 0xFFFF)
+            sock.sendto(query(name, identifier), (MDNS_ADDRESS, MDNS_PORT))
+            deadline = monotonic() + interval
+            while result is None and monotonic() < deadline :
+                try :
+                    packet, sender = await wait_for(loop.sock_recvfrom(sock, 9000), deadline - monotonic())
+                except WaitTimeout :
+                    break
+                if expected in answers(packet) : result = monotonic() - start
+    finally :
+        sock.close()
+
+    return result
@@ -0,0 +1,332 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements a lightweight mDNS responder, publishing
+A records for a few names on a single interface with answer
+packets computed once for all.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, sleep
+from errno              import EADDRINUSE
+from struct             import pack, unpack_from, error as struct_error
+from time               import monotonic, perf_counter
+from socket             import socket, inet_aton, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR, \
+                               IPPROTO_IP, IP_ADD_MEMBERSHIP, IP_MULTICAST_IF, IP_MULTICAST_TTL
+from logging            import info, error, debug
+
+# Local includes
+from mdns_probe         import encode_name, decode_name, records, MDNS_ADDRESS, MDNS_PORT, TYPE_A, CLASS_IN
+
+# Linux socket option restricting multicast reception to the groups joined by the socket itself
+IP_MULTICAST_ALL = 49
+
+TYPE_AAAA       = 28
+TYPE_NSEC       = 47
+TYPE_ANY        = 255
+CLASS_UNIQUE    = 0x8000
+FLAGS_RESPONSE  = 0x8400
+FLAGS_QUERY     = 0x8000
+FLAGS_OPCODE    = 0x7800
+
+# Record types names, for statistics
+TYPES           = { 1 : 'A', 12 : 'PTR', 16 : 'TXT', 28 : 'AAAA', 33 : 'SRV', 47 : 'NSEC', 255 : 'ANY' }
+
+# Delays from RFC 6762 : probes interval, minimal interval between two multicasts of a record, legacy unicast ttl
+PROBE_INTERVAL  = 0.25
+MULTICAST_DELAY = 1.0
+LEGACY_TTL      = 10
+
+
+class MdnsResponder :
+    """
+    Publish names with the address of a single interface.
+
+    Only the question section of incoming queries is parsed, names are
+    looked up in a table built when the responder is created, and the
+    matching answer packets are sent as they are. The responder probes
+    its names before announcing them, and defends them against other
+    hosts claiming them afterwards.
+    """
+
+    def __init__(self, interface, ip, names, metrics, ttl=120):
+        """
+        Initialize the responder.
+
+        Parameters:
+        - interface: interface on which the names are published.
+        - ip: IPv4 address of the interface, on which the responder listens.
+        - names: dictionary of the IPv4 address to publish, among the interface addresses, indexed by name.
+        - metrics: shared metrics registry.
+        - ttl: time to live in seconds of the published records.
+        """
+        self.__interface = interface
+        self.__ip = ip
+        self.__address = inet_aton(ip)
+        self.__ttl = ttl
+
+        self.__socket = None
+        self.__probing = False
+        self.__conflicts = set()
+
+        # Answers indexed by lowercase name
+        self.__table = {}
+        for name, address in names.items() :
+            self.__table[name.rstrip('.').lower()] = self.__build(name, address)
+
+        # Last multicast of each name answer
+        self.__multicast = {}
+
+        self.__metrics = metrics
+        self.__statistics = {}
+        for counter in ['queries', 'answers', 'suppressed', 'announcements', 'conflicts'] :
+            self.__statistics[counter] = metrics.counter('resolver_' + counter, interface=interface)
+        self.__latency = metrics.summary('resolver_answer_latency_seconds', interface=interface)
+
+        # Questions counters indexed by (name, type), names other than ours being counted together
+        self.__questions = {}
+
+    async def start(self, probe=True) :
+        """
+        Open the responder socket and claim the names.
+        Return False if another host already uses one of them.
+
+        Parameters:
+        - probe: True to check the names are not used before announcing them, False
+          to announce at once names this host already owns.
+        """
+
+        result = True
+
+        sock = socket(AF_INET, SOCK_DGRAM)
+        try :
+            # No SO_REUSEPORT : the kernel would deliver each multicast query to a single
+            # socket of the reuseport group, whatever the interface it joined the group on
+            sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            sock.setsockopt(IPPROTO_IP, IP_MULTICAST_ALL, 0)
+            sock.bind(('', MDNS_PORT))
+            sock.setsockopt(IPPROTO_IP, IP_ADD_MEMBERSHIP, inet_aton(MDNS_ADDRESS) + self.__address)
+            sock.setsockopt(IPPROTO_IP, IP_MULTICAST_IF, self.__address)
+            sock.setsockopt(IPPROTO_IP, IP_MULTICAST_TTL, 255)
+            sock.setblocking(False)
+        except Exception :
+            sock.close()
+            raise
+
+        self.__socket = sock
+        get_running_loop().add_reader(sock.fileno(), self.__receive)
+
+        if probe : result = await self.__probe()
+
+        if result :
+            self.__announce_all()
+            get_running_loop().call_later(MULTICAST_DELAY, self.__announce_all)
+            info(f"Names {', '.join(self.__table.keys())} published on {self.__interface} at {self.__ip}")
+
+        return result
+
+    async def update(self, ip, names) :
+        """
+        Move the names to a new address of the interface, keeping the socket. Goodbyes withdraw
+        the former address records only, and the names, still owned, are announced at once with
+        the new address, without being probed again.
+
+        Parameters:
+        - ip: new IPv4 address of the interface.
+        - names: dictionary of the IPv4 address to publish, among the interface addresses, indexed by name.
+        """
+
+        self.__ip = ip
+        self.__address = inet_aton(ip)
+
+        if self.__socket is not None :
+            try :
+                self.__socket.setsockopt(IPPROTO_IP, IP_ADD_MEMBERSHIP, inet_aton(MDNS_ADDRESS) + self.__address)
+            except OSError as e :
+                # The group is still joined on the interface, through its former address
+                if e.errno != EADDRINUSE : raise
+            self.__socket.setsockopt(IPPROTO_IP, IP_MULTICAST_IF, self.__address)
+            for name, entry in self.__table.items() :
+                self.__send(entry['goodbye'], (MDNS_ADDRESS, MDNS_PORT))
+
+        self.__table = {}
+        for name, address in names.items() :
+            self.__table[name.rstrip('.').lower()] = self.__build(name, address)
+        self.__multicast = {}
+
+        self.__announce_all()
+        get_running_loop().call_later(MULTICAST_DELAY, self.__announce_all)
+        info(f"Names {', '.join(self.__table.keys())} moved on {self.__interface} to {self.__ip}")
+
+        return True
+
+    async def stop(self) :
+        """Withdraw the names and close the responder socket."""
+        if self.__socket is not None :
+            for name, entry in self.__table.items() :
+                self.__send(entry['goodbye'], (MDNS_ADDRESS, MDNS_PORT))
+            get_running_loop().remove_reader(self.__socket.fileno())
+            self.__socket.close()
+        self.__socket = None
+
+    def __build(self, name, ip) :
+        """Serialize once for all the packets used to publish a name with its address."""
+
+        qname = encode_name(name)
+        published = inet_aton(ip)
+
+        def address(ttl, unique) :
+            return qname + pack('!HHIH', TYPE_A, CLASS_IN | (CLASS_UNIQUE if unique else 0), ttl, 4) + published
+
+        # NSEC asserting the name has no other record than A (RFC 6762 §6.1)
+        nsec = qname + b'\x00\x01\x40'
+        nsec = qname + pack('!HHIH', TYPE_NSEC, CLASS_IN | CLASS_UNIQUE, self.__ttl, len(nsec)) + nsec
+
+        return {
+            'answer'  : pack('!HHHHHH', 0, FLAGS_RESPONSE, 0, 1, 0, 1) + address(self.__ttl, True) + nsec,
+            'negative': pack('!HHHHHH', 0, FLAGS_RESPONSE, 0, 1, 0, 0) + nsec,
+            'legacy'  : address(LEGACY_TTL, False),
+            'goodbye' : pack('!HHHHHH', 0, FLAGS_RESPONSE, 0, 1, 0, 0) + address(0, False),
+            'probe'   : pack('!HHHHHH', 0, 0, 1, 0, 1, 0) + qname + pack('!HH', TYPE_ANY, CLASS_IN | CLASS_UNIQUE) + address(self.__ttl, False),
+            'address' : published,
+        }
+
+    async def __probe(self) :
+        """Send the three probes of each name, and return False if another host answered for one of them."""
+        self.__conflicts = set()
+        self.__probing = True
+        for i in range(3) :
+            for name, entry in self.__table.items() :
+                self.__send(entry['probe'], (MDNS_ADDRESS, MDNS_PORT))
+            await sleep(PROBE_INTERVAL)
+        self.__probing = False
+        for name in self.__conflicts :
+            error(f"Name {name} is already used on {self.__interface}")
+        return len(self.__conflicts) == 0
+
+    def __announce(self, name) :
+        """Multicast the answer of a name."""
+        self.__send(self.__table[name]['answer'], (MDNS_ADDRESS, MDNS_PORT))
+        self.__multicast[name] = monotonic()
+
+    def __announce_all(self) :
+        """Multicast unsolicited answers of all the names, if the responder is still running."""
+        if self.__socket is not None :
+            for name in self.__table :
+                self.__announce(name)
+                self.__statistics['announcements'].inc()
+
+    def __send(self, packet, address) :
+        """Send a packet, logging failures."""
+        try :
+            self.__socket.sendto(packet, address)
+        except OSError as e :
+            error(f"Failed to send mDNS packet on {self.__interface} : {e}")
+
+    def __receive(self) :
+        """Process the pending mDNS packets."""
+        while self.__socket is not None :
+            try :
+                packet, sender = self.__socket.recvfrom(9000)
+            except BlockingIOError :
+                break
+            except OSError as e :
+                error(f"mDNS reception failed on {self.__interface} : {e}")
+                break
+
+            # Ignore our own multicast packets, looped back
+            if sender == (self.__ip, MDNS_PORT) : continue
+
+            try :
+                self.__handle(packet, sender, perf_counter())
+            except (IndexError, ValueError, struct_error) :
+                debug(f"Malformed mDNS packet from {sender[0]} on {self.__interface}")
+
+    def __handle(self, packet, sender, received) :
+        """
+        Answer a query for one of our names, or check a response or a probe for conflicts.
+
+        Parameters:
+        - packet: received mDNS message.
+        - sender: (ip, port) of the sender.
+        - received: perf_counter() time of the reception, from which the answer latency is measured.
+        """
+
+        identifier, flags, questions, answered, authorities = unpack_from('!HHHHH', packet)
+
+        if flags & FLAGS_QUERY :
+            self.__check(packet, False)
+            return
+        if flags & FLAGS_OPCODE : return
+        if authorities > 0 and self.__probing : self.__check(packet, True)
+
+        self.__statistics['queries'].inc()
+
+        legacy = sender[1] != MDNS_PORT
+        offset = 12
+        for i in range(questions) :
+            start = offset
+            name, offset = decode_name(packet, offset)
+            kind, klass = unpack_from('!HH', packet, offset)
+            offset += 4
+
+            entry = self.__table.get(name)
+            self.__question(name if entry is not None else None, kind).inc()
+            if entry is None or kind not in (TYPE_A, TYPE_AAAA, TYPE_ANY) : continue
+
+            if legacy :
+                # Legacy unicast query (RFC 6762 §6.7) : direct answer, echoing id and question
+                if kind != TYPE_AAAA :
+                    self.__send(pack('!HHHHHH', identifier, FLAGS_RESPONSE, 1, 1, 0, 0) + packet[start:offset] + entry['legacy'], sender)
+                    self.__answered(received)
+            elif kind == TYPE_AAAA :
+                self.__send(entry['negative'], sender if klass & CLASS_UNIQUE else (MDNS_ADDRESS, MDNS_PORT))
+            elif klass & CLASS_UNIQUE :
+                # Unicast response requested
+                self.__send(entry['answer'], sender)
+                self.__answered(received)
+            elif monotonic() - self.__multicast.get(name, 0) >= MULTICAST_DELAY :
+                self.__announce(name)
+                self.__answered(received)
+            else :
+                # Answer multicast less than a second ago, the client received it too
+                self.__statistics['suppressed'].inc()
+
+    def __answered(self, received) :
+        """Account for an answer sent."""
+        self.__statistics['answers'].inc()
+        self.__latency.observe(perf_counter() - received)
+
+    def __question(self, name, kind) :
+        """Return the counter of the questions for a name and a record type, None standing for all the other names."""
+        result = self.__questions.get((name, kind))
+        if result is None :
+            result = self.__metrics.counter('resolver_questions', interface=self.__interface, host=name or 'other', type=TYPES.get(kind, str(kind)))
+            self.__questions[(name, kind)] = result
+        return result
+
+    def __check(self, packet, probe) :
+        """
+        Look for another host claiming one of our names.
+        While probing, a conflicting answer, or a simultaneous probe winning the
+        tie-break (RFC 6762 §8.2), makes the probe fail. Once the names are
+        published, our answer is multicast again to defend them.
+        """
+        for name, address in records(packet) :
+            if name not in self.__table or address == self.__table[name]['address'] : continue
+            if self.__probing :
+                if not probe or address > self.__table[name]['address'] :
+                    self.__conflicts.add(name)
+                    self.__statistics['conflicts'].inc()
+            elif not probe :
+                error(f"Name {name} claimed by another host with address {'.'.join(str(b) for b in address)} on {self.__interface}")
+                self.__statistics['conflicts'].inc()
+                if monotonic() - self.__multicast.get(name, 0) >= PROBE_INTERVAL :
+                    self.__announce(name)
+                    self.__statistics['announcements'].inc()
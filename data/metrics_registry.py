@@ -0,0 +1,122 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the metrics registry shared by all
+the plugins hosted by the LimeNurse daemon. Plugins create
+their counters and gauges once, then update them on their hot
+path. The daemon publishes the registry content periodically.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from json               import dump
+from os                 import path, makedirs, replace
+from logging            import error
+
+
+class Metric :
+    """Single metric value, identified by its name and labels."""
+
+    __slots__ = ('name', 'labels', 'kind', 'value')
+
+    def __init__(self, name, labels, kind):
+        """
+        Initialize the metric.
+
+        Parameters:
+        - name: metric name, prefixed by the owning plugin name.
+        - labels: dictionary of labels distinguishing the metric instances.
+        - kind: counter, gauge or summary.
+        """
+        self.name = name
+        self.labels = labels
+        self.kind = kind
+        self.value = 0
+
+    def inc(self, amount=1) :
+        """Increment the metric value."""
+        self.value += amount
+
+    def set(self, value) :
+        """Set the metric value. Reserved to gauges."""
+        self.value = value
+
+    def key(self) :
+        """Return the metric identifier, in the prometheus text format."""
+        result = self.name
+        if self.labels :
+            result = result + '{' + ','.join(f'{k}="{v}"' for k, v in sorted(self.labels.items())) + '}'
+        return result
+
+
+class Summary(Metric) :
+    """Distribution of observed values, exposing their count, sum and maximum."""
+
+    __slots__ = ()
+
+    def __init__(self, name, labels, kind):
+        """Initialize the summary with no observation."""
+        super().__init__(name, labels, kind)
+        self.value = { 'count' : 0, 'sum' : 0.0, 'max' : 0.0 }
+
+    def observe(self, value) :
+        """Record an observed value."""
+        self.value['count'] += 1
+        self.value['sum'] += value
+        if value > self.value['max'] : self.value['max'] = value
+
+
+class MetricsRegistry :
+    """Registry of all the metrics exposed by the daemon."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.__metrics = {}
+
+    def counter(self, name, **labels) :
+        """Return the counter with the given name and labels, creating it if needed."""
+        return self.__get(name, labels, 'counter')
+
+    def gauge(self, name, **labels) :
+        """Return the gauge with the given name and labels, creating it if needed."""
+        return self.__get(name, labels, 'gauge')
+
+    def summary(self, name, **labels) :
+        """Return the summary with the given name and labels, creating it if needed."""
+        return self.__get(name, labels, 'summary')
+
+    def snapshot(self) :
+        """Return a dictionary of all metric values indexed by metric identifiers."""
+        return { key : (dict(metric.value) if metric.kind == 'summary' else metric.value) for key, metric in self.__metrics.items() }
+
+    def export(self, filename) :
+        """
+        Write the registry content as json, atomically so that readers
+        never see a partially written file.
+
+        Parameters:
+        - filename: path of the file to write.
+        """
+        result = True
+        try :
+            makedirs(path.dirname(filename), exist_ok=True)
+            with open(filename + '.tmp', 'w') as file :
+                dump(self.snapshot(), file, indent=1, sort_keys=True)
+            replace(filename + '.tmp', filename)
+        except Exception as e :
+            error(f"Failed to export metrics to {filename} : {e}")
+            result = False
+        return result
+
+    def __get(self, name, labels, kind) :
+        """Retrieve or create a metric."""
+        metric = Summary(name, labels, kind) if kind == 'summary' else Metric(name, labels, kind)
+        key = metric.key()
+        if key not in self.__metrics :
+            self.__metrics[key] = metric
+        return self.__metrics[key]
@@ -0,0 +1,236 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script checks the MTU of the Pi interfaces against the
+configured ones, and measures the path MTU of the Limelight
+links with unfragmentable pings, to tell the largest packet
+a client can send to each Limelight without fragmentation.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from os                 import path, getpid
+from select             import select
+from struct             import pack, unpack_from
+from time               import monotonic
+from socket             import socket, inet_aton, AF_INET, SOCK_RAW, IPPROTO_ICMP, IPPROTO_IP, SOL_SOCKET, SO_BINDTODEVICE
+from sys                import exit
+from logging            import basicConfig, info, error, INFO
+
+# Local includes
+from topology           import Topology, read_env, load, CLIENTS
+
+# Variable holding the configured MTU of each client interface
+MTUS            = { 'usb0' : 'USB_MTU_LINUX', 'usb1' : 'USB_MTU_WINDOWS', 'eth0' : 'ETH_MTU' }
+
+# Linux socket options : setting DF on every packet, without fragmenting locally nor using the cached path MTU
+IP_MTU_DISCOVER     = 10
+IP_PMTUDISC_PROBE   = 3
+
+ICMP_ECHO_REQUEST   = 8
+ICMP_ECHO_REPLY     = 0
+
+# IPv4 and ICMP headers sizes, an echo of a given IP packet size carries this much less payload
+HEADERS         = 28
+
+# TCP and IPv4 headers sizes, the MSS of a path being its MTU minus these
+TCP_HEADERS     = 40
+
+MIN_MTU         = 68
+
+
+def checksum(data) :
+    """Return the internet checksum of a message."""
+    if len(data) % 2 : data += b'\x00'
+    total = sum(unpack_from(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def interface_mtu(interface) :
+    """Return the MTU of an interface, None if it is not present."""
+    result = None
+    if path.exists(f'/sys/class/net/{interface}/mtu') :
+        with open(f'/sys/class/net/{interface}/mtu', 'r', encoding='utf-8') as f :
+            result = int(f.read().strip())
+    return result
+
+
+class MtuProbe :
+    """
+    Measure the path MTU to an address with ICMP echo requests that routers may
+    not fragment, searching by dichotomy the largest one answered.
+    """
+
+    def __init__(self, timeout=0.5, attempts=2) :
+        """
+        Initialize the probe.
+
+        Parameters:
+        - timeout: delay in seconds after which an echo request is considered lost.
+        - attempts: number of echo requests of a size sent before considering it does not pass.
+        """
+        self.__timeout = timeout
+        self.__attempts = attempts
+        self.__identifier = getpid() & 0xffff
+        self.__sequence = 0
+
+    def path_mtu(self, address, interface=None) :
+        """
+        Return the path MTU to an address, None if it does not answer even the smallest packets.
+
+        Parameters:
+        - address: IPv4 address to probe.
+        - interface: interface to send the probes through, None to follow the routing table.
+        """
+
+        result = None
+
+        sock = socket(AF_INET, SOCK_RAW, IPPROTO_ICMP)
+        try :
+            sock.setsockopt(IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+            high = 65535
+            if interface is not None :
+                sock.setsockopt(SOL_SOCKET, SO_BINDTODEVICE, interface.encode('ascii'))
+                high = interface_mtu(interface) or high
+
+            low = MIN_MTU
+            if self.__passes(sock, address, low) :
+                # Largest size passing in low, smallest failing above high
+                high += 1
+                while high - low > 1 :
+                    middle = (low + high) // 2
+                    if self.__passes(sock, address, middle) : low = middle
+                    else : high = middle
+                result = low
+        finally :
+            sock.close()
+
+        return result
+
+    def __passes(self, sock, address, size) :
+        """Return True if an echo request of an IP packet size gets an answer."""
+
+        result = False
+
+        for attempt in range(self.__attempts) :
+            self.__sequence = (self.__sequence + 1) & 0xffff
+            header = pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self.__identifier, self.__sequence)
+            payload = bytes(size - HEADERS)
+            packet = pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum(header + payload), self.__identifier, self.__sequence) + payload
+            try :
+                sock.sendto(packet, (address, 0))
+            except OSError :
+                # Larger than the interface MTU : the kernel refuses to send it unfragmented
+                break
+            if self.__answered(sock, address, self.__sequence) :
+                result = True
+                break
+
+        return result
+
+    def __answered(self, sock, address, sequence) :
+        """Wait for the echo reply of a sequence number, return False if it did not come in time."""
+
+        result = False
+
+        deadline = monotonic() + self.__timeout
+        source = inet_aton(address)
+        while not result and monotonic() < deadline :
+            readable, writable, errors = select([sock], [], [], max(0, deadline - monotonic()))
+            if len(readable) == 0 : break
+            packet = sock.recv(65535)
+            offset = (packet[0] & 0x0f) * 4
+            if packet[12:16] != source or len(packet) < offset + 8 : continue
+            kind, code, check, identifier, number = unpack_from('!BBHHH', packet, offset)
+            result = kind == ICMP_ECHO_REPLY and identifier == self.__identifier and number == sequence
+
+        return result
+
+
+def check(env, sections, probe) :
+    """
+    Check that the client and Limelight interfaces have their configured MTU, that the
+    Limelight links carry packets of this size unfragmented, and log the largest packet
+    and TCP segment each client interface can send to each Limelight. Return True if
+    all the present interfaces match their configuration.
+
+    Parameters:
+    - env: configuration variables, with the client interfaces MTUs.
+    - sections: Limelight topology sections.
+    - probe: MtuProbe measuring the Limelight links.
+    """
+
+    result = True
+
+    topology = Topology()
+    if not topology.configure(env, sections) : return False
+
+    clients = {}
+    for interface, variable in CLIENTS :
+        mtu = interface_mtu(interface)
+        if mtu is None : continue
+        expected = int(env.get(MTUS[interface], 1500))
+        if mtu != expected :
+            error(f"{interface} MTU is {mtu} instead of {expected}")
+            result = False
+        clients[interface] = mtu
+
+    for limelight in topology.limelights() :
+        mtu = interface_mtu(limelight.interface)
+        if mtu is None :
+            info(f"{limelight.name} interface {limelight.interface} is not present")
+            continue
+        if mtu != limelight.mtu :
+            error(f"{limelight.interface} MTU is {mtu} instead of {limelight.mtu}")
+            result = False
+
+        measured = probe.path_mtu(limelight.address, limelight.interface)
+        if measured is None :
+            error(f"{limelight.name} at {limelight.address} does not answer pings")
+            result = False
+            continue
+        if measured < mtu :
+            error(f"{limelight.name} path MTU is {measured}, below the {mtu} of {limelight.interface}")
+            result = False
+        else :
+            info(f"{limelight.name} path MTU is {measured} on {limelight.interface}")
+
+        for interface, client in clients.items() :
+            effective = min(client, measured)
+            info(f"{interface} to {limelight.name} : packets up to {effective} bytes, TCP segments up to {effective - TCP_HEADERS} bytes")
+
+    return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    # Command-line interface to select the action and the configuration
+    parser = ArgumentParser(description="Limelight links MTU check")
+    parser.add_argument("action", choices=["check", "probe"], help="Check the Pi interfaces and Limelight links, or measure the path MTU to an address")
+    parser.add_argument("address", nargs="?", default="172.29.0.1", help="Address to probe")
+    parser.add_argument("--interface", dest="interface", default=None, help="Interface to probe through, the routing table by default")
+    parser.add_argument("--env", dest="env", default=None, help="Env file with the gateway addresses and MTUs, the process environment by default")
+    parser.add_argument("--topology", dest="topology", default=None, help="Topology file, a single Limelight on eth1 by default")
+    parser.add_argument("--timeout", dest="timeout", type=float, default=0.5, help="Delay in seconds after which a ping is considered lost")
+
+    args = parser.parse_args()
+
+    probe = MtuProbe(args.timeout)
+    if args.action == "check" :
+        exit(0 if check(read_env(args.env), load(args.topology), probe) else 1)
+
+    measured = probe.path_mtu(args.address, args.interface)
+    if measured is None :
+        error(f"{args.address} does not answer pings")
+        exit(1)
+    print(f"{args.address} path MTU {measured}, MSS {measured - TCP_HEADERS}")
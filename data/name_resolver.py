@@ -3,250 +3,348 @@
 # All rights reserved
 # -------------------------------------------------------
 """
-This script implements a mDNS server to manage name 
+This plugin implements a mDNS server to manage name
 resolution on each of the Pi interfaces
 """
 # -------------------------------------------------------
 # Nadège LEMPERIERE, @7th May 2025
-# Latest revision: 7th May 2025
+# Latest revision: 19th October 2026
 # -------------------------------------------------------
 
 
 # System includes
-from socket             import inet_ntoa, inet_aton, socket, AF_INET, SOCK_DGRAM
-from fcntl              import ioctl
-from struct             import pack
-from time               import sleep
-from argparse           import ArgumentParser
-from signal             import signal, SIGINT, SIGTERM
-from logging            import info, error, DEBUG, Formatter, getLogger
-from logging.handlers   import RotatingFileHandler
+from asyncio            import get_running_loop, gather, Lock
+from importlib          import import_module
+from time               import monotonic
+from logging            import info, error
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+from mdns_probe         import time_to_resolvable
+from dns_server         import UnicastDnsServer
+from topology           import gateway_address
+
+# Available responder engines : engine option value -> (module, class)
+ENGINES = {
+    'builtin'   : ('mdns_responder', 'MdnsResponder'),
+    'zeroconf'  : ('zeroconf_responder', 'ZeroconfResponder'),
+}
+
+
+class NameResolver(DaemonPlugin) :
+    """
+    Publish names on the Pi interfaces.
+
+    Each interface has its own responder, bound to its address only and
+    publishing its names with this address only, so that a client always
+    receives the address it can reach, whatever the interface it is on.
+    With several Limelights, the n-th name of an interface is published with
+    the n-th address after the interface one, at which the clients reach the
+    n-th Limelight.
+    Responders are created and closed as interfaces come and go, no socket
+    is ever opened on the other interfaces of the Pi.
+    """
 
-# Zeroconf includes
-from zeroconf           import Zeroconf, ServiceInfo, IPVersion
-
-
-class NameResolver :
-    
     def __init__(self):
-        """Initialize the UdpForwarder with default None sockets and parameters."""
+        """Initialize the NameResolver with no published service."""
         self.__is_running = False
 
-        self.__dns  = None
-        self.__services = []
+        # Responders and their published address, indexed by interface
+        self.__engine = None
+        self.__responders = {}
+        self.__published = {}
+
+        # Unicast DNS servers, indexed by interface
+        self.__servers = {}
+        self.__dns_port = 53
+        self.__dns_ttl = 10
+        self.__ttl = 120
 
         self.__interfaces = [ ]
+        self.__monitor = None
+
+        # Interface changes waiting for the interface to settle, indexed by interface
+        self.__settle = 0.1
+        self.__pending = {}
+
+        # Updates and measures running, kept until they are done so that stop() ends them
+        self.__tasks = set()
+
+        self.__lock = Lock()
 
-    def configure(self, usb, eth) :
+        # Publication counters
+        self.__statistics = {}
+        self.__metrics = None
+
+    def configure(self, options, interfaces, metrics) :
         """
-        Configure the forwarder with source and destination IPs and interfaces.
+        Configure the resolver with the names to publish.
 
         Parameters:
-        - usb: Name to publish on usb interface 
-        - eth: Name to publish on ethernet interface
+        - options: resolver section, with
+            - usb: Comma separated names to publish on usb interfaces, one per Limelight
+            - eth: Comma separated names to publish on ethernet interface, one per Limelight
+            - settle: Delay in seconds during which successive changes of an interface are merged
+            - engine: Responder engine, builtin or zeroconf
+            - dns_port: Port of the unicast DNS server on each interface address, 0 to disable it
+            - dns_ttl: Time to live in seconds of the unicast DNS answers
+            - ttl: Time to live in seconds of the mDNS records
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
         """
 
-        self.__services = []
-        self.__dns = Zeroconf(ip_version=IPVersion.V4Only)
-
-        self.__interfaces = [ 
-            (usb, ["usb0", "usb1"]),
-            (eth, ["eth0"])
+        module, name = ENGINES[options.get('engine', 'builtin')]
+        self.__engine = getattr(import_module(module), name)
+
+        self.__responders = {}
+        self.__published = {}
+        self.__servers = {}
+        self.__dns_port = options.getint('dns_port', 53)
+        self.__dns_ttl = options.getint('dns_ttl', 10)
+        self.__ttl = options.getint('ttl', 120)
+        self.__monitor = interfaces
+        self.__metrics = metrics
+        self.__settle = options.getfloat('settle', 0.1)
+
+        self.__interfaces = [
+            ([name.strip() for name in options.get('usb').split(',')], ["usb0", "usb1"]),
+            ([name.strip() for name in options.get('eth').split(',')], ["eth0"])
         ]
 
-        handler = RotatingFileHandler('/var/log/name_forwarder.log', maxBytes=5*1024*1024, backupCount=3)
-        formatter = Formatter('%(asctime)s - line %(lineno)d - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        getLogger().setLevel(DEBUG)
-        getLogger().addHandler(handler)
+        for interface in self.__names() :
+            interfaces.watch(interface, self.__on_interface_change)
+
+        for counter in ['registrations', 'updates', 'withdrawals', 'unresolvable', 'missing_addresses', 'errors'] :
+            self.__statistics[counter] = metrics.counter('resolver_' + counter)
+
+    async def start(self) :
+        """
+        Publish on each available interface its names with its address.
+        Interfaces not yet plugged are published as soon as they come up.
+        """
+
+        result = True
+
+        info(f" Starting resolver")
 
         self.__is_running = True
 
-    def start(self) :
+        async with self.__lock :
+            for interface, names in self.__names().items() :
+
+                ip = self.__address(interface)
+                if ip is None : continue
+
+                try :
+                    if await self.__publish(interface, names, ip) :
+                        for name, address in self.__addresses(names, ip).items() :
+                            info(" Publishing name " + name + " on " + address)
+                    else :
+                        result = False
+
+                except Exception as e :
+                    result = False
+                    error("Failed to publish on " + interface + " : " + str(e))
+                    self.__statistics['errors'].inc()
+
+            if not result :
+                # Withdraw partial publication so that next attempt starts clean
+                for interface in list(self.__responders.keys()) :
+                    await self.__withdraw(interface)
+
+        return result
+
+    async def stop(self) :
+        """Stop all names publication."""
+
+        info("Stopping resolver")
+
+        self.__is_running = False
+
+        for timer, since in self.__pending.values() : timer.cancel()
+        self.__pending = {}
+
+        tasks = list(self.__tasks)
+        for task in tasks : task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+        async with self.__lock :
+            for interface in list(self.__responders.keys()) :
+                await self.__withdraw(interface)
+
+    async def update(self, interface, since=None) :
         """
-        Initialize and bind raw and UDP sockets for forwarding.
+        Republish the names of an interface if its address changed.
+        The responder is kept and moves the names it already owns to the
+        new address, announcing them without probing. The responder is
+        closed when the interface goes down or away, and created again,
+        probing its names, when it comes back.
 
-        Sets up:
-        - Raw sockets bound to input interfaces to capture all IPv4 packets.
-        - Raw socket bound to output interface for backward direction.
-        - UDP datagram sockets for sending and receiving broadcast packets.
+        Parameters:
+        - interface: the interface whose address changed.
+        - since: monotonic time of the address change, from which the time to resolvable is measured.
         """
 
-        result = True
+        names = self.__names().get(interface, [])
+        ip = None
 
-        info(f" Starting forwarder")
+        async with self.__lock :
 
-        signal(SIGTERM, self.__handle_signal)
-        signal(SIGINT, self.__handle_signal)
+            # The plugin stopped while this update was waiting for the lock
+            if not self.__is_running : return
 
-        self.__services = []
+            ip = self.__address(interface)
+            published = self.__published.get(interface)
 
-        for name, interfaces in self.__interfaces :
+            try :
+                if ip is None :
+                    if published is not None :
+                        info(f"No IP left on {interface}, withdrawing {', '.join(names)}.")
+                        await self.__withdraw(interface)
+                        self.__statistics['withdrawals'].inc()
 
-            ips = []
-            for interface in interfaces :
-                try :  
-                    ip = NameResolver.__ip_address(interface)
-                    if not ip : raise Exception()
-                    ips.append(inet_aton(ip))
-
-                except Exception :
-                    result = False 
-                    error("No IP found for interface " + interface)
-
-            try : 
-                if len(ips) != 0 : 
-                    service = ServiceInfo(
-                        type_="_http._tcp.local.",
-                        name=f"{name}._http._tcp.local.",
-                        addresses=ips,
-                        port=80,  # Dummy port — ignored for name resolution
-                        properties={},
-                        server=name,
-                    )
-                    self.__dns.register_service(service)
-                    self.__services.append(service)
-                    for ip in ips :
-                        info(" Publishing name " + name + " on " + str(inet_ntoa(ip)))
-
-            except Exception as e :
-                result = False 
-                error("Failed to register " + interface + " : " + str(e))
-        
-        return (result or not self.__is_running)
-
-    def process(self):
+                elif published != ip :
+                    if published is not None :
+                        info(f"IP {published} no longer valid on {interface}, updating {', '.join(names)}.")
+                    info(f"New IP {ip} found on {interface}, updating {', '.join(names)}.")
+                    if published is None :
+                        if not await self.__publish(interface, names, ip) : ip = None
+                    else :
+                        await self.__move(interface, names, ip)
+                    self.__statistics['updates'].inc()
+
+                else :
+                    ip = None
+
+            except Exception as e:
+                error(f"Error updating services on {interface}: {e}")
+                self.__statistics['errors'].inc()
+                ip = None
+
+        if ip is not None :
+            for name, address in self.__addresses(names, ip).items() :
+                self.__spawn(self.__measure(name, address, since))
+
+    async def __publish(self, interface, names, ip) :
         """
-        Keep publication alive.
-        Update services to keep name active
+        Start a responder bound to the interface address, publishing its names, and
+        the unicast DNS server answering them on this address.
+        A name already published on another interface is not probed again, the
+        responders cooperating to answer for it.
+        Return False if the names are used by another host.
         """
-        i_iteration = 0
-        while self.__is_running:
-
-            if i_iteration % 6 == 0 :
-
-                services = []
-
-                for name, interfaces in self.__interfaces :
-
-                    ips = []
-                    for interface in interfaces :
-                        try :  
-                            ip = NameResolver.__ip_address(interface)
-                            if not ip : raise Exception()
-                            ips.append(inet_aton(ip))
-
-                        except Exception :
-                            error("No IP found for interface " + interface)
-
-                    try : 
-                        if len(ips) != 0 : 
-                            matching_service = next((s for s in self.__services if s.server == name), None)
-                            if matching_service :
-                                shall_update = False
-                                for ip in ips :
-                                    if not ip in matching_service.addresses :
-                                        info(f"New IP found for {name} changed from {inet_ntoa(ip)}, updating service.")
-                                        shall_update = True
-                                for address in matching_service.addresses :
-                                    if not address in ips :
-                                        info(f"IP no {address} longer valid for {name}, updating service.")
-                                        shall_update = True
-                                
-                                if shall_update :
-
-                                    # Unregister old and register new
-                                    self.__dns.unregister_service(matching_service)
-                                    self.__services.remove(matching_service)
-
-                                    new_service = ServiceInfo(
-                                        type_="_http._tcp.local.",
-                                        name=f"{name}._http._tcp.local.",
-                                        addresses=ips,
-                                        port=80,
-                                        properties={},
-                                        server=name,
-                                    )
-                                    self.__dns.register_service(new_service)
-                                    services.append(new_service)
-                                else:
-                                    self.__dns.update_service(matching_service)
-                                    services.append(matching_service)
-                                    for ip in ips : 
-                                        info(f"Refreshed service for {name} at {inet_ntoa(ip)}")
-                            else:
-                                # No service published yet, possibly reinitialization
-                                new_service = ServiceInfo(
-                                    type_="_http._tcp.local.",
-                                    name=f"{name}._http._tcp.local.",
-                                    addresses=ips,
-                                    port=80,
-                                    properties={},
-                                    server=name,
-                                )
-                                self.__dns.register_service(new_service)
-                                services.append(new_service)
-                                for ip in ips : 
-                                    info(f"Registered new service for {name} at {inet_ntoa(ip)}")
-
-                    except Exception as e:
-                        error(f"Error updating service for {name}: {e}")
-
-                # Replace the services list with updated references
-                self.__services = services
-
-            i_iteration = i_iteration+ 1    
-            sleep(5)
-
-    def stop(self) :
-        """Stop all names publication."""
+        probe = not any(name in self.__names().get(other, []) for other in self.__published for name in names)
 
-        info("Stopping")
+        responder = self.__engine(interface, ip, self.__addresses(names, ip), self.__metrics, self.__ttl)
+        self.__responders[interface] = responder
+        self.__published[interface] = ip
 
-        for service in self.__services:
-            self.__dns.unregister_service(service)
-        self.__dns.close()
+        try :
+            result = await responder.start(probe)
+        except Exception :
+            await self.__withdraw(interface)
+            raise
 
-    def __handle_signal(self, signum, frame):
-        """Handle termination signals to cleanly stop the forwarder."""
-        info("Signal received, exiting...")
-        self.__is_running = False
+        if result :
+            self.__statistics['registrations'].inc(len(names))
+            self.__serve(interface, names, ip)
+        else :
+            await self.__withdraw(interface)
+
+        return result
 
-    def __ip_address(ifname):
-        try:
-            s = socket(AF_INET, SOCK_DGRAM)
-            return inet_ntoa(
-                ioctl(
-                    s.fileno(),
-                    0x8915,
-                    pack('256s', ifname[:15].encode())
-                )[20:24]
-            )
-        except Exception:
-            return None
-
-if __name__ == "__main__":
-
-    # Instantiate the UDP forwarder
-    resolver = NameResolver()
-
-    # Command-line interface to specify source/destination IPs and interfaces
-    parser = ArgumentParser(description="Name resolver for Limelight access through multiple interfaces")
-    parser.add_argument("--usb", dest="usb", required=True, help="Name to publish on usb gadget interface")
-    parser.add_argument("--eth", dest="eth", required=True, help="Name to publish on ethernet interface")
-
-
-    args = parser.parse_args()
-
-    # Configure and start the forwarder
-    resolver.configure(args.usb, args.eth)
-
-    started = False
-    while not started : 
-        started = resolver.start()
-        sleep(1)
-    
-    info("mDNS resolver running. Press Ctrl+C to stop.")
-    resolver.process()
-    resolver.stop()
-    
\ No newline at end of file
+    async def __move(self, interface, names, ip) :
+        """
+        Move the names of an interface to its new address : its responder swaps their
+        address records, so that clients see no withdrawal of the names, and the unicast
+        DNS server is bound again on the new address.
+        """
+        self.__published[interface] = ip
+
+        server = self.__servers.pop(interface, None)
+        if server is not None : server.stop()
+
+        try :
+            await self.__responders[interface].update(ip, self.__addresses(names, ip))
+        except Exception :
+            await self.__withdraw(interface)
+            raise
+
+        self.__serve(interface, names, ip)
+
+    def __serve(self, interface, names, ip) :
+        """Start the unicast DNS server answering the names of an interface on its address."""
+        if self.__dns_port > 0 :
+            # Names stay published through mDNS if the DNS port is not available
+            server = UnicastDnsServer(interface, ip, self.__addresses(names, ip), self.__metrics, self.__dns_ttl, self.__dns_port)
+            if server.start() : self.__servers[interface] = server
+            else : self.__statistics['errors'].inc()
+
+    async def __withdraw(self, interface) :
+        """Withdraw the names of an interface and close its responder and DNS server."""
+        server = self.__servers.pop(interface, None)
+        if server is not None : server.stop()
+        responder = self.__responders.pop(interface, None)
+        self.__published.pop(interface, None)
+        if responder is not None :
+            await responder.stop()
+
+    async def __measure(self, name, ip, since) :
+        """Measure the time until the name resolves to a new address, and publish it as a metric."""
+        try :
+            elapsed = await time_to_resolvable(name, ip, since)
+            if elapsed is None :
+                error(f"{name} still not resolvable at {ip}")
+                self.__statistics['unresolvable'].inc()
+            else :
+                info(f"{name} resolvable at {ip} {elapsed * 1000:.1f}ms after its address change")
+                self.__metrics.gauge('resolver_time_to_resolvable_seconds', host=name).set(elapsed)
+        except Exception as e :
+            error(f"Failed to measure time to resolvable for {name} at {ip}: {e}")
+
+    def __names(self) :
+        """Return the names to publish, indexed by interface."""
+        result = {}
+        for names, interfaces in self.__interfaces :
+            for interface in interfaces :
+                result.setdefault(interface, []).extend(names)
+        return result
+
+    def __addresses(self, names, ip) :
+        """Return the address published for each name of an interface, the n-th name being reached n addresses after the interface one."""
+        result = { name : gateway_address(ip, index) for index, name in enumerate(names) }
+        return result
+
+    def __address(self, interface) :
+        """Return the IPv4 address of an interface, from the shared interface state, or None if it is down."""
+        result = None
+        state = self.__monitor.state(interface)
+        if state.up and state.address :
+            result = state.address
+        else :
+            info("No IP found for interface " + interface)
+            self.__statistics['missing_addresses'].inc()
+        return result
+
+    def __on_interface_change(self, interface, state) :
+        """
+        Republish the names published on an interface whose state changed, once
+        the interface settled : plugging an interface raises several changes in a
+        row, which shall lead to a single responder rebuild.
+        """
+        if self.__is_running :
+            timer, since = self.__pending.get(interface, (None, monotonic()))
+            if timer is not None : timer.cancel()
+            timer = get_running_loop().call_later(self.__settle, self.__on_interface_settled, interface)
+            self.__pending[interface] = (timer, since)
+
+    def __on_interface_settled(self, interface) :
+        """Republish the names of an interface whose state stopped changing."""
+        timer, since = self.__pending.pop(interface)
+        self.__spawn(self.update(interface, since))
+
+    def __spawn(self, coroutine) :
+        """Run a coroutine in a task kept until it is done, so that it is neither collected nor left running by stop()."""
+        task = get_running_loop().create_task(coroutine)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
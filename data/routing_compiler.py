@@ -0,0 +1,403 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script compiles the Limelight routing ruleset from the
+gateway configuration and the interfaces present on the Pi,
+compares it to the ruleset loaded in the kernel, and applies
+the differences in a single nftables transaction.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from os                 import path
+from re                 import compile as regex
+from subprocess         import run, PIPE
+from sys                import exit
+from logging            import basicConfig, info, error, INFO
+
+# Local includes
+from topology           import Topology, read_env, load, CLIENTS
+
+TABLE           = 'ip limelight'
+FLOWTABLE       = 'fastpath'
+
+# Control Hub results ports, and the mark of their packets, prioritized over the other traffic
+PRIORITY_PORTS  = [5806, 5807]
+PRIORITY_MARK   = 1
+
+# Base chains, in creation order, with their type, hook and policy as listed by nft
+CHAINS = [
+    ('raw_prerouting',      'type filter hook prerouting priority raw; policy accept;'),
+    ('mangle_prerouting',   'type filter hook prerouting priority mangle; policy accept;'),
+    ('prerouting',          'type nat hook prerouting priority dstnat; policy accept;'),
+    ('forward',             'type filter hook forward priority filter; policy accept;'),
+    ('postrouting',         'type nat hook postrouting priority srcnat; policy accept;'),
+]
+
+# Parts of nft listings which are not part of the rules themselves
+COUNTER         = regex(r'counter packets \d+ bytes \d+')
+HANDLE          = regex(r'\s*# handle \d+$')
+ANONYMOUS_SET   = regex(r'\{ ([^{}]*) \}')
+DEVICES         = regex(r'devices = \{ ([^{}]*) \}')
+
+
+def normalize(rule) :
+    """
+    Return a rule in a form comparable with the nft listing of the same rule :
+    counter values and handles are removed, and anonymous sets sorted, nft
+    listing their elements in the kernel order, or replaced by their element
+    when they have a single one, nft loading them as a plain comparison.
+    """
+    def canonical(match) :
+        elements = sorted(element.strip() for element in match.group(1).split(','))
+        return elements[0] if len(elements) == 1 else '{ ' + ', '.join(elements) + ' }'
+    result = HANDLE.sub('', COUNTER.sub('counter', rule.strip()))
+    result = ANONYMOUS_SET.sub(canonical, result)
+    return result
+
+
+def interface_set(interfaces) :
+    """Return the nft expression matching interface names, as nft lists it : a single name, or an anonymous set."""
+    result = f'"{interfaces[0]}"' if len(interfaces) == 1 else '{ ' + ', '.join(f'"{interface}"' for interface in interfaces) + ' }'
+    return result
+
+
+def value_set(values) :
+    """Return the nft expression matching values such as ports, port ranges or addresses : a single value, or an anonymous set."""
+    result = values[0] if len(values) == 1 else '{ ' + ', '.join(values) + ' }'
+    return result
+
+
+class RoutingCompiler :
+    """
+    Compile the routing ruleset and keep the kernel ruleset in line with it.
+
+    The ruleset is described as the flowtable devices and the rules of each
+    chain of the limelight table. The live ruleset is read back in the same
+    form from the nft listing, so that applying the configuration only
+    replaces the chains which differ, in one atomic transaction : restarting
+    the routing service leaves an up to date ruleset untouched, and a
+    changed one never goes through a state without NAT.
+    """
+
+    def __init__(self, nft='nft') :
+        """
+        Initialize the compiler.
+
+        Parameters:
+        - nft: nft command.
+        """
+        self.__nft = nft
+        self.__limelights = []
+        self.__proxied = []
+        self.__is_ready = False
+
+    def configure(self, env, sections=None) :
+        """
+        Configure the compiler with the gateway addresses and the Limelights.
+        Return False if one of them is missing.
+
+        Parameters:
+        - env: configuration variables, with USB_IP_GATEWAY_LINUX, USB_IP_GATEWAY_WINDOWS and ETH_IP_GATEWAY,
+          and LIMELIGHT_PROXY_PORTS, the TCP ports and port ranges left to the proxy plugin instead of DNAT, if any.
+        - sections: Limelight topology sections, None for the single Limelight on eth1.
+        """
+
+        topology = Topology()
+        result = topology.configure(env, sections if sections is not None else load(None))
+        self.__limelights = topology.limelights()
+        self.__proxied = [ports.strip() for ports in env.get('LIMELIGHT_PROXY_PORTS', '').split(',') if len(ports.strip()) > 0]
+
+        self.__is_ready = result
+        return result
+
+    def compile(self, interfaces=None) :
+        """
+        Compile the ruleset : DNAT of all the traffic from usb0, usb1 and eth0 to the Limelight
+        whose gateway address it targets, except ssh on eth0 and the TCP ports left to the proxy
+        plugin, which stay on the Pi, masquerading
+        on the Limelights interfaces, and established TCP and UDP flows added to the flowtable.
+        The MSS of forwarded TCP connections is clamped to the route MTU, so that clients with
+        a larger MTU than the Limelight link never send segments needing fragmentation.
+        Control Hub results connections are marked, in both directions, for the traffic priority
+        scheme to classify them, and kept out of the flowtable which would bypass the marking.
+        The flowtable counts the packets of the flows it forwards, so that the connection
+        tracking counters keep accounting the offloaded flows.
+        Return a dictionary with the flowtable devices and counting, and the rules of each chain.
+
+        Parameters:
+        - interfaces: interfaces present on the Pi, None to read them from the kernel.
+          A flowtable can only hook existing devices, missing ones stay on the netfilter slow path.
+        """
+
+        clients = [interface for interface, variable in CLIENTS]
+        limelights = [limelight.interface for limelight in self.__limelights]
+
+        # Interfaces whose established flows bypass netfilter through the flowtable
+        if interfaces is None : interfaces = [interface for interface in clients + limelights if path.exists('/sys/class/net/' + interface)]
+        devices = sorted(interface for interface in clients + limelights if interface in interfaces)
+
+        # Handshakes are never offloaded, the clamp sees every SYN
+        forward = ['tcp flags syn tcp option maxseg size set rt mtu']
+        if len(devices) > 0 :
+            forward.append(f'ct state established ct mark != {PRIORITY_MARK:#010x} meta l4proto {{ tcp, udp }} flow add @{FLOWTABLE} counter')
+        forward.append(f'iifname {interface_set(clients)} oifname {interface_set(limelights)} accept')
+        forward.append(f'iifname {interface_set(limelights)} oifname {interface_set(clients)} ct state established,related accept')
+
+        prerouting = []
+        if len(self.__proxied) > 0 :
+            gateways = [gateway for limelight in self.__limelights for gateway in limelight.gateways.values()]
+            prerouting.append(f'ip daddr {value_set(gateways)} tcp dport {value_set(self.__proxied)} return')
+        for limelight in self.__limelights :
+            prerouting.append(f'iifname "usb0" ip daddr {limelight.gateways["usb0"]} dnat to {limelight.address}')
+            prerouting.append(f'iifname "usb1" ip daddr {limelight.gateways["usb1"]} dnat to {limelight.address}')
+            prerouting.append(f'iifname "eth0" ip daddr {limelight.gateways["eth0"]} tcp dport != 22 dnat to {limelight.address}')
+
+        rules = {
+            'raw_prerouting' : [
+                'iifname { "usb0", "usb1" } tcp dport 22 drop',
+            ],
+            'mangle_prerouting' : [
+                f'iifname "usb0" tcp dport {{ {", ".join(str(port) for port in PRIORITY_PORTS)} }} ct mark set {PRIORITY_MARK:#010x}',
+                f'ct mark {PRIORITY_MARK:#010x} meta mark set ct mark',
+            ],
+            'prerouting' : prerouting,
+            'forward' : forward,
+            'postrouting' : [
+                f'oifname {interface_set(limelights)} masquerade',
+            ],
+        }
+
+        result = { 'devices' : devices, 'counter' : True, 'chains' : {} }
+        for chain, header in CHAINS :
+            result['chains'][chain] = { 'header' : header, 'rules' : [normalize(rule) for rule in rules[chain]] }
+
+        return result
+
+    def live(self) :
+        """
+        Read the ruleset loaded in the kernel, in the form returned by compile.
+        Return None if the limelight table does not exist.
+        """
+
+        result = None
+
+        listing = run([self.__nft, '-s', 'list', 'table'] + TABLE.split(), stdout=PIPE, stderr=PIPE, text=True)
+        if listing.returncode == 0 :
+            result = self.parse(listing.stdout)
+
+        return result
+
+    def parse(self, listing) :
+        """
+        Read a ruleset from the nft listing of the limelight table, in the form returned by compile.
+
+        Parameters:
+        - listing: output of nft -s list table ip limelight.
+        """
+
+        result = { 'devices' : None, 'counter' : False, 'chains' : {} }
+        chain = None
+        flowtable = False
+        for line in listing.splitlines() :
+            line = line.strip()
+            if line.startswith('chain ') :
+                chain = { 'header' : '', 'rules' : [] }
+                result['chains'][line.split()[1]] = chain
+            elif line.startswith('flowtable ') :
+                flowtable = line.split()[1] == FLOWTABLE
+                if flowtable : result['devices'] = []
+            elif line == '}' :
+                chain = None
+                flowtable = False
+            elif flowtable and line == 'counter' :
+                result['counter'] = True
+            elif flowtable :
+                devices = DEVICES.search(line)
+                if devices is not None : result['devices'] = sorted(device.strip() for device in devices.group(1).split(','))
+            elif chain is not None and line.startswith('type ') :
+                chain['header'] = line
+            elif chain is not None and len(line) > 0 :
+                chain['rules'].append(normalize(line))
+
+        return result
+
+    def diff(self, desired, live) :
+        """
+        List the differences between the desired and the live rulesets, as readable lines.
+
+        Parameters:
+        - desired: ruleset returned by compile.
+        - live: ruleset returned by live.
+        """
+
+        result = []
+
+        if live is None :
+            result.append(f'- table {TABLE} is missing')
+            return result
+
+        if (live['devices'] or []) != desired['devices'] :
+            result.append(f'~ flowtable {FLOWTABLE} devices {live["devices"]} instead of {desired["devices"]}')
+        if live['devices'] is not None and len(desired['devices']) > 0 and not live['counter'] :
+            result.append(f'~ flowtable {FLOWTABLE} does not count the offloaded packets')
+
+        for chain, content in desired['chains'].items() :
+            current = live['chains'].get(chain)
+            if current is None :
+                result.append(f'- chain {chain} is missing')
+                continue
+            if current['header'] != content['header'] :
+                result.append(f'~ chain {chain} is "{current["header"]}" instead of "{content["header"]}"')
+            unexpected = [rule for rule in current['rules'] if rule not in content['rules']]
+            missing = [rule for rule in content['rules'] if rule not in current['rules']]
+            result.extend(f'+ {chain} : {rule}' for rule in unexpected)
+            result.extend(f'- {chain} : {rule}' for rule in missing)
+            if len(unexpected) == 0 and len(missing) == 0 and current['rules'] != content['rules'] :
+                result.append(f'~ chain {chain} rules are not in order')
+
+        for chain in live['chains'] :
+            if chain not in desired['chains'] : result.append(f'+ chain {chain} is unexpected')
+
+        return result
+
+    def transaction(self, desired, live) :
+        """
+        Build the nft script bringing the live ruleset to the desired one.
+        Only the chains which differ are flushed and filled again, and the
+        flowtable only gets its missing devices, so that the flows already
+        offloaded on the other devices are kept. A flowtable without counter,
+        whose flags cannot be changed, is recreated along with the forward chain.
+        Return an empty string if the live ruleset is up to date.
+
+        Parameters:
+        - desired: ruleset returned by compile.
+        - live: ruleset returned by live.
+        """
+
+        commands = []
+
+        if live is None :
+            commands.append(f'add table {TABLE}')
+            live = { 'devices' : None, 'counter' : False, 'chains' : {} }
+
+        # Flowtable first, the forward chain rules referencing it
+        recreated = live['devices'] is not None and len(desired['devices']) > 0 and not live['counter']
+        if recreated :
+            if 'forward' in live['chains'] : commands.append(f'flush chain {TABLE} forward')
+            commands.append(f'delete flowtable {TABLE} {FLOWTABLE}')
+        missing = [device for device in desired['devices'] if recreated or device not in (live['devices'] or [])]
+        if len(missing) > 0 :
+            commands.append(f'add flowtable {TABLE} {FLOWTABLE} {{ hook ingress priority filter; devices = {{ {", ".join(missing)} }}; counter; }}')
+
+        for chain, content in desired['chains'].items() :
+            current = live['chains'].get(chain)
+            if recreated and chain == 'forward' : current = dict(current, rules=[]) if current is not None else None
+            if current is not None and current['header'] == content['header'] and current['rules'] == content['rules'] : continue
+            if current is not None and current['header'] != content['header'] :
+                commands.append(f'flush chain {TABLE} {chain}')
+                commands.append(f'delete chain {TABLE} {chain}')
+                current = None
+            if current is None :
+                commands.append(f'add chain {TABLE} {chain} {{ {content["header"]} }}')
+            elif len(current['rules']) > 0 :
+                commands.append(f'flush chain {TABLE} {chain}')
+            for rule in content['rules'] :
+                commands.append(f'add rule {TABLE} {chain} {rule}')
+
+        for chain in live['chains'] :
+            if chain not in desired['chains'] :
+                commands.append(f'flush chain {TABLE} {chain}')
+                commands.append(f'delete chain {TABLE} {chain}')
+
+        # Flowtable last, once no rule references it anymore
+        if live['devices'] is not None and len(desired['devices']) == 0 :
+            commands.append(f'delete flowtable {TABLE} {FLOWTABLE}')
+
+        result = ''.join(command + '\n' for command in commands)
+        return result
+
+    def check(self, interfaces=None) :
+        """
+        Compare the live ruleset to the compiled one, logging the drift.
+        Return True if they match.
+
+        Parameters:
+        - interfaces: interfaces present on the Pi, None to read them from the kernel.
+        """
+
+        result = False
+
+        if self.__is_ready :
+            drift = self.diff(self.compile(interfaces), self.live())
+            for line in drift :
+                error(f"Routing drift : {line}")
+            if len(drift) == 0 :
+                info("Routing ruleset up to date")
+            result = len(drift) == 0
+
+        return result
+
+    def apply(self, interfaces=None, dry_run=False) :
+        """
+        Apply the compiled ruleset changes in a single transaction.
+        Return True if the live ruleset is up to date afterwards.
+
+        Parameters:
+        - interfaces: interfaces present on the Pi, None to read them from the kernel.
+        - dry_run: True to log the transaction without applying it.
+        """
+
+        result = False
+
+        if self.__is_ready :
+            desired = self.compile(interfaces)
+            script = self.transaction(desired, self.live())
+
+            if len(script) == 0 :
+                info("Routing ruleset up to date, nothing to apply")
+                result = True
+            elif dry_run :
+                info("Routing transaction :\n" + script)
+                result = True
+            else :
+                loaded = run([self.__nft, '-f', '-'], input=script, stdout=PIPE, stderr=PIPE, text=True)
+                if loaded.returncode != 0 :
+                    error(f"Failed to apply routing transaction : {loaded.stderr.strip()}\n{script}")
+                else :
+                    info(f"Applied {len(script.splitlines())} routing changes")
+                    result = len(self.diff(desired, self.live())) == 0
+                    if not result : error("Routing ruleset still differs from the compiled one after apply")
+
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    # Command-line interface to select the action and the gateway configuration
+    parser = ArgumentParser(description="Limelight routing ruleset compiler")
+    parser.add_argument("action", choices=["compile", "check", "apply"], help="Print the compiled transaction from an empty ruleset, check the live ruleset drift, or apply the changes")
+    parser.add_argument("--env", dest="env", default=None, help="Env file with the gateway addresses, the process environment by default")
+    parser.add_argument("--topology", dest="topology", default=None, help="Limelight topology file, a single Limelight on eth1 by default")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Log the apply transaction without applying it")
+
+    args = parser.parse_args()
+
+    compiler = RoutingCompiler()
+    if not compiler.configure(read_env(args.env), load(args.topology)) :
+        exit(1)
+
+    if args.action == "compile" :
+        print(compiler.transaction(compiler.compile(), None), end='')
+    elif args.action == "check" :
+        exit(0 if compiler.check() else 1)
+    else :
+        exit(0 if compiler.apply(dry_run=args.dry_run) else 1)
@@ -0,0 +1,156 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module provides a low overhead profiling surface for the
+LimeNurse daemons, driven by signals on the live Pi :
+- SIGUSR1 toggles a stack sampling profiler running in a helper
+  thread and writes its result as collapsed stacks, ready to be
+  turned into a flamegraph.
+- SIGUSR2 dumps the stacks of every thread and the daemon counters.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from sys                import _current_frames
+from os                 import path
+from threading          import Thread, Event, enumerate as threads, get_ident
+from traceback          import format_stack
+from signal             import signal, SIGUSR1, SIGUSR2
+from time               import monotonic, strftime
+from logging            import info, error
+
+
+class RuntimeProfiler :
+    """
+    Signal driven sampling profiler.
+
+    Sampling reads the current frame of each thread at a fixed rate, so its
+    cost does not depend on the amount of code executed by the daemon. A
+    sampling session stops by itself after a bounded duration to make sure
+    a forgotten profiler does not keep costing CPU.
+    """
+
+    def __init__(self, name, counters=None, folder='/var/log', frequency=100, duration=30):
+        """
+        Initialize the profiler.
+
+        Parameters:
+        - name: daemon name, used to build output files names.
+        - counters: optional callable returning a dictionary of counters to dump.
+        - folder: folder in which profiles and dumps are written.
+        - frequency: sampling frequency in Hz.
+        - duration: maximal duration of a sampling session in seconds.
+        """
+        self.__name = name
+        self.__counters = counters
+        self.__folder = folder
+        self.__period = 1.0 / frequency
+        self.__duration = duration
+
+        self.__thread = None
+        self.__stop = Event()
+        self.__stacks = {}
+        self.__samples = 0
+
+    def install(self) :
+        """Register the signal handlers. Shall be called from the main thread."""
+        signal(SIGUSR1, self.__handle_toggle)
+        signal(SIGUSR2, self.__handle_dump)
+        info(f" Profiler installed : SIGUSR1 toggles sampling, SIGUSR2 dumps threads and counters")
+
+    def is_sampling(self) :
+        """Return True while a sampling session is in progress."""
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self) :
+        """Start a sampling session if none is in progress."""
+        if not self.is_sampling() :
+            self.__stacks = {}
+            self.__samples = 0
+            self.__stop.clear()
+            self.__thread = Thread(target=self.__sample, name='profiler', daemon=True)
+            self.__thread.start()
+            info(f"Profiling started for at most {self.__duration} seconds")
+
+    def stop(self) :
+        """Stop the sampling session in progress. The profile is written by the sampling thread."""
+        self.__stop.set()
+
+    def dump(self) :
+        """Write the stacks of all threads and the current counters, and return the written file path."""
+
+        result = path.join(self.__folder, f"{self.__name}-dump-{strftime('%Y%m%d-%H%M%S')}.txt")
+
+        names = { thread.ident : thread.name for thread in threads() }
+        lines = []
+        for ident, frame in _current_frames().items() :
+            lines.append(f"Thread {names.get(ident, ident)} :\n")
+            lines.extend(format_stack(frame))
+            lines.append("\n")
+
+        if self.__counters is not None :
+            lines.append("Counters :\n")
+            try :
+                for key, value in sorted(self.__counters().items()) :
+                    lines.append(f"  {key} = {value}\n")
+            except Exception as e :
+                lines.append(f"  unavailable : {e}\n")
+
+        try :
+            with open(result, 'w') as file :
+                file.writelines(lines)
+            info(f"Threads and counters dumped in {result}")
+        except Exception as e :
+            error(f"Failed to write dump {result} : {e}")
+            result = None
+
+        return result
+
+    def __sample(self) :
+        """Sampling thread body : aggregate collapsed stacks until stopped or timed out."""
+
+        own = get_ident()
+        deadline = monotonic() + self.__duration
+
+        while not self.__stop.is_set() and monotonic() < deadline :
+            names = { thread.ident : thread.name for thread in threads() }
+            for ident, frame in _current_frames().items() :
+                if ident == own : continue
+                functions = []
+                while frame is not None :
+                    code = frame.f_code
+                    functions.append(f"{code.co_name} ({path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                functions.append(names.get(ident, str(ident)))
+                stack = ';'.join(reversed(functions))
+                self.__stacks[stack] = self.__stacks.get(stack, 0) + 1
+            self.__samples = self.__samples + 1
+            self.__stop.wait(self.__period)
+
+        self.__write()
+
+    def __write(self) :
+        """Write the aggregated stacks in the collapsed format used by flamegraph.pl."""
+
+        filename = path.join(self.__folder, f"{self.__name}-profile-{strftime('%Y%m%d-%H%M%S')}.folded")
+        try :
+            with open(filename, 'w') as file :
+                for stack, count in sorted(self.__stacks.items()) :
+                    file.write(f"{stack} {count}\n")
+            info(f"Profiling stopped after {self.__samples} samples, written in {filename}")
+        except Exception as e :
+            error(f"Failed to write profile {filename} : {e}")
+
+    def __handle_toggle(self, signum, frame) :
+        """Start sampling if idle, stop it otherwise."""
+        if self.is_sampling() : self.stop()
+        else : self.start()
+
+    def __handle_dump(self, signum, frame) :
+        """Dump threads and counters."""
+        self.dump()
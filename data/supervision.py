@@ -0,0 +1,143 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module provides the helpers used by the LimeNurse daemons
+to cooperate with systemd : readiness and watchdog notifications
+through the sd_notify protocol, and an exponential backoff to pace
+startup retries while the interfaces are not available yet.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from os                 import environ, getpid
+from socket             import socket, AF_UNIX, SOCK_DGRAM
+from logging            import error
+
+
+class SystemdNotifier :
+    """
+    Minimal implementation of the sd_notify protocol.
+
+    The notifier is a no-op when the process is not launched by systemd
+    (no NOTIFY_SOCKET in the environment), so that the daemons can still
+    be launched by hand for debugging.
+    """
+
+    def __init__(self):
+        """Initialize the notifier from the environment set by systemd."""
+
+        self.__socket = None
+        self.__address = environ.get('NOTIFY_SOCKET')
+        self.__watchdog_usec = 0
+
+        if self.__address :
+            # Abstract namespace sockets are given with a leading @
+            if self.__address.startswith('@') :
+                self.__address = '\0' + self.__address[1:]
+            try :
+                self.__socket = socket(AF_UNIX, SOCK_DGRAM)
+            except Exception as e :
+                error(f"Failed to create systemd notification socket : {e}")
+                self.__socket = None
+
+        watchdog_pid = environ.get('WATCHDOG_PID')
+        if watchdog_pid is None or watchdog_pid == str(getpid()) :
+            try :
+                self.__watchdog_usec = int(environ.get('WATCHDOG_USEC', '0'))
+            except ValueError :
+                self.__watchdog_usec = 0
+
+    def notify(self, state) :
+        """
+        Send a raw state string to systemd.
+
+        Parameters:
+        - state: newline separated assignments, as described in sd_notify(3).
+        """
+        result = False
+        if self.__socket is not None :
+            try :
+                self.__socket.sendto(state.encode('utf-8'), self.__address)
+                result = True
+            except Exception as e :
+                error(f"Failed to notify systemd : {e}")
+        return result
+
+    def ready(self, status=None) :
+        """Tell systemd the daemon has completed its startup."""
+        state = 'READY=1'
+        if status : state = state + '\nSTATUS=' + status
+        return self.notify(state)
+
+    def status(self, status) :
+        """Publish a free form status line, shown by systemctl status."""
+        return self.notify('STATUS=' + status)
+
+    def watchdog(self) :
+        """Reset the systemd watchdog timer."""
+        return self.notify('WATCHDOG=1')
+
+    def extend_timeout(self, seconds) :
+        """Ask systemd for more time to complete startup or shutdown."""
+        return self.notify(f"EXTEND_TIMEOUT_USEC={int(seconds * 1000000)}")
+
+    def stopping(self) :
+        """Tell systemd the daemon is shutting down."""
+        return self.notify('STOPPING=1')
+
+    def watchdog_interval(self, default=5.0) :
+        """
+        Return the period at which the watchdog shall be pinged.
+
+        Half of WatchdogSec, as recommended by sd_watchdog_enabled(3), or
+        the default value if the watchdog is not enabled.
+        """
+        result = default
+        if self.__watchdog_usec > 0 :
+            result = self.__watchdog_usec / 2000000
+        return result
+
+    def close(self) :
+        """Release the notification socket."""
+        if self.__socket is not None : self.__socket.close()
+        self.__socket = None
+
+
+class Backoff :
+    """Exponential backoff delay generator used to pace startup retries."""
+
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0):
+        """
+        Initialize the backoff.
+
+        Parameters:
+        - initial: first delay, in seconds.
+        - maximum: upper bound of the delay, in seconds.
+        - factor: multiplier applied to the delay after each attempt.
+        """
+        self.__initial = initial
+        self.__maximum = maximum
+        self.__factor = factor
+        self.__delay = initial
+        self.__attempts = 0
+
+    def next(self) :
+        """Return the delay to wait before the next attempt."""
+        result = self.__delay
+        self.__delay = min(self.__delay * self.__factor, self.__maximum)
+        self.__attempts = self.__attempts + 1
+        return result
+
+    def reset(self) :
+        """Restart from the initial delay."""
+        self.__delay = self.__initial
+        self.__attempts = 0
+
+    def attempts(self) :
+        """Return the number of delays handed out since the last reset."""
+        return self.__attempts
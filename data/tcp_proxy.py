@@ -0,0 +1,415 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This plugin proxies the TCP connections of the clients to the
+Limelight ports, as an alternative to the DNAT of the routing
+ruleset, moving the payload between sockets with splice so that
+it never enters userspace, and accounting each connection.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from asyncio            import get_running_loop, wait_for, gather, CancelledError, TimeoutError as WaitTimeout
+from fcntl              import fcntl, F_SETPIPE_SZ
+from os                 import pipe2, splice, close, O_NONBLOCK, O_CLOEXEC, SPLICE_F_MOVE, SPLICE_F_NONBLOCK
+from time               import perf_counter
+from socket             import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, SO_BINDTODEVICE, SO_MARK, \
+                               IPPROTO_IP, IPPROTO_TCP, TCP_NODELAY, SHUT_WR
+from logging            import info, error, debug
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+from routing_compiler   import PRIORITY_PORTS, PRIORITY_MARK
+from topology           import gateway_address
+
+# Linux socket option binding a socket to an address not configured yet
+IP_FREEBIND = 15
+
+# Splice calls per direction before yielding to the other connections
+BUDGET      = 16
+
+
+def parse_ports(ports) :
+    """
+    Return the ports of a comma separated list of ports and ranges, such as 5800-5807, 5809.
+
+    Parameters:
+    - ports: ports option value.
+    """
+    result = []
+    for item in ports.split(',') :
+        item = item.strip()
+        if len(item) == 0 : continue
+        first, last = item.split('-') if '-' in item else (item, item)
+        result.extend(range(int(first), int(last) + 1))
+    return result
+
+
+class Direction :
+    """
+    One direction of a proxied connection : data spliced from a socket to a pipe,
+    then from the pipe to the other socket, the pipe holding what the destination
+    could not take yet.
+    """
+
+    __slots__ = ('source', 'destination', 'read', 'write', 'pending', 'eof', 'bytes', 'counter', 'first')
+
+    def __init__(self, source, destination, pipe_size, counter):
+        """
+        Initialize the direction with an empty pipe.
+
+        Parameters:
+        - source: socket data is read from.
+        - destination: socket data is written to.
+        - pipe_size: capacity of the pipe, in bytes.
+        - counter: bytes counter of the direction.
+        """
+        self.source = source
+        self.destination = destination
+        self.read, self.write = pipe2(O_NONBLOCK | O_CLOEXEC)
+        try :
+            fcntl(self.write, F_SETPIPE_SZ, pipe_size)
+        except OSError :
+            # Above /proc/sys/fs/pipe-max-size, the default size is kept
+            pass
+        self.pending = 0
+        self.eof = False
+        self.bytes = 0
+        self.counter = counter
+        self.first = None
+
+    def close(self) :
+        """Close the pipe."""
+        close(self.read)
+        close(self.write)
+
+
+class Connection :
+    """Proxied connection : its two directions, its client and the labels of its metrics."""
+
+    __slots__ = ('up', 'down', 'address', 'labels', 'opened')
+
+    def __init__(self, up, down, address, labels):
+        """
+        Initialize the connection.
+
+        Parameters:
+        - up: direction from the client to the limelight.
+        - down: direction from the limelight to the client.
+        - address: client IP address.
+        - labels: interface, limelight and port labels of the connection metrics.
+        """
+        self.up = up
+        self.down = down
+        self.address = address
+        self.labels = labels
+        self.opened = perf_counter()
+
+
+class TcpProxy(DaemonPlugin) :
+    """
+    Proxy the client connections to the Limelight ports.
+
+    A listening socket is bound to each Limelight gateway address and port,
+    even before its interface gets the address. Each accepted connection is
+    connected to its Limelight through the Limelight interface, then both
+    directions are spliced through a pipe on the daemon event loop : the
+    payload only moves between kernel buffers, and a direction stops reading
+    while its destination is full. Results ports get TCP_NODELAY, and the
+    Control Hub results connections the priority mark of the routing ruleset,
+    so that the traffic priority scheme classifies the proxied packets as it
+    does the DNAT'd ones. Each client is limited in connections, and each
+    connection accounted in bytes, connection and response latency.
+    """
+
+    def __init__(self):
+        """Initialize the proxy with no listening socket."""
+        self.__is_running = False
+
+        # Listening sockets, indexed by socket, with (interface, limelight interface, limelight, port)
+        self.__listeners = {}
+
+        # Proxied connections, and the number of connections of each client
+        self.__connections = set()
+        self.__clients = {}
+
+        # Connections to the limelights in progress, kept until done so that they are not collected
+        self.__connecting = set()
+
+        self.__sources = []
+        self.__destinations = []
+        self.__ports = []
+        self.__nodelay = set()
+        self.__max_connections = 16
+        self.__pipe_size = 256 * 1024
+        self.__connect_timeout = 2.0
+
+        self.__statistics = {}
+        self.__metrics = None
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the proxy.
+
+        Parameters:
+        - options: proxy section, with
+            - sources: comma separated list of interface:gateway the clients connect to.
+            - destination: comma separated list of interface:ip of the limelights. Clients reach the n-th
+              limelight at the n-th address after the gateway of their interface.
+            - ports: comma separated list of ports and port ranges proxied, the others staying DNAT'd.
+            - nodelay: comma separated list of ports whose segments are sent at once.
+            - max_connections: highest number of connections proxied at once for a client.
+            - pipe_size: capacity in bytes of the pipe buffering each direction of a connection.
+            - connect_timeout: delay in seconds after which a limelight connection attempt is given up.
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
+        """
+
+        self.__sources = [tuple(source.strip().split(':')) for source in options.get('sources').split(',')]
+        self.__destinations = [tuple(destination.strip().split(':')) for destination in options.get('destination').split(',')]
+        self.__ports = parse_ports(options.get('ports', '5800-5807'))
+        self.__nodelay = set(parse_ports(options.get('nodelay', '5805, 5806, 5807')))
+        self.__max_connections = options.getint('max_connections', 16)
+        self.__pipe_size = options.getint('pipe_size', 256 * 1024)
+        self.__connect_timeout = options.getfloat('connect_timeout', 2.0)
+
+        self.__metrics = metrics
+        for counter in ['errors', 'timeouts'] :
+            self.__statistics[counter] = metrics.counter('proxy_' + counter)
+        self.__statistics['active'] = metrics.gauge('proxy_active_connections')
+
+    async def start(self) :
+        """Listen on all the gateway addresses and ports. Return False if one of them is not available."""
+
+        result = True
+
+        info("Starting TCP proxy")
+
+        self.__is_running = True
+        for index, (interface_out, limelight) in enumerate(self.__destinations) :
+            for interface, gateway in self.__sources :
+                for port in self.__ports :
+                    if not self.__listen(interface, gateway_address(gateway, index), port, interface_out, limelight) : result = False
+
+        if result :
+            info(f"Proxying TCP ports {', '.join(str(port) for port in self.__ports)} of {len(self.__destinations)} limelights "
+                 f"from {', '.join(interface for interface, gateway in self.__sources)}")
+        else :
+            await self.stop()
+
+        return result
+
+    async def stop(self) :
+        """Stop listening and close all the proxied connections."""
+
+        info("Stopping TCP proxy")
+
+        self.__is_running = False
+        loop = get_running_loop()
+        for listener in list(self.__listeners.keys()) :
+            loop.remove_reader(listener.fileno())
+            listener.close()
+        self.__listeners = {}
+        tasks = list(self.__connecting)
+        for task in tasks : task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        for connection in list(self.__connections) :
+            self.__close(connection)
+
+    def __listen(self, interface, gateway, port, interface_out, limelight) :
+        """Open a listening socket on a gateway address and port. Return False if it failed."""
+
+        result = True
+
+        listener = socket(AF_INET, SOCK_STREAM)
+        try :
+            listener.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            # The gateway address may not be set yet, the interface being down
+            listener.setsockopt(IPPROTO_IP, IP_FREEBIND, 1)
+            listener.bind((gateway, port))
+            listener.listen(64)
+            listener.setblocking(False)
+            get_running_loop().add_reader(listener.fileno(), self.__accept, listener)
+            self.__listeners[listener] = (interface, interface_out, limelight, port)
+        except OSError as e :
+            error(f"Failed to listen on {gateway}:{port} : {e}")
+            self.__statistics['errors'].inc()
+            listener.close()
+            result = False
+
+        return result
+
+    def __accept(self, listener) :
+        """Accept the pending connections of a listening socket, and connect them to their limelight."""
+
+        interface, interface_out, limelight, port = self.__listeners[listener]
+        while self.__is_running :
+            try :
+                client, address = listener.accept()
+            except BlockingIOError :
+                break
+            except OSError as e :
+                error(f"Failed to accept on {interface} port {port} : {e}")
+                self.__statistics['errors'].inc()
+                break
+
+            if self.__clients.get(address[0], 0) >= self.__max_connections :
+                debug(f"Connection from {address[0]} to port {port} refused, {self.__max_connections} already proxied")
+                self.__metrics.counter('proxy_rejected', interface=interface).inc()
+                client.close()
+                continue
+
+            self.__clients[address[0]] = self.__clients.get(address[0], 0) + 1
+            task = get_running_loop().create_task(self.__connect(client, address[0], interface, interface_out, limelight, port))
+            self.__connecting.add(task)
+            task.add_done_callback(self.__connecting.discard)
+
+    async def __connect(self, client, address, interface, interface_out, limelight, port) :
+        """Connect an accepted client to its limelight, and start splicing both directions."""
+
+        upstream = socket(AF_INET, SOCK_STREAM)
+        try :
+            upstream.setsockopt(SOL_SOCKET, SO_BINDTODEVICE, interface_out.encode('ascii'))
+            for sock in (client, upstream) :
+                sock.setblocking(False)
+                if port in self.__nodelay : sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+                if interface == 'usb0' and port in PRIORITY_PORTS : sock.setsockopt(SOL_SOCKET, SO_MARK, PRIORITY_MARK)
+
+            started = perf_counter()
+            await wait_for(get_running_loop().sock_connect(upstream, (limelight, port)), self.__connect_timeout)
+            self.__metrics.summary('proxy_connect_latency_seconds', limelight=limelight).observe(perf_counter() - started)
+
+        except (OSError, WaitTimeout) as e :
+            if isinstance(e, WaitTimeout) : self.__statistics['timeouts'].inc()
+            else : self.__statistics['errors'].inc()
+            debug(f"Failed to connect {address} to {limelight}:{port} : {e}")
+            upstream.close()
+            client.close()
+            self.__release(address)
+            return
+        except CancelledError :
+            # Proxy stopping
+            upstream.close()
+            client.close()
+            self.__release(address)
+            raise
+
+        if not self.__is_running :
+            upstream.close()
+            client.close()
+            self.__release(address)
+            return
+
+        labels = { 'interface' : interface, 'limelight' : limelight, 'port' : str(port) }
+        up = None
+        try :
+            up = Direction(client, upstream, self.__pipe_size, self.__metrics.counter('proxy_bytes', direction='up', **labels))
+            down = Direction(upstream, client, self.__pipe_size, self.__metrics.counter('proxy_bytes', direction='down', **labels))
+        except OSError as e :
+            # Out of file descriptors
+            error(f"Failed to create the pipes of a connection from {address} : {e}")
+            self.__statistics['errors'].inc()
+            if up is not None : up.close()
+            upstream.close()
+            client.close()
+            self.__release(address)
+            return
+
+        self.__metrics.counter('proxy_connections', **labels).inc()
+        connection = Connection(up, down, address, labels)
+        self.__connections.add(connection)
+        self.__statistics['active'].set(len(self.__connections))
+
+        loop = get_running_loop()
+        loop.add_reader(client.fileno(), self.__pump, connection, up)
+        loop.add_reader(upstream.fileno(), self.__pump, connection, down)
+
+    def __pump(self, connection, direction) :
+        """
+        Move the data of a direction as far as its sockets allow : drain the pipe to the
+        destination, refill it from the source, and wait for the destination to be
+        writable, or the source to be readable, when the kernel says it would block.
+        """
+
+        loop = get_running_loop()
+        try :
+            for i in range(BUDGET) :
+                if direction.pending > 0 :
+                    try :
+                        moved = splice(direction.read, direction.destination.fileno(), direction.pending, flags=SPLICE_F_MOVE | SPLICE_F_NONBLOCK)
+                    except BlockingIOError :
+                        # Destination full : stop reading the source until it drained
+                        loop.remove_reader(direction.source.fileno())
+                        loop.add_writer(direction.destination.fileno(), self.__pump, connection, direction)
+                        return
+                    direction.pending -= moved
+                    direction.bytes += moved
+                    direction.counter.inc(moved)
+                    if direction.first is None : direction.first = perf_counter()
+                    continue
+
+                # Pipe empty : the destination no longer needs watching
+                loop.remove_writer(direction.destination.fileno())
+                if direction.eof :
+                    break
+
+                try :
+                    moved = splice(direction.source.fileno(), direction.write, self.__pipe_size, flags=SPLICE_F_MOVE | SPLICE_F_NONBLOCK)
+                except BlockingIOError :
+                    loop.add_reader(direction.source.fileno(), self.__pump, connection, direction)
+                    return
+                if moved == 0 :
+                    direction.eof = True
+                    loop.remove_reader(direction.source.fileno())
+                    direction.destination.shutdown(SHUT_WR)
+                    break
+                direction.pending += moved
+
+            else :
+                # Budget spent : the readiness callbacks come back on the next loop iteration
+                if direction.pending > 0 :
+                    loop.add_writer(direction.destination.fileno(), self.__pump, connection, direction)
+                return
+
+        except OSError as e :
+            debug(f"Proxied connection from {connection.address} to {connection.labels['limelight']}:{connection.labels['port']} failed : {e}")
+            self.__close(connection)
+            return
+
+        up, down = connection.up, connection.down
+        if up.eof and down.eof and up.pending == 0 and down.pending == 0 :
+            self.__close(connection)
+
+    def __close(self, connection) :
+        """Close both sockets and pipes of a connection, and account it."""
+
+        if connection not in self.__connections : return
+        up, down, address, labels, opened = connection.up, connection.down, connection.address, connection.labels, connection.opened
+        self.__connections.discard(connection)
+
+        loop = get_running_loop()
+        for sock in (up.source, down.source) :
+            loop.remove_reader(sock.fileno())
+            loop.remove_writer(sock.fileno())
+            sock.close()
+        up.close()
+        down.close()
+        self.__release(address)
+
+        # Response latency : first bytes sent to the limelight to first bytes sent back to the client
+        if up.first is not None and down.first is not None and down.first >= up.first :
+            self.__metrics.summary('proxy_response_latency_seconds', port=labels['port']).observe(down.first - up.first)
+        self.__metrics.summary('proxy_connection_duration_seconds', port=labels['port']).observe(perf_counter() - opened)
+        self.__statistics['active'].set(len(self.__connections))
+        debug(f"Proxied {address} on {labels['interface']} to {labels['limelight']}:{labels['port']} : "
+              f"{up.bytes} bytes up, {down.bytes} bytes down in {perf_counter() - opened:.1f}s")
+
+    def __release(self, address) :
+        """Free a connection slot of a client."""
+        self.__clients[address] = self.__clients.get(address, 1) - 1
+        if self.__clients[address] <= 0 : del self.__clients[address]
@@ -0,0 +1,327 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script reads the Limelight topology : the Limelights
+plugged on the Pi, and the addresses and names the clients
+reach each of them at. All the routing, priority, forwarding
+and naming configurations are derived from it.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from collections        import namedtuple
+from configparser       import ConfigParser
+from ipaddress          import IPv4Address, IPv4Network
+from os                 import path, environ
+from subprocess         import run, PIPE
+from sys                import exit
+from logging            import basicConfig, info, error, INFO
+
+# Client facing interfaces, and the variable holding the gateway address of the first Limelight on each
+CLIENTS         = [('usb0', 'USB_IP_GATEWAY_LINUX'), ('usb1', 'USB_IP_GATEWAY_WINDOWS'), ('eth0', 'ETH_IP_GATEWAY')]
+
+# Gateway addresses end before the DHCP ranges, which start at .10
+MAX_LIMELIGHTS  = 9
+
+# Fleet mode : robots sharing the laptop switch, each on the /24 of its robot id inside a common /16,
+# so that every Pi and DHCP range is unique while a laptop reaches all of them
+MAX_ROBOTS      = 254
+FLEET_PREFIX    = 16
+
+# Limelight : section name, Pi interface it is plugged on, its address, its names on the usb and
+# ethernet clients, the MTU of its link, and the gateway address reaching it indexed by client interface
+Limelight = namedtuple('Limelight', ['name', 'interface', 'address', 'usb', 'eth', 'mtu', 'gateways'])
+
+
+def read_env(env_path) :
+    """
+    Read the gateway configuration from an env file made of export lines,
+    completed by the process environment for the variables it does not set.
+
+    Parameters:
+    - env_path: path of the env file, None to use the process environment only.
+    """
+    result = dict(environ)
+    if env_path is not None :
+        with open(env_path, 'r', encoding='utf-8') as f :
+            for line in f :
+                line = line.strip()
+                if line.startswith('export ') : line = line[len('export '):]
+                if line.startswith('#') or '=' not in line : continue
+                key, value = line.split('=', 1)
+                result[key.strip()] = value.strip().strip('"\'')
+    result = robot_env(result)
+    return result
+
+
+def robot_id(env) :
+    """
+    Return the robot id of the fleet mode, None on a single robot network.
+
+    Parameters:
+    - env: configuration variables, with ROBOT_ID.
+    """
+    result = None
+    if env.get('ROBOT_ID', '').strip() :
+        result = int(env['ROBOT_ID'])
+        if not 0 < result <= MAX_ROBOTS : raise ValueError(f'Robot id shall be between 1 and {MAX_ROBOTS}')
+    return result
+
+
+def robot_env(env) :
+    """
+    Return the configuration variables with the ethernet network of the robot. In fleet mode,
+    the third byte of the ethernet gateway and DHCP range addresses is the robot id, the DHCP
+    mask spans the fleet, and the discovery broadcasts are answered only for the robot clients.
+    An invalid robot id leaves the variables unchanged, the topology reporting it.
+
+    Parameters:
+    - env: configuration variables, with ROBOT_ID, ETH_IP_GATEWAY and ETH_IP_ADDRESSES.
+    """
+
+    result = dict(env)
+    result.setdefault('ETH_IP_PREFIX', '24')
+    result.setdefault('DISCOVERY_SCOPES', '')
+
+    try :
+        robot = robot_id(env)
+    except ValueError :
+        robot = None
+
+    if robot is not None and env.get('ETH_IP_GATEWAY') :
+        def move(address) : return '.'.join(address.split('.')[:2] + [str(robot), address.split('.')[3]])
+        result['ETH_IP_GATEWAY'] = move(env['ETH_IP_GATEWAY'])
+        if env.get('ETH_IP_ADDRESSES') :
+            first, last = env['ETH_IP_ADDRESSES'].split(',')[:2]
+            result['ETH_IP_ADDRESSES'] = f'{move(first)},{move(last)},{IPv4Network(f"0.0.0.0/{FLEET_PREFIX}").netmask}'
+        result['ETH_IP_PREFIX'] = str(FLEET_PREFIX)
+        result['DISCOVERY_SCOPES'] = f'eth0:{IPv4Network(result["ETH_IP_GATEWAY"] + "/24", strict=False)}'
+
+    return result
+
+
+def gateway_address(gateway, index) :
+    """
+    Return the address reaching a Limelight on a client interface.
+
+    Parameters:
+    - gateway: gateway address of the client interface, reaching the first Limelight.
+    - index: position of the Limelight in the topology, from 0.
+    """
+    result = str(IPv4Address(gateway) + index)
+    return result
+
+
+def sequential(count) :
+    """
+    Return the topology sections of Limelights plugged on eth1, eth2... with
+    their USB id 0, 1... hence the addresses 172.29.0.1, 172.29.1.1...
+
+    Parameters:
+    - count: number of Limelights.
+    """
+    result = ConfigParser()
+    for index in range(count) :
+        name = 'limelight' if index == 0 else f'limelight-{index + 1}'
+        result[name] = { 'interface' : f'eth{index + 1}', 'address' : f'172.29.{index}.1', 'usb' : f'{name}.local', 'eth' : f'{name}.eth.local' }
+    return result
+
+
+def load(topology_path) :
+    """
+    Return the topology sections read from a file, the single Limelight on eth1 if it does not exist.
+
+    Parameters:
+    - topology_path: path of the topology file, None for the single Limelight.
+    """
+    result = sequential(1)
+    if topology_path is not None and path.isfile(topology_path) :
+        result = ConfigParser()
+        result.read(topology_path)
+    return result
+
+
+class Topology :
+    """
+    Limelights plugged on the Pi.
+
+    Each Limelight is plugged on its own interface, with its own address,
+    set by its USB id. Clients reach the n-th Limelight of the topology at
+    the n-th address after the gateway of their interface, and by its own
+    names, so that the routing ruleset tells the Limelights apart from the
+    destination address alone.
+    """
+
+    def __init__(self, ip='ip') :
+        """
+        Initialize an empty topology.
+
+        Parameters:
+        - ip: ip command.
+        """
+        self.__ip = ip
+        self.__limelights = []
+        self.__gateways = {}
+        self.__prefixes = {}
+        self.__is_ready = False
+
+    def configure(self, env, sections) :
+        """
+        Configure the topology. Return False if it is invalid.
+
+        Parameters:
+        - env: configuration variables, with USB_IP_GATEWAY_LINUX, USB_IP_GATEWAY_WINDOWS and ETH_IP_GATEWAY,
+          and in fleet mode ROBOT_ID, prefixing the ethernet names with robot<id>- so that they are unique on the laptop switch.
+        - sections: one section per Limelight, in order, with
+            - interface: Pi interface the Limelight is plugged on
+            - address: Limelight address
+            - usb: name of the Limelight for the usb clients
+            - eth: name of the Limelight for the ethernet clients
+            - mtu: MTU of the Limelight link, 1500 by default
+        """
+
+        result = True
+
+        self.__gateways = {}
+        for interface, variable in CLIENTS :
+            if env.get(variable) :
+                self.__gateways[interface] = env[variable]
+            else :
+                error(f"Missing {variable} in configuration")
+                result = False
+
+        self.__prefixes = { interface : 24 for interface in self.__gateways }
+        if 'eth0' in self.__prefixes : self.__prefixes['eth0'] = int(env.get('ETH_IP_PREFIX') or 24)
+
+        robot = ''
+        try :
+            if robot_id(env) is not None : robot = f'robot{robot_id(env)}-'
+        except ValueError as e :
+            error(f"Invalid ROBOT_ID {env.get('ROBOT_ID')} : {e}")
+            result = False
+
+        self.__limelights = []
+        for index, name in enumerate(sections.sections()) :
+            section = sections[name]
+            try :
+                self.__limelights.append(Limelight(name, section['interface'].strip(), str(IPv4Address(section['address'].strip())),
+                                                   section.get('usb', f'{name}.local').strip(), robot + section.get('eth', f'{name}.eth.local').strip(),
+                                                   section.getint('mtu', 1500),
+                                                   { interface : gateway_address(gateway, index) for interface, gateway in self.__gateways.items() }))
+            except (KeyError, ValueError) as e :
+                error(f"Invalid Limelight {name} : {e}")
+                result = False
+
+        for field in ['interface', 'address', 'usb', 'eth'] :
+            values = [getattr(limelight, field) for limelight in self.__limelights]
+            if len(set(values)) != len(values) :
+                error(f"Limelights shall not share their {field}")
+                result = False
+        if not 0 < len(self.__limelights) <= MAX_LIMELIGHTS :
+            error(f"Topology shall have between 1 and {MAX_LIMELIGHTS} Limelights")
+            result = False
+
+        self.__is_ready = result
+        return result
+
+    def limelights(self) :
+        """Return the Limelights, in order."""
+        return list(self.__limelights)
+
+    def interfaces(self) :
+        """Return the Pi interfaces the Limelights are plugged on."""
+        return [limelight.interface for limelight in self.__limelights]
+
+    def option(self, kind) :
+        """
+        Return a LimeNurse plugin option describing the Limelights, in the topology order.
+
+        Parameters:
+        - kind: destinations (interface:address), probes (interface:address:port of the results),
+          usb and eth (names), or interfaces.
+        """
+        formats = {
+            'destinations'  : '{0.interface}:{0.address}',
+            'probes'        : '{0.interface}:{0.address}:5807',
+            'usb'           : '{0.usb}',
+            'eth'           : '{0.eth}',
+            'interfaces'    : '{0.interface}',
+        }
+        result = ', '.join(formats[kind].format(limelight) for limelight in self.__limelights)
+        return result
+
+    def addresses(self) :
+        """
+        Add to the client interfaces the gateway addresses of the Limelights after the first, the
+        first one being the interface address. Return False if one of them could not be added.
+        """
+
+        result = self.__is_ready
+
+        if self.__is_ready :
+            for interface, gateway in self.__gateways.items() :
+                if not path.exists('/sys/class/net/' + interface) : continue
+                for limelight in self.__limelights[1:] :
+                    added = run([self.__ip, 'addr', 'replace', f'{limelight.gateways[interface]}/{self.__prefixes[interface]}', 'dev', interface], stdout=PIPE, stderr=PIPE, text=True)
+                    if added.returncode != 0 :
+                        error(f"Failed to add {limelight.gateways[interface]} to {interface} : {added.stderr.strip()}")
+                        result = False
+            if result : info(f"Gateway addresses of {len(self.__limelights)} Limelights set")
+
+        return result
+
+    def mtus(self) :
+        """
+        Set the configured MTU of the Limelight interfaces that are present.
+        Return False if one of them could not be set.
+        """
+
+        result = self.__is_ready
+
+        if self.__is_ready :
+            for limelight in self.__limelights :
+                if not path.exists('/sys/class/net/' + limelight.interface) : continue
+                changed = run([self.__ip, 'link', 'set', limelight.interface, 'mtu', str(limelight.mtu)], stdout=PIPE, stderr=PIPE, text=True)
+                if changed.returncode != 0 :
+                    error(f"Failed to set {limelight.interface} MTU to {limelight.mtu} : {changed.stderr.strip()}")
+                    result = False
+
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    # Command-line interface to select the action and the configuration
+    parser = ArgumentParser(description="Limelight topology")
+    parser.add_argument("action", choices=["show", "option", "addresses", "env"], help="List the Limelights, print a plugin option, set the gateway addresses and link MTUs, or print the robot network variables")
+    parser.add_argument("kind", nargs="?", default="destinations", help="Option to print : destinations, probes, usb, eth or interfaces")
+    parser.add_argument("--env", dest="env", default=None, help="Env file with the gateway addresses, the process environment by default")
+    parser.add_argument("--topology", dest="topology", default=None, help="Topology file, a single Limelight on eth1 by default")
+
+    args = parser.parse_args()
+
+    topology = Topology()
+    if not topology.configure(read_env(args.env), load(args.topology)) :
+        exit(1)
+
+    if args.action == "show" :
+        for limelight in topology.limelights() :
+            print(f"{limelight.name} on {limelight.interface} at {limelight.address} mtu {limelight.mtu} - {limelight.usb} / {limelight.eth} - " + \
+                  ', '.join(f'{interface} {gateway}' for interface, gateway in limelight.gateways.items()))
+    elif args.action == "option" :
+        print(topology.option(args.kind))
+    elif args.action == "env" :
+        # Evaluated by the installation scripts after sourcing the env file, fleet mode moving the ethernet network
+        env = read_env(args.env)
+        for variable in ['ETH_IP_GATEWAY', 'ETH_IP_ADDRESSES', 'ETH_IP_PREFIX', 'DISCOVERY_SCOPES'] :
+            print(f'export {variable}={env[variable]}')
+    else :
+        exit(0 if topology.mtus() and topology.addresses() else 1)
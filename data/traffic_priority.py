@@ -0,0 +1,373 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This script installs the traffic priority scheme of the Pi
+interfaces : Control Hub result flows before everything else,
+and Limelight video streams after, shaped below the Limelight
+link rate so that queues build on the Pi and not on the link.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from argparse           import ArgumentParser
+from os                 import path
+from re                 import compile as regex
+from subprocess         import run, PIPE
+from sys                import exit
+from logging            import basicConfig, info, error, INFO
+
+# Local includes
+from routing_compiler   import PRIORITY_MARK
+from topology           import Topology, read_env, load, CLIENTS
+
+# Limelight MJPEG video streams ports
+VIDEO_PORTS     = [5800, 5802]
+
+# HTB classes : class -> (priority, share of the link rate guaranteed), bulk video being capped to the video rate.
+# On the client interfaces, the video of the n-th Limelight has its own class, 1:30 + n
+PRIORITY        = '1:10'
+DEFAULT         = '1:20'
+BULK            = '1:30'
+CLASSES         = { PRIORITY : (0, 0.1), DEFAULT : (1, 0.5), BULK : (2, 0.4) }
+
+# HTB quantum, one full size frame, the default derived from the rate being too big for small classes
+QUANTUM         = 1514
+
+RATE_UNITS      = { 'bit' : 1, 'kbit' : 1e3, 'mbit' : 1e6, 'gbit' : 1e9 }
+RATE            = regex(r'^(\d+(?:\.\d+)?)([a-z]*)$')
+CLASS           = regex(r'^class htb (\S+) .*?(?:prio (\d+) )?rate (\S+) ceil (\S+)')
+FILTER          = regex(r'^filter .* (?:fw .*handle (0x[0-9a-f]+)|u32 .*fh (800::[0-9a-f]+)) .*(?:classid|flowid) (\S+)')
+
+
+def parse_rate(rate) :
+    """
+    Return a rate in bits per second, from its tc form, such as 100mbit or 80Mbit.
+
+    Parameters:
+    - rate: rate, bit, kbit, mbit or gbit, case insensitive.
+    """
+    match = RATE.match(rate.strip().lower())
+    if match is None or match.group(2) not in RATE_UNITS :
+        raise ValueError(f'Invalid rate {rate}')
+    result = int(float(match.group(1)) * RATE_UNITS[match.group(2)])
+    return result
+
+
+def video_class(index) :
+    """Return the video class of the n-th Limelight, from 0."""
+    result = f'1:{30 + index}'
+    return result
+
+
+def is_video_class(classid) :
+    """Return True if a class is the video class of a Limelight."""
+    result = classid.startswith('1:3') and len(classid) == 4
+    return result
+
+
+class TrafficPriority :
+    """
+    Install and check the priority scheme on the Pi interfaces.
+
+    Each interface gets an HTB root qdisc with three classes : Control Hub
+    results, marked by the routing ruleset, with strict priority, the
+    default class, and the video streams, capped below the Limelight link
+    rate so that a laptop watching video never fills the link the Control
+    Hub results share. Each class has its own fq_codel leaf. The client
+    interfaces carry the traffic of all the Limelights : their rates are
+    multiplied by the number of Limelights, and each Limelight video has
+    its own class, so that every Limelight link is protected. The scheme is
+    compared to the live one before being applied, so that restarting the
+    routing service leaves the queues of an up to date interface untouched.
+    """
+
+    def __init__(self, tc='tc', leaf='fq_codel') :
+        """
+        Initialize the scheme.
+
+        Parameters:
+        - tc: tc command.
+        - leaf: qdisc of the classes.
+        """
+        self.__tc = tc
+        self.__leaf = leaf
+        self.__rate = 0
+        self.__video_rate = 0
+        self.__shaped = []
+        self.__clients = []
+        self.__gateways = []
+        self.__is_ready = False
+
+    def configure(self, env, sections=None) :
+        """
+        Configure the scheme rates.
+        Return False if they are invalid.
+
+        Parameters:
+        - env: configuration variables, with
+            - LIMELIGHT_LINK_RATE: rate of the Limelight link, 100mbit by default
+            - VIDEO_RATE: maximal rate of the video streams, 80% of the link rate by default
+        - sections: Limelight topology sections, None for the single Limelight on eth1.
+        """
+
+        topology = Topology()
+        result = topology.configure(env, sections if sections is not None else load(None))
+
+        # Interfaces shaped, the Limelights links, each at the link rate, and the client facing ones
+        self.__clients = [interface for interface, variable in CLIENTS]
+        self.__shaped = topology.interfaces() + self.__clients
+        self.__gateways = [limelight.gateways for limelight in topology.limelights()]
+
+        try :
+            self.__rate = parse_rate(env.get('LIMELIGHT_LINK_RATE') or '100mbit')
+            self.__video_rate = parse_rate(env['VIDEO_RATE']) if env.get('VIDEO_RATE') else int(self.__rate * 0.8)
+            if not 0 < self.__video_rate <= self.__rate : raise ValueError('Video rate shall be positive and at most the link rate')
+        except ValueError as e :
+            error(f"Invalid traffic priority configuration : {e}")
+            result = False
+
+        self.__is_ready = result
+        return result
+
+    def interfaces(self) :
+        """Return the shaped interfaces."""
+        return list(self.__shaped)
+
+    def classes(self, interface=None) :
+        """
+        Return the HTB classes of the scheme on an interface, as a dictionary class -> (priority, rate, ceil),
+        the root class having no priority.
+
+        Parameters:
+        - interface: shaped interface, None for a Limelight link.
+        """
+        count = len(self.__gateways) if interface in self.__clients else 1
+        result = { '1:1' : (None, self.__rate * count, self.__rate * count) }
+        for classid, (priority, share) in CLASSES.items() :
+            if classid == BULK :
+                for index in range(count) :
+                    result[video_class(index)] = (priority, int(self.__rate * share), self.__video_rate)
+            else :
+                result[classid] = (priority, int(self.__rate * share * count), self.__rate * count)
+        return result
+
+    def filters(self, interface=None) :
+        """
+        Return the u32 classification filters of the video streams in both directions,
+        as a list of (matches, class). Packets marked by the routing ruleset are
+        classified before them by a fw filter. With several Limelights, the video sent
+        to the clients is told apart by the gateway address it comes from.
+
+        Parameters:
+        - interface: shaped interface, None for a Limelight link.
+        """
+        result = []
+        several = interface in self.__clients and len(self.__gateways) > 1
+        for index in range(len(self.__gateways) if several else 1) :
+            source = f' match ip src {self.__gateways[index][interface]}/32' if several else ''
+            for port in VIDEO_PORTS :
+                result.append((f'match ip protocol 6 0xff match ip sport {port} 0xffff' + source, video_class(index)))
+                if not several : result.append((f'match ip protocol 6 0xff match ip dport {port} 0xffff', video_class(index)))
+        return result
+
+    def compile(self, interface, installed=False) :
+        """
+        Return the tc batch commands installing the scheme on an interface.
+
+        Parameters:
+        - interface: interface to shape.
+        - installed: True if the HTB root qdisc is already installed, only its classes and filters being then updated.
+          HTB root parameters can not be changed in place.
+        """
+
+        result = []
+
+        classes = self.classes(interface)
+        if not installed :
+            result.append(f'qdisc replace dev {interface} root handle 1: htb default {DEFAULT.split(":")[1]}')
+        for classid, (priority, rate, ceil) in classes.items() :
+            parent = '1:' if priority is None else '1:1'
+            result.append(f'class replace dev {interface} parent {parent} classid {classid} htb rate {rate}bit ceil {ceil}bit' + \
+                          ('' if priority is None else f' prio {priority}') + f' quantum {QUANTUM}')
+        for classid, (priority, rate, ceil) in classes.items() :
+            if priority is None : continue
+            result.append(f'qdisc replace dev {interface} parent {classid} handle {classid.split(":")[1]}: {self.__leaf}')
+        result.append(f'filter replace dev {interface} parent 1: protocol ip prio 1 handle {PRIORITY_MARK} fw classid {PRIORITY}')
+        for index, (matches, classid) in enumerate(self.filters(interface)) :
+            result.append(f'filter replace dev {interface} parent 1: protocol ip prio 2 handle 800::{index + 1:x} u32 {matches} flowid {classid}')
+
+        return result
+
+    def live(self, interface) :
+        """
+        Read the scheme installed on an interface.
+        Return None if the interface has no HTB root qdisc, otherwise a dictionary
+        with its classes, in the form returned by classes, its leaves count, and the class of each filter handle.
+
+        Parameters:
+        - interface: interface to read.
+        """
+
+        result = None
+
+        qdiscs = run([self.__tc, 'qdisc', 'show', 'dev', interface], stdout=PIPE, stderr=PIPE, text=True)
+        if qdiscs.returncode == 0 and any(line.startswith('qdisc htb 1: root') for line in qdiscs.stdout.splitlines()) :
+            result = { 'classes' : {}, 'filters' : {}, 'leaves' : 0 }
+            result['leaves'] = sum(1 for line in qdiscs.stdout.splitlines() if line.startswith(f'qdisc {self.__leaf} ') and ' parent 1:' in line)
+
+            classes = run([self.__tc, 'class', 'show', 'dev', interface], stdout=PIPE, stderr=PIPE, text=True)
+            for line in classes.stdout.splitlines() :
+                match = CLASS.match(line)
+                if match is not None :
+                    priority = None if match.group(2) is None else int(match.group(2))
+                    result['classes'][match.group(1)] = (priority, parse_rate(match.group(3)), parse_rate(match.group(4)))
+
+            filters = run([self.__tc, 'filter', 'show', 'dev', interface, 'parent', '1:'], stdout=PIPE, stderr=PIPE, text=True)
+            for line in filters.stdout.splitlines() :
+                match = FILTER.match(line)
+                if match is not None :
+                    result['filters'][match.group(1) or match.group(2)] = match.group(3)
+
+        return result
+
+    def diff(self, interface, live) :
+        """
+        List the differences between the scheme and the one installed on an interface, as readable lines.
+
+        Parameters:
+        - interface: interface checked.
+        - live: scheme returned by live.
+        """
+
+        result = []
+
+        if live is None :
+            result.append(f'- {interface} has no priority scheme')
+        else :
+            classes = self.classes(interface)
+            for classid, expected in classes.items() :
+                # tc reports rates rounded to its own units, and the latency guard may lower the video rates
+                current = live['classes'].get(classid)
+                if is_video_class(classid) and current is not None and current[0] == expected[0] and current[1] <= current[2] <= expected[2] * 1.01 : continue
+                if current is None or current[0] != expected[0] or any(abs(a - b) > b / 100 for a, b in zip(current[1:], expected[1:])) :
+                    result.append(f'~ {interface} class {classid} is {current} instead of {expected}')
+            for classid in live['classes'] :
+                if classid not in classes : result.append(f'+ {interface} class {classid} is unexpected')
+            if live['leaves'] != len(classes) - 1 :
+                result.append(f'~ {interface} has {live["leaves"]} {self.__leaf} leaves instead of {len(classes) - 1}')
+            expected = { f'800::{index + 1:x}' : classid for index, (matches, classid) in enumerate(self.filters(interface)) }
+            expected[f'{PRIORITY_MARK:#x}'] = PRIORITY
+            if live['filters'] != expected :
+                result.append(f'~ {interface} filters are {live["filters"]} instead of {expected}')
+
+        return result
+
+    def check(self, interfaces=None) :
+        """
+        Compare the scheme installed on the interfaces to the configured one, logging the drift.
+        Return True if they match.
+
+        Parameters:
+        - interfaces: interfaces to check, None for the shaped interfaces present on the Pi.
+        """
+
+        result = False
+
+        if self.__is_ready :
+            drift = []
+            for interface in self.__interfaces(interfaces) :
+                drift.extend(self.diff(interface, self.live(interface)))
+            for line in drift :
+                error(f"Traffic priority drift : {line}")
+            if len(drift) == 0 :
+                info("Traffic priority up to date")
+            result = len(drift) == 0
+
+        return result
+
+    def apply(self, interfaces=None, dry_run=False) :
+        """
+        Install the scheme on the interfaces where it differs from the configured one.
+        Return True if all interfaces are up to date afterwards.
+
+        Parameters:
+        - interfaces: interfaces to shape, None for the shaped interfaces present on the Pi.
+        - dry_run: True to log the commands without applying them.
+        """
+
+        result = False
+
+        if self.__is_ready :
+            result = True
+            for interface in self.__interfaces(interfaces) :
+                live = self.live(interface)
+                if len(self.diff(interface, live)) == 0 : continue
+
+                # Classes and filters of Limelights removed from the topology can only go with the whole scheme
+                stale = live is not None and (any(classid not in self.classes(interface) for classid in live['classes']) or \
+                                              len(live['filters']) > len(self.filters(interface)) + 1)
+                commands = self.compile(interface, live is not None and not stale)
+                if stale : commands.insert(0, f'qdisc del dev {interface} root')
+                if dry_run :
+                    info(f"Traffic priority commands for {interface} :\n" + '\n'.join(commands))
+                    continue
+
+                loaded = run([self.__tc, '-batch', '-'], input='\n'.join(commands) + '\n', stdout=PIPE, stderr=PIPE, text=True)
+                if loaded.returncode != 0 :
+                    error(f"Failed to install traffic priority on {interface} : {loaded.stderr.strip()}")
+                    result = False
+                elif len(self.diff(interface, self.live(interface))) > 0 :
+                    error(f"Traffic priority on {interface} still differs from the configured one after apply")
+                    result = False
+                else :
+                    info(f"Installed traffic priority on {interface}")
+
+        return result
+
+    def remove(self, interfaces=None) :
+        """
+        Restore the default qdisc of the interfaces, for instance to measure the traffic without the scheme.
+
+        Parameters:
+        - interfaces: interfaces to restore, None for the shaped interfaces present on the Pi.
+        """
+        for interface in self.__interfaces(interfaces) :
+            if self.live(interface) is not None :
+                run([self.__tc, 'qdisc', 'del', 'dev', interface, 'root'], stdout=PIPE, stderr=PIPE)
+                info(f"Removed traffic priority from {interface}")
+
+    def __interfaces(self, interfaces) :
+        """Return the interfaces to process, the shaped interfaces present on the Pi by default."""
+        result = interfaces
+        if result is None : result = [interface for interface in self.__shaped if path.exists('/sys/class/net/' + interface)]
+        return result
+
+
+if __name__ == "__main__":
+
+    basicConfig(level=INFO, format='%(levelname)s - %(message)s')
+
+    # Command-line interface to select the action and the rates configuration
+    parser = ArgumentParser(description="Limelight traffic priority scheme")
+    parser.add_argument("action", choices=["check", "apply", "remove"], help="Check the installed scheme drift, apply the changes, or restore the default qdiscs")
+    parser.add_argument("--env", dest="env", default=None, help="Env file with the rates, the process environment by default")
+    parser.add_argument("--topology", dest="topology", default=None, help="Limelight topology file, a single Limelight on eth1 by default")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", help="Log the apply commands without applying them")
+
+    args = parser.parse_args()
+
+    priority = TrafficPriority()
+    if not priority.configure(read_env(args.env), load(args.topology)) :
+        exit(1)
+
+    if args.action == "check" :
+        exit(0 if priority.check() else 1)
+    elif args.action == "apply" :
+        exit(0 if priority.apply(dry_run=args.dry_run) else 1)
+    else :
+        priority.remove()
@@ -3,101 +3,196 @@
 # All rights reserved
 # -------------------------------------------------------
 """
-This script implements a UDP forwarder that bridges UDP broadcast packets between multiple network interfaces.
+This plugin implements a UDP forwarder that bridges UDP broadcast packets between multiple network interfaces.
 It is designed to facilitate communication between Limelight devices across different network segments by
 capturing UDP broadcasts on specified interfaces and forwarding them appropriately to other interfaces and IPs.
 """
 # -------------------------------------------------------
 # Nadège LEMPERIERE, @4th May 2025
-# Latest revision: 4th May 2025
+# Latest revision: 19th October 2026
 # -------------------------------------------------------
 
-from fcntl              import ioctl
-from struct             import pack, unpack
-from socket             import socket, AF_INET, AF_PACKET, SOCK_RAW, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, inet_ntoa, ntohs
-from select             import select
-from threading          import Thread
-from argparse           import ArgumentParser
-from signal             import signal, SIGINT, SIGTERM
-from struct             import unpack
-from logging            import info, error, debug, DEBUG, Formatter, getLogger
-from logging.handlers   import RotatingFileHandler
+from asyncio            import get_running_loop
+from struct             import unpack_from
+from time               import monotonic
+from socket             import socket, AF_INET, AF_PACKET, SOCK_RAW, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR, inet_ntoa, inet_aton, ntohs
+from errno              import ENETDOWN
+from ipaddress          import IPv4Address, IPv4Network
+from logging            import info, error, debug
+
+# Local includes
+from daemon_plugin      import DaemonPlugin
+from discovery          import DiscoveryCoalescer, DiscoveryCache
+from egress_pool        import EgressSocketPool
+from topology           import gateway_address
+from fleet_reporter     import FLEET_PORT
+
+# Packet type of frames sent by the Pi itself, as reported by AF_PACKET sockets
+PACKET_OUTGOING = 4
+
+# Maximal number of packets read on a socket before yielding to the event loop
+BATCH_SIZE = 64
+
+# Destination ports of the services the Pi answers itself : DNS, DHCP and mDNS, and of the fleet metrics reports
+RESERVED_PORTS = frozenset((53, 67, 68, 5353, FLEET_PORT))
+
+# Decisions taken on received datagrams
+SKIPPED     = 'skipped'
+DISCOVERY   = 'discovery'
+FORWARDED   = 'forwarded'
+
+
+def classify(pkt, port) :
+    """
+    Extract the UDP datagram carried by an ethernet frame, and decide how to process it.
+    Return (decision, src_addr, src_port, dst_addr, dst_port, data), or None if the frame
+    does not carry a whole UDP datagram : other protocols, and IP fragments, which cannot
+    be forwarded on their own.
+
+    Parameters:
+    - pkt: ethernet frame carrying an IPv4 packet.
+    - port: discovery port.
+    """
+    result = None
+    # Protocol and fragmentation fields are checked first, most frames being TCP
+    if len(pkt) >= 42 and pkt[23] == 17 and pkt[20] & 0x3F == 0 and pkt[21] == 0 :
+        start = 14 + (pkt[14] & 0x0F) * 4
+        if len(pkt) >= start + 8 :
+            src_port, dst_port, length = unpack_from('!HHH', pkt, start)
+            if dst_port in RESERVED_PORTS :
+                decision = SKIPPED
+            elif dst_port == port :
+                decision = DISCOVERY
+            else :
+                decision = FORWARDED
+            # The UDP length excludes the ethernet padding of short frames
+            result = (decision, inet_ntoa(pkt[26:30]), src_port, inet_ntoa(pkt[30:34]), dst_port, pkt[start + 8:start + length])
+    return result
+
+
+class Destination :
+    """Limelight the forwarder dispatches to, with its own discovery coalescing and answer cache."""
+
+    __slots__ = ('interface', 'ip', 'address', 'gateways', 'coalescer', 'cache')
+
+    def __init__(self, interface, ip, gateways, coalescer, cache):
+        """
+        Initialize the destination.
+
+        Parameters:
+        - interface: interface the limelight is plugged on.
+        - ip: limelight IP address.
+        - gateways: dictionary of the gateway IP address reaching this limelight, indexed by source interface.
+        - coalescer: merge of the discovery requests sent to this limelight.
+        - cache: discovery answer of this limelight.
+        """
+        self.interface = interface
+        self.ip = ip
+        self.address = inet_aton(ip)
+        self.gateways = gateways
+        self.coalescer = coalescer
+        self.cache = cache
+
 
+class UdpForwarder(DaemonPlugin) :
 
-class UdpForwarder :
-    
     def __init__(self):
         """Initialize the UdpForwarder with default None sockets and parameters."""
         self.__is_running = False
 
-        # Sockets toward limelight
-        self.__forward_sending_socket = None
-        self.__forward_receiving_socket1 = None
-        self.__forward_receiving_socket2 = None
-        self.__forward_receiving_socket3 = None
-
-        # Sockets from limelight
-        self.__backward_sending_socket1 = None
-        self.__backward_sending_socket2 = None
-        self.__backward_sending_socket3 = None
-        self.__backward_receiving_socket = None
-
-        # Gateways IP (limelight and PI)
-        self.__gateway1 = None
-        self.__gateway2 = None
-        self.__gateway3 = None
-        self.__gateway_out = None
-
-        # Interfaces names on PI
-        self.__interface1 = None
-        self.__interface2 = None
-        self.__interface3 = None
-        self.__interface_out = None
-
-        # Senders and receivers IPs on the gateways networks
-        self.__ip1 = None
-        self.__ip2 = None
-        self.__ip3 = None
-        self.__ip_out = None
-
-    def configure(self, in_ip1, in_ip2, in_ip3, out_ip, in_int1, in_int2, in_int3, out_int, port) :
-        """
-        Configure the forwarder with source and destination IPs and interfaces.
+        self.__interfaces = None
 
-        Parameters:
-        - in_ip1, in_ip2, in_ip3: Gateway IPs for the two input interfaces (source networks).
-        - out_ip: Gateway IP for the output interface (destination network).
-        - in_int1, in_int2, in_int3: Network interfaces to listen on for incoming UDP packets.
-        - out_int: Network interface to forward UDP packets to.
-        - port: UDP port number used for forwarding.
-        """
+        # Source interfaces and their gateway IPs on the Pi
+        self.__sources = []
 
-        self.__gateway1 = in_ip1
-        self.__gateway2 = in_ip2
-        self.__gateway3 = in_ip3
-        self.__gateway_out = out_ip
+        # Limelights indexed by their interface, and by the gateway IPs the clients reach them at
+        self.__destinations = {}
+        self.__routes = {}
 
-        self.__interface1 = in_int1
-        self.__interface2 = in_int2
-        self.__interface3 = in_int3
-        self.__interface_out = out_int
+        self.__port = None
 
-        self.__ip1 = None
-        self.__ip2 = None
-        self.__ip3 = None
-        self.__ip_out = None
+        # Raw receiving sockets, indexed by interface
+        self.__receiving_sockets = {}
 
-        self.__port = port
+        # Socket holding the forwarding port, so that limelight answers to it are not refused
+        self.__port_socket = None
 
-        self.__is_running = True
+        # Connected sockets toward limelight, and from limelight toward the clients
+        self.__forward_pool = None
+        self.__backward_pool = None
+
+        # Last client IP seen on each source interface
+        self.__clients = {}
 
-        handler = RotatingFileHandler('/var/log/udp_forwarder.log', maxBytes=5*1024*1024, backupCount=3)
-        formatter = Formatter('%(asctime)s - line %(lineno)d - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        getLogger().setLevel(DEBUG)
-        getLogger().addHandler(handler)
+        # Networks of the clients whose broadcasts are served, indexed by source interface, all of them if missing
+        self.__scopes = {}
 
-    def start(self) :
+        # Packets counters indexed by interface then by counter name
+        self.__statistics = {}
+
+    def configure(self, options, interfaces, metrics) :
+        """
+        Configure the forwarder with source and destination IPs and interfaces.
+
+        Parameters:
+        - options: forwarder section, with
+            - sources: comma separated list of interface:gateway to listen on for incoming UDP packets.
+            - destination: comma separated list of interface:ip of the limelights to forward UDP packets to. Clients
+              reach the n-th limelight at the n-th address after the gateway of their interface.
+            - scopes: comma separated list of interface:network of the clients whose broadcasts are served on a source
+              interface shared with other robots, the others being the clients of these robots. Empty to serve them all.
+            - port: UDP port number used for forwarding.
+            - coalescing_window: delay in seconds during which identical discovery requests are sent only once.
+            - answer_timeout: delay in seconds during which discovery answers are delivered to the requesters.
+            - answer_cache_ttl: delay in seconds during which the limelight discovery answer is served by the Pi itself, 0 to disable.
+            - egress_sockets: maximal number of connected sockets kept open toward the clients.
+            - egress_idle_timeout: delay in seconds after which an unused connected socket is closed.
+        - interfaces: shared interface state service.
+        - metrics: shared metrics registry.
+        """
+
+        self.__interfaces = interfaces
+
+        self.__sources = []
+        for source in options.get('sources').split(',') :
+            interface, gateway = source.strip().split(':')
+            self.__sources.append((interface, gateway))
+
+        self.__port = options.getint('port', 5809)
+
+        self.__scopes = {}
+        for scope in options.get('scopes', '').split(',') :
+            if len(scope.strip()) == 0 : continue
+            interface, network = scope.strip().split(':')
+            self.__scopes[interface] = IPv4Network(network)
+
+        # Each limelight has its own dispatch entry : discovery requests are sent to all of them, other
+        # datagrams to the one whose gateway they target, and answers are rewritten with this gateway
+        self.__destinations = {}
+        self.__routes = {}
+        for index, destination in enumerate(options.get('destination').split(',')) :
+            interface_out, gateway_out = destination.strip().split(':')
+            gateways = { interface : gateway_address(gateway, index) for interface, gateway in self.__sources }
+            coalescer = DiscoveryCoalescer(options.getfloat('coalescing_window', 0.2), options.getfloat('answer_timeout', 2.0))
+            cache = DiscoveryCache(options.getfloat('answer_cache_ttl', 10.0), gateway_out, gateways)
+            self.__destinations[interface_out] = Destination(interface_out, gateway_out, gateways, coalescer, cache)
+            for gateway in gateways.values() :
+                self.__routes[gateway] = self.__destinations[interface_out]
+
+        capacity = options.getint('egress_sockets', 64)
+        idle_timeout = options.getfloat('egress_idle_timeout', 60.0)
+        self.__forward_pool = EgressSocketPool(capacity, idle_timeout, self.__port)
+        self.__backward_pool = EgressSocketPool(capacity, idle_timeout)
+
+        self.__clients = {}
+        self.__statistics = {}
+        for interface in [source[0] for source in self.__sources] + list(self.__destinations.keys()) :
+            interfaces.watch(interface, self.__on_interface_change)
+            self.__statistics[interface] = {}
+            for counter in ['received', 'skipped', 'out_of_scope', 'coalesced', 'cached', 'forwarded', 'errors'] :
+                self.__statistics[interface][counter] = metrics.counter('forwarder_packets_' + counter, interface=interface)
+
+    async def start(self) :
         """
         Initialize and bind raw and UDP sockets for forwarding.
 
@@ -105,434 +200,263 @@ class UdpForwarder :
         - Raw sockets bound to input interfaces to capture all IPv4 packets.
         - Raw socket bound to output interface for backward direction.
         - UDP datagram sockets for sending and receiving broadcast packets.
+
+        Interfaces not plugged yet, such as a Limelight not connected, get their raw
+        socket as soon as the interface monitor reports them up.
         """
 
         result = True
 
         info(f" Starting forwarder")
 
-        signal(SIGTERM, self.__handle_signal)
-        signal(SIGINT, self.__handle_signal)
+        self.__is_running = True
 
-        try :
-            # Raw socket to receive all IPv4 packets on interface1
-            self.__forward_receiving_socket1 = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
-            self.__forward_receiving_socket1.bind((self.__interface1,0))
-            self.__forward_receiving_socket1.setblocking(0)
-            info(f" Raw forward receiving socket 1 bound to {self.__interface1}")
-        except Exception as e:
-            error(f"Failed to bind raw forward socket 1 : {e}")
-            result = False
-        
-        try :
-            # Raw socket to receive all IPv4 packets on interface2
-            self.__forward_receiving_socket2 = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
-            self.__forward_receiving_socket2.bind((self.__interface2,0))
-            self.__forward_receiving_socket2.setblocking(0)
-            info(f" Raw forward receiving socket 2 bound to {self.__interface2}")
-        except Exception as e:
-            error(f"Failed to bind raw forward socket 2 : {e}")
-            result = False
+        for interface in [source[0] for source in self.__sources] + list(self.__destinations.keys()) :
+            if not self.__interfaces.is_up(interface) :
+                info(f" Interface {interface} is down, its raw socket will be bound when it comes up")
+            elif not self.__open_receiving_socket(interface) :
+                result = False
 
-        try :
-            # Raw socket to receive all IPv4 packets on interface3
-            self.__forward_receiving_socket3 = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
-            self.__forward_receiving_socket3.bind((self.__interface3,0))
-            self.__forward_receiving_socket3.setblocking(0)
-            info(f" Raw forward receiving socket 3 bound to {self.__interface3}")
-        except Exception as e:
-            error(f"Failed to bind raw forward socket 3 : {e}")
-            result = False
-        
-        try :
-            # Raw socket to receive all IPv4 packets on output interface for backward forwarding
-            self.__backward_receiving_socket = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
-            self.__backward_receiving_socket.bind((self.__interface_out,0))
-            self.__backward_receiving_socket.setblocking(0)
-            info(f" Raw backward receiving socket bound to {self.__interface_out}")
-        except Exception as e:
-            error(f"Failed to bind raw forward socket 1 : {e}")
-            result = False
-        
-        try:
-            # UDP socket for sending forwarded packets out
-            # The port shall be fixed because limelight does not take care of
-            # the sender port and sends broadcast UDP packet back to port 5809
-            self.__forward_sending_socket = socket(AF_INET, SOCK_DGRAM)
-            self.__forward_sending_socket.bind(("0.0.0.0",self.__port))
-            self.__forward_sending_socket.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
-        except Exception as e:
-            error(f"Failed to create forward sending socket: {e}")
-            result = False
-        
-        try:
-            # UDP socket for sending backward packets to gateway1
-            self.__backward_sending_socket1 = socket(AF_INET, SOCK_DGRAM)
-            self.__backward_sending_socket1.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
-        except Exception as e:
-            error(f"Failed to create backward sending socket 1: {e}")
-            result = False
-        
-        try:
-            # UDP socket for sending backward packets to gateway2
-            self.__backward_sending_socket2 = socket(AF_INET, SOCK_DGRAM)
-            self.__backward_sending_socket2.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
-        except Exception as e:
-            error(f"Failed to create backward sending socket 2: {e}")
-            result = False
         try:
-            # UDP socket for sending backward packets to gateway2
-            self.__backward_sending_socket3 = socket(AF_INET, SOCK_DGRAM)
-            self.__backward_sending_socket3.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+            # UDP socket holding the forwarding port. Packets toward the limelight
+            # are sent from connected sockets sharing this port, because limelight
+            # does not take care of the sender port and sends broadcast UDP packet
+            # back to port 5809. Packets toward the clients are sent from connected
+            # sockets created on demand.
+            self.__port_socket = socket(AF_INET, SOCK_DGRAM)
+            self.__port_socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+            self.__port_socket.bind(("0.0.0.0",self.__port))
+            self.__port_socket.setblocking(0)
         except Exception as e:
-            error(f"Failed to create backward sending socket 3: {e}")
+            error(f"Failed to create forwarding port socket: {e}")
             result = False
-        
-        info(f"Forwarding all UDP packets received on {self.__interface1} to {self.__interface_out} on port {self.__port}")
-        info(f"Forwarding all UDP packets received on {self.__interface2} to {self.__interface_out} on port {self.__port}")
-        info(f"Forwarding all UDP packets received on {self.__interface3} to {self.__interface_out} on port {self.__port}")
-        info(f"Forwarding all UDP packets received on {self.__interface_out} to {self.__interface1} on same port")
-        info(f"Forwarding all UDP packets received on {self.__interface_out} to {self.__interface2} on same port")
-        info(f"Forwarding all UDP packets received on {self.__interface_out} to {self.__interface3} on same port")
 
-        return (result or not self.__is_running)
+        if not result :
+            # Release what could be bound so that next attempt starts clean
+            await self.stop()
+        else :
+            for interface, gateway in self.__sources :
+                for destination in self.__destinations.values() :
+                    info(f"Forwarding all UDP packets received on {interface} to {destination.interface} on port {self.__port}")
+                    info(f"Forwarding all UDP packets received on {destination.interface} to {interface} on same port")
 
-    def process_forward1(self):
-        """
-        Continuously process UDP packets received on interface1 and forward them to the output interface.
-        """
-        while self.__is_running:
-            # Check/rebind socket if needed
-            if (
-                self.__forward_receiving_socket1 is None
-                or not self.__interface_is_up(self.__interface1)
-            ):
-                self.__forward_receiving_socket1 = self.__rebind_socket(self.__forward_receiving_socket1, self.__interface1)
-                if self.__forward_receiving_socket1 is None:
-                    from time import sleep
-                    sleep(1)
-                    continue
-            try:
-                ready, _, _ = select([self.__forward_receiving_socket1], [], [], 1.0)
-            except Exception as e:
-                error(f"Select error on forward1: {e}")
-                continue
-            if ready:
-                try:
-                    pkt, _ = self.__forward_receiving_socket1.recvfrom(65535)
-                    ip_header = pkt[14:34]
-                    udp_header = pkt[34:42]
-                    iph = unpack('!BBHHHBBH4s4s', ip_header)
-                    protocol = iph[6]
-                    if protocol != 17:
-                        continue  # Not UDP
-                    src_addr = inet_ntoa(iph[8])
-                    dst_addr = inet_ntoa(iph[9])
-                    self.__ip1 = src_addr
-                    udph = unpack('!HHHH', udp_header)
-                    src_port, dst_port = udph[0], udph[1]
-                    if dst_port in (53, 67, 68, 5353):
-                        debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
-                        continue
-                    data = pkt[42:]
-                    debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
-                    try:
-                        target_ip = self.__gateway_out
-                        if self.__ip_out is not None:
-                            target_ip = self._ip_out
-                        self.__forward_sending_socket.sendto(data, (target_ip, dst_port))
-                        debug(f"[SEND] Forwarded to {target_ip}:{dst_port}")
-                    except Exception as e:
-                        error(f"Failed to forward: {e}")
-                except OSError as e:
-                    # Network is down: [Errno 100] Network is down (Linux ENETDOWN)
-                    if getattr(e, 'errno', None) == 100:
-                        error(f"Network down on interface {self.__interface1}, will rebind: {e}")
-                        self.__forward_receiving_socket1 = None
-                        from time import sleep
-                        sleep(1)
-                    else:
-                        error(f"Raw socket recv error: {e}")
-                except Exception as e:
-                    error(f"Raw socket recv error: {e}")
+        return result
+
+    async def stop(self) :
+        """Close all sockets and stop the forwarder."""
+
+        self.__is_running = False
+
+        for interface in list(self.__receiving_sockets.keys()) :
+            self.__close_receiving_socket(interface)
+        self.__forward_pool.flush()
+        self.__backward_pool.flush()
+        if self.__port_socket is not None : self.__port_socket.close()
+        self.__port_socket = None
 
-    def process_forward2(self):
+    def process_forward(self, interface) :
         """
-        Continuously process UDP packets received on interface2 and forward them to the output interface.
+        Process UDP packets received on a source interface and forward them to the output interface.
+
+        Parameters:
+        - interface: source interface on which packets are available.
         """
-        while self.__is_running:
-            if (
-                self.__forward_receiving_socket2 is None
-                or not self.__interface_is_up(self.__interface2)
-            ):
-                self.__forward_receiving_socket2 = self.__rebind_socket(self.__forward_receiving_socket2, self.__interface2)
-                if self.__forward_receiving_socket2 is None:
-                    from time import sleep
-                    sleep(1)
-                    continue
+
+        sock = self.__receiving_sockets.get(interface)
+        statistics = self.__statistics[interface]
+
+        for _ in range(BATCH_SIZE) :
             try:
-                ready, _, _ = select([self.__forward_receiving_socket2], [], [], 1.0)
-            except Exception as e:
-                error(f"Select error on forward2: {e}")
+                pkt, address = sock.recvfrom(65535)
+            except BlockingIOError :
+                break
+            except OSError as e:
+                self.__handle_receive_error(interface, e)
+                break
+
+            # Ignore our own packets, sent backward to the clients
+            if address[2] == PACKET_OUTGOING : continue
+
+            packet = classify(pkt, self.__port)
+            if packet is None : continue
+            statistics['received'].inc()
+
+            decision, src_addr, src_port, dst_addr, dst_port, data = packet
+            route = self.__routes.get(dst_addr)
+            scope = self.__scopes.get(interface)
+            if route is None and scope is not None and decision != SKIPPED and IPv4Address(src_addr) not in scope :
+                # Broadcast of another robot client : left to its own robot, which answers it alone
+                debug(f"[SCOPE] Skipping UDP broadcast from {src_addr} outside of {scope}")
+                statistics['out_of_scope'].inc()
                 continue
-            if ready:
-                try:
-                    pkt, _ = self.__forward_receiving_socket2.recvfrom(65535)
-                    ip_header = pkt[14:34]
-                    udp_header = pkt[34:42]
-                    iph = unpack('!BBHHHBBH4s4s', ip_header)
-                    protocol = iph[6]
-                    if protocol != 17:
-                        continue  # Not UDP
-                    src_addr = inet_ntoa(iph[8])
-                    dst_addr = inet_ntoa(iph[9])
-                    self.__ip2 = src_addr
-                    udph = unpack('!HHHH', udp_header)
-                    src_port, dst_port = udph[0], udph[1]
-                    if dst_port in (53, 67, 68, 5353):
-                        debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
+            self.__clients[interface] = src_addr
+            if decision == SKIPPED :
+                debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
+                statistics['skipped'].inc()
+                continue
+            debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
+            now = monotonic()
+
+            # Datagrams to a limelight gateway go to this limelight only, broadcasts to all of them
+            for destination in (self.__destinations.values() if route is None else [route]) :
+                if decision == DISCOVERY :
+                    answer = destination.cache.answer(interface, now)
+                    requester = (interface, src_addr)
+                    if answer is not None :
+                        # Limelight answer known : reply at once, and only refresh it from the limelight
+                        try :
+                            self.__backward_pool.send(interface, src_addr, self.__port, answer, now)
+                            statistics['cached'].inc()
+                            debug(f"[CACHE] Answered discovery from {src_addr} with cached {destination.ip} answer")
+                            requester = None
+                        except Exception as e :
+                            statistics['errors'].inc()
+                            error(f"Failed to answer discovery from {src_addr}: {e}")
+                    if not destination.coalescer.request(data, requester, now) :
+                        # Identical discovery request already sent, its answer will be shared
+                        debug(f"[COALESCE] Discovery request from {src_addr} to {destination.ip} merged with a pending one")
+                        statistics['coalesced'].inc()
                         continue
-                    data = pkt[42:]
-                    debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
-                    try:
-                        target_ip = self.__gateway_out
-                        if self.__ip_out is not None:
-                            target_ip = self._ip_out
-                        self.__forward_sending_socket.sendto(data, (target_ip, dst_port))
-                        debug(f"[SEND] Forwarded to {target_ip}:{dst_port}")
-                    except Exception as e:
-                        error(f"Failed to forward: {e}")
-                except OSError as e:
-                    if getattr(e, 'errno', None) == 100:
-                        error(f"Network down on interface {self.__interface2}, will rebind: {e}")
-                        self.__forward_receiving_socket2 = None
-                        from time import sleep
-                        sleep(1)
-                    else:
-                        error(f"Raw socket recv error: {e}")
+                try:
+                    self.__forward_pool.send(destination.interface, destination.ip, dst_port, data, now)
+                    statistics['forwarded'].inc()
+                    debug(f"[SEND] Forwarded to {destination.ip}:{dst_port}")
                 except Exception as e:
-                    error(f"Raw socket recv error: {e}")
+                    statistics['errors'].inc()
+                    error(f"Failed to forward: {e}")
 
-    
-    def process_forward3(self):
+    def process_backward(self, interface_out) :
         """
-        Continuously process UDP packets received on interface3 and forward them to the output interface.
+        Process UDP packets received on a limelight interface and forward them back to the source interfaces.
+        Discovery answers are learnt, and delivered to all the clients whose request is still pending,
+        with the limelight address replaced by the gateway the clients reach it at.
+
+        Parameters:
+        - interface_out: limelight interface on which packets are available.
         """
-        while self.__is_running:
-            if (
-                self.__forward_receiving_socket3 is None
-                or not self.__interface_is_up(self.__interface3)
-            ):
-                self.__forward_receiving_socket3 = self.__rebind_socket(self.__forward_receiving_socket3, self.__interface3)
-                if self.__forward_receiving_socket3 is None:
-                    from time import sleep
-                    sleep(1)
-                    continue
+
+        sock = self.__receiving_sockets.get(interface_out)
+        statistics = self.__statistics[interface_out]
+        destination = self.__destinations[interface_out]
+
+        for _ in range(BATCH_SIZE) :
             try:
-                ready, _, _ = select([self.__forward_receiving_socket3], [], [], 1.0)
-            except Exception as e:
-                error(f"Select error on forward3: {e}")
+                pkt, address = sock.recvfrom(65535)
+            except BlockingIOError :
+                break
+            except OSError as e:
+                self.__handle_receive_error(interface_out, e)
+                break
+
+            # Ignore our own packets, forwarded to the limelight
+            if address[2] == PACKET_OUTGOING : continue
+
+            # Any traffic from the limelight proves it is still up
+            if pkt[26:30] == destination.address : destination.cache.seen(monotonic())
+
+            packet = classify(pkt, self.__port)
+            if packet is None : continue
+            statistics['received'].inc()
+
+            decision, src_addr, src_port, dst_addr, dst_port, data = packet
+            if decision == SKIPPED :
+                debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
+                statistics['skipped'].inc()
                 continue
-            if ready:
+            debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
+
+            # Discovery answers are learnt and go to the clients which asked for
+            # them, other packets to the last client seen on each source interface.
+            # Answers to cache refreshes nobody waits for are only learnt
+            targets = None
+            now = monotonic()
+            if decision == DISCOVERY :
+                targets = destination.coalescer.requesters(now)
+                if src_addr == destination.ip and destination.cache.is_enabled() :
+                    destination.cache.store(data, now)
+                elif not targets :
+                    targets = None
+            if targets is None :
+                targets = [(interface, self.__clients.get(interface, gateway)) for interface, gateway in self.__sources]
+
+            for interface, target_ip in targets :
                 try:
-                    pkt, _ = self.__forward_receiving_socket3.recvfrom(65535)
-                    ip_header = pkt[14:34]
-                    udp_header = pkt[34:42]
-                    iph = unpack('!BBHHHBBH4s4s', ip_header)
-                    protocol = iph[6]
-                    if protocol != 17:
-                        continue  # Not UDP
-                    src_addr = inet_ntoa(iph[8])
-                    dst_addr = inet_ntoa(iph[9])
-                    self.__ip3 = src_addr
-                    udph = unpack('!HHHH', udp_header)
-                    src_port, dst_port = udph[0], udph[1]
-                    if dst_port in (53, 67, 68, 5353):
-                        debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
-                        continue
-                    data = pkt[42:]
-                    debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
-                    try:
-                        target_ip = self.__gateway_out
-                        if self.__ip_out is not None:
-                            target_ip = self._ip_out
-                        self.__forward_sending_socket.sendto(data, (target_ip, dst_port))
-                        debug(f"[SEND] Forwarded to {target_ip}:{dst_port}")
-                    except Exception as e:
-                        error(f"Failed to forward: {e}")
-                except OSError as e:
-                    if getattr(e, 'errno', None) == 100:
-                        error(f"Network down on interface {self.__interface3}, will rebind: {e}")
-                        self.__forward_receiving_socket3 = None
-                        from time import sleep
-                        sleep(1)
-                    else:
-                        error(f"Raw socket recv error: {e}")
+                    payload = destination.cache.rewrite(interface, data) if decision == DISCOVERY else data
+                    self.__backward_pool.send(interface, target_ip, dst_port, payload, now)
+                    statistics['forwarded'].inc()
+                    debug(f"[SEND] Forwarded to {target_ip}:{dst_port}")
                 except Exception as e:
-                    error(f"Raw socket recv error: {e}")
+                    statistics['errors'].inc()
+                    error(f"Failed to forward to {target_ip}:{dst_port}: {e}")
 
-    def process_backward(self):
+    def __open_receiving_socket(self, interface) :
         """
-        Continuously process UDP packets received on the output interface and forward them back to interface1 and interface2.
+        Open a raw socket on the given interface and register it on the event loop.
         """
-        while self.__is_running:
-
-            if (
-                self.__backward_receiving_socket is None
-                or not self.__interface_is_up(self.__interface_out)
-            ):
-                self.__backward_receiving_socket = self.__rebind_socket(self.__backward_receiving_socket, self.__interface_out)
-                if self.__backward_receiving_socket is None:
-                    from time import sleep
-                    sleep(1)
-                    continue
-
-            try:
-                ready, _, _ = select([self.__backward_receiving_socket], [], [], 1.0)
-            except Exception as e:
-                error(f"Select error on backward: {e}")
-                continue
-            if ready:
-                try:
-                    pkt, _ = self.__backward_receiving_socket.recvfrom(65535)
-                    ip_header = pkt[14:34]
-                    udp_header = pkt[34:42]
-                    iph = unpack('!BBHHHBBH4s4s', ip_header)
-                    protocol = iph[6]
-                    if protocol != 17:
-                        continue  # Not UDP
-                    src_addr = inet_ntoa(iph[8])
-                    dst_addr = inet_ntoa(iph[9])
-                    udph = unpack('!HHHH', udp_header)
-                    src_port, dst_port = udph[0], udph[1]
-                    if dst_port in (53, 67, 68, 5353):
-                        debug(f"[SKIP] Skipping UDP packet to reserved port {dst_port}")
-                        continue
-                    data = pkt[42:]
-                    debug(f"[RECV] UDP {src_addr}:{src_port} → {dst_addr}:{dst_port}, {len(data)} bytes")
-                    try:
-                        target_ip1 = self.__gateway1
-                        if self.__ip1 is not None:
-                            target_ip1 = self.__ip1
-                        self.__backward_sending_socket1.sendto(data, (target_ip1, dst_port))
-                        target_ip2 = self.__gateway2
-                        if self.__ip2 is not None:
-                            target_ip2 = self.__ip2
-                        self.__backward_sending_socket2.sendto(data, (target_ip2, dst_port))
-                        target_ip3 = self.__gateway2
-                        if self.__ip3 is not None:
-                            target_ip3 = self.__ip3
-                        self.__backward_sending_socket3.sendto(data, (target_ip3, dst_port))
-                        debug(f"[SEND] Forwarded to {target_ip1}:{dst_port} , {target_ip2}:{dst_port} and {target_ip3}:{dst_port}")
-                    except Exception as e:
-                        error(f"Failed to forward: {e}")
-                except OSError as e:
-                    if getattr(e, 'errno', None) == 100:
-                        error(f"Network down on interface {self.__interface_out}, will rebind: {e}")
-                        self.__backward_receiving_socket = None
-                        from time import sleep
-                        sleep(1)
-                    else:
-                        error(f"Raw socket recv error: {e}")
-                except Exception as e:
-                    error(f"Raw socket recv error: {e}")
 
+        result = True
 
-    def stop(self) :
-        """Close all sockets and stop the forwarder."""
-        if self.__backward_receiving_socket is not None : self.__backward_receiving_socket.close()
-        if self.__backward_sending_socket1  is not None : self.__backward_sending_socket1.close()
-        if self.__backward_sending_socket2  is not None : self.__backward_sending_socket2.close()
-        if self.__backward_sending_socket3  is not None : self.__backward_sending_socket3.close()
-        if self.__forward_receiving_socket1 is not None : self.__forward_receiving_socket1.close()
-        if self.__forward_receiving_socket2 is not None : self.__forward_receiving_socket2.close()
-        if self.__forward_receiving_socket3 is not None : self.__forward_receiving_socket3.close()
-        if self.__forward_sending_socket    is not None : self.__forward_sending_socket.close()
-
-
-    def __handle_signal(self, signum, frame):
-        """Handle termination signals to cleanly stop the forwarder."""
-        info("Signal received, exiting...")
-        self.__is_running = False
+        self.__close_receiving_socket(interface)
 
-    def __interface_is_up(self, interface):
-        """
-        Check if a network interface is up using ioctl SIOCGIFFLAGS.
-        """
         try:
-            s = socket(AF_INET, SOCK_DGRAM)
-            ifreq = pack('256s', interface[:15].encode('utf-8'))
-            flags = unpack('H', ioctl(s, 0x8913, ifreq)[16:18])[0]  # SIOCGIFFLAGS
-            return flags & 1  # IFF_UP
+            # Raw socket to receive all IPv4 packets on interface
+            sock = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
+            sock.bind((interface, 0))
+            sock.setblocking(0)
+            self.__receiving_sockets[interface] = sock
+            if interface in self.__destinations :
+                get_running_loop().add_reader(sock, self.process_backward, interface)
+            else :
+                get_running_loop().add_reader(sock, self.process_forward, interface)
+            info(f" Raw receiving socket bound to {interface}")
         except Exception as e:
-            error(f"Failed to check interface status for {interface}: {e}")
-            return False
+            error(f"Failed to bind raw socket to {interface} : {e}")
+            result = False
 
-    def __rebind_socket(self, sock, interface):
+        return result
+
+    def __close_receiving_socket(self, interface) :
         """
-        Attempt to close and reopen a raw socket on the given interface.
+        Unregister and close the raw socket of the given interface, if any.
         """
-        try:
-            if sock:
+        sock = self.__receiving_sockets.pop(interface, None)
+        if sock is not None :
+            try :
+                get_running_loop().remove_reader(sock)
                 sock.close()
-        except Exception:
-            pass
+            except Exception :
+                pass
 
-        result = None
-
-        try:
-            result = socket(AF_PACKET, SOCK_RAW, ntohs(0x0800))
-            result.bind((interface, 0))
-            result.setblocking(0)
-            info(f"Rebound raw socket to {interface}")
-        except Exception as e:
-            error(f"Failed to rebind raw socket to {interface}: {e}")
+    def __handle_receive_error(self, interface, e) :
+        """
+        Drop the socket on network down errors, it will be reopened once the interface is back up.
+        """
+        if getattr(e, 'errno', None) == ENETDOWN:
+            error(f"Network down on interface {interface}, will rebind: {e}")
+            self.__close_receiving_socket(interface)
+            get_running_loop().call_later(1.0, self.__reopen, interface)
+        else:
+            self.__statistics[interface]['errors'].inc()
+            error(f"Raw socket recv error: {e}")
+
+    def __reopen(self, interface) :
+        """
+        Reopen the raw socket of an interface if it is up and has no socket.
+        """
+        if self.__is_running and interface not in self.__receiving_sockets and self.__interfaces.is_up(interface) :
+            if self.__open_receiving_socket(interface) :
+                info(f"Rebound raw socket to {interface}")
 
-        return result
-    
-        
-
-if __name__ == "__main__":
-
-    # Instantiate the UDP forwarder
-    forwarder = UdpForwarder()
-
-    # Command-line interface to specify source/destination IPs and interfaces
-    parser = ArgumentParser(description="UDP forwarder for Limelight discovery")
-    parser.add_argument("--from-ip1", dest="src_ip1", required=True, help="Source IP to listen on")
-    parser.add_argument("--from-ip2", dest="src_ip2", required=True, help="Source IP to listen on")
-    parser.add_argument("--from-ip3", dest="src_ip3", required=True, help="Source IP to listen on")
-    parser.add_argument("--to-ip", dest="dst_ip", required=True, help="Destination IP to forward to")
-    parser.add_argument("--from-interface1", dest="src_int1", required=True, help="Interface for reverse direction")
-    parser.add_argument("--from-interface2", dest="src_int2", required=True, help="Interface for reverse direction")
-    parser.add_argument("--from-interface3", dest="src_int3", required=True, help="Interface for reverse direction")
-    parser.add_argument("--to-interface", dest="dst_int", required=True, help="Interface for forward direction")
-
-    args = parser.parse_args()
-
-    # Configure and start the forwarder
-    forwarder.configure(args.src_ip1, args.src_ip2, args.src_ip3 , args.dst_ip, args.src_int1, args.src_int2, args.src_int3, args.dst_int, 5809)
-    
-    started = False
-    while not started :  started = forwarder.start()
-
-
-    # Launch threads to handle forwarding in both directions concurrently
-    threads = []
-    threads.append(Thread(target=forwarder.process_forward1, args=(), daemon=True))
-    threads.append(Thread(target=forwarder.process_forward2, args=(), daemon=True))
-    threads.append(Thread(target=forwarder.process_forward3, args=(), daemon=True))
-    threads.append(Thread(target=forwarder.process_backward, args=(), daemon=True))
-
-    for t in threads:
-        t.start()
-
-    info("UDP forwarder running. Press Ctrl+C to stop.")
-    
-    try:
-        for t in threads:
-            t.join()
-    except KeyboardInterrupt:
-        info("Exiting.")
-
-    forwarder.stop()
+    def __on_interface_change(self, interface, state) :
+        """
+        Follow interfaces status : release sockets of interfaces going down, rebind them when back up.
+        Connected sockets are released on any change, their source address may no longer be valid.
+        """
+        self.__forward_pool.flush(interface)
+        self.__backward_pool.flush(interface)
+        if self.__is_running :
+            if state.up : self.__reopen(interface)
+            else : self.__close_receiving_socket(interface)
+        if interface in self.__destinations and not state.up :
+            # The limelight can no longer be vouched for
+            self.__destinations[interface].cache.clear()
@@ -0,0 +1,139 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+This module implements the zeroconf based mDNS responder, kept
+as a fallback of the builtin one. Names are published as dummy
+http services on a zeroconf instance bound to a single interface.
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from socket             import inet_aton, IPPROTO_IP, SOL_SOCKET, SO_REUSEPORT
+from logging            import info, error
+
+# Zeroconf includes
+from zeroconf           import ServiceInfo, IPVersion, DNSOutgoing, DNSAddress, __version__ as ZEROCONF_VERSION
+from zeroconf.asyncio   import AsyncZeroconf
+
+# Local includes
+from mdns_probe         import TYPE_A, CLASS_IN
+
+# Linux socket option restricting multicast reception to the groups joined by the socket itself
+IP_MULTICAST_ALL = 49
+
+FLAGS_RESPONSE   = 0x8400
+
+
+class ZeroconfResponder :
+    """Publish names with the address of a single interface, using python-zeroconf."""
+
+    def __init__(self, interface, ip, names, metrics, ttl=120):
+        """
+        Initialize the responder.
+
+        Parameters:
+        - interface: interface on which the names are published.
+        - ip: IPv4 address of the interface, on which the zeroconf instance is bound.
+        - names: dictionary of the IPv4 address to publish, among the interface addresses, indexed by name.
+        - metrics: shared metrics registry, unused.
+        - ttl: time to live in seconds of the published records.
+        """
+        self.__interface = interface
+        self.__ip = ip
+        self.__names = names
+        self.__ttl = ttl
+
+        self.__dns = None
+        self.__services = []
+
+    async def start(self, probe=True) :
+        """
+        Start a zeroconf instance bound to the interface address, and register the names on it.
+
+        Parameters:
+        - probe: True to check the names are not used before announcing them, False
+          to announce at once names this host already owns.
+        """
+
+        self.__dns = AsyncZeroconf(interfaces=[self.__ip], ip_version=IPVersion.V4Only)
+
+        # All responders listen on 0.0.0.0:5353, each shall only receive the
+        # queries of its own interface, not those of the other responders groups.
+        # SO_REUSEPORT is cleared, the kernel would otherwise deliver each multicast
+        # query to a single socket of the reuseport group. The listening socket is
+        # private to zeroconf (checked with 0.151) : without it, the isolation is lost
+        listener = getattr(getattr(self.__dns.zeroconf, 'engine', None), '_listen_socket', None)
+        if listener is not None :
+            try :
+                listener.setsockopt(IPPROTO_IP, IP_MULTICAST_ALL, 0)
+                listener.setsockopt(SOL_SOCKET, SO_REUSEPORT, 0)
+            except (OSError, AttributeError) as e :
+                error(f"Failed to isolate the zeroconf responder on {self.__interface} : {e}")
+        else :
+            error(f"Zeroconf {ZEROCONF_VERSION} listening socket not found, the responder on {self.__interface} "
+                  f"receives the queries of the other interfaces too, use the builtin engine for per interface isolation")
+
+        for name, address in self.__names.items() :
+            service = ServiceInfo(
+                type_="_http._tcp.local.",
+                name=f"{name}._http._tcp.local.",
+                addresses=[inet_aton(address)],
+                port=80,  # Dummy port — ignored for name resolution
+                properties={},
+                # Fully qualified, otherwise queries for the name do not match the registered server
+                server=name.rstrip('.') + '.',
+                host_ttl=self.__ttl,
+            )
+            await self.__dns.async_register_service(service, cooperating_responders=not probe)
+            self.__services.append(service)
+
+        info(f"Names {', '.join(self.__names)} published on {self.__interface} at {self.__ip}")
+        return True
+
+    async def update(self, ip, names) :
+        """
+        Move the names to a new address of the interface. The zeroconf instance cannot follow
+        the address it is bound to : the former one is closed without goodbyes, and a new one
+        announces the names at once, without probing them. Only the former address records
+        are withdrawn.
+
+        Parameters:
+        - ip: new IPv4 address of the interface.
+        - names: dictionary of the IPv4 address to publish, among the interface addresses, indexed by name.
+        """
+
+        former = self.__names
+        if self.__dns is not None :
+            # Forgotten services are not unregistered on close, their records stay in the clients caches
+            self.__dns.zeroconf.registry.async_remove(self.__services)
+            await self.__dns.async_close()
+        self.__dns = None
+        self.__services = []
+
+        self.__ip = ip
+        self.__names = names
+        result = await self.start(probe=False)
+
+        goodbye = DNSOutgoing(FLAGS_RESPONSE)
+        for name, address in former.items() :
+            goodbye.add_answer_at_time(DNSAddress(name.rstrip('.') + '.', TYPE_A, CLASS_IN, 0, inet_aton(address)), 0)
+        self.__dns.zeroconf.async_send(goodbye)
+
+        return result
+
+    async def stop(self) :
+        """Unregister the names and close the zeroconf instance."""
+        if self.__dns is not None :
+            for service in self.__services :
+                try :
+                    await self.__dns.async_unregister_service(service)
+                except Exception as e :
+                    error(f"Failed to unregister {service.server} on {self.__interface} : {e}")
+            await self.__dns.async_close()
+        self.__dns = None
+        self.__services = []
@@ -23,9 +23,11 @@ echo ""
 echo "❶ Configuring usb0 and eth0 ip range"
 
 source $scriptpath/../conf/env
+# Fleet mode moves the ethernet network to the robot one
+eval "$(python3 $scriptpath/../data/topology.py env --env $scriptpath/../conf/env)"
 export ADDRESS_SCRIPT_PATH=/usr/local/bin/limelight-address.sh
 
-envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS' < $scriptpath/../data/limelight-address.sh > $ADDRESS_SCRIPT_PATH
+envsubst '$ETH_IP_GATEWAY,$ETH_IP_PREFIX,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS,$ETH_MTU,$USB_MTU_LINUX,$USB_MTU_WINDOWS' < $scriptpath/../data/limelight-address.sh > $ADDRESS_SCRIPT_PATH
 chmod +x $ADDRESS_SCRIPT_PATH
 
 echo "  ➡️  Created limelight address script"
@@ -61,6 +63,8 @@ echo "❷ Configuring DHCP servers on usb0 and eth0"
 
 shall_reboot=false
 source $scriptpath/../conf/env
+# Fleet mode moves the ethernet network to the robot one
+eval "$(python3 $scriptpath/../data/topology.py env --env $scriptpath/../conf/env)"
 
 apt -qq update
 apt -qq install -y dnsmasq
@@ -68,12 +72,12 @@ echo "  ➡️  Installed dnsmasq DHCP server "
 
 # 2.1 - Create DHCP server for usb0 
 
-envsubst '$USB_IP_ADDRESSES_LINUX' < $scriptpath/../data/usb0.conf > /etc/dnsmasq.d/usb0.conf
+envsubst '$USB_IP_ADDRESSES_LINUX,$USB_IP_GATEWAY_LINUX' < $scriptpath/../data/usb0.conf > /etc/dnsmasq.d/usb0.conf
 echo "  ➡️  Created DHCP configuration for usb0"
 
 # 2.2 - Create DHCP server for usb1
 
-envsubst '$USB_IP_ADDRESSES_WINDOWS' < $scriptpath/../data/usb1.conf > /etc/dnsmasq.d/usb1.conf
+envsubst '$USB_IP_ADDRESSES_WINDOWS,$USB_IP_GATEWAY_WINDOWS' < $scriptpath/../data/usb1.conf > /etc/dnsmasq.d/usb1.conf
 echo "  ➡️  Created DHCP configuration for usb1"
 
 # 2.3 - Create DHCP server for eth0
@@ -135,39 +139,66 @@ sudo systemctl restart avahi-daemon
 
 echo "✅ Avahi now limited to wlan0 only."
 
-# 3.2 - Install zeroconf based name resolver
+# 3.2 - Install limenurse daemon with its zeroconf based name resolver plugin
 
 apt -qq install -y python3-zeroconf
 
-cp $scriptpath/../data/name_resolver.py /usr/local/bin/name_resolver.py
+export LIMENURSE_PATH=/usr/local/lib/limenurse
 
-export DNS_SCRIPT_PATH=/usr/local/bin/limelight-dns.sh
+mkdir -p $LIMENURSE_PATH
+cp $scriptpath/../data/*.py $LIMENURSE_PATH/
 
-envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY' < $scriptpath/../data/limelight-dns.sh > $DNS_SCRIPT_PATH
-chmod +x $DNS_SCRIPT_PATH
+echo "  ➡️  Installed limenurse daemon"
 
-echo "  ➡️  Created limelight dns script"
+mkdir -p /etc/limenurse
+# Daemon CPUs of the steering plan, left free of network softirqs
+export LIMENURSE_CPUS=$(python3 $scriptpath/../data/cpu_steering.py option --config $scriptpath/../conf/steering.ini)
+envsubst '$LIMENURSE_CPUS' < $scriptpath/../data/limenurse.conf > /etc/limenurse/daemon.conf
+cp $scriptpath/../conf/steering.ini /etc/limenurse/steering.ini
+cp $scriptpath/../conf/topology.ini /etc/limenurse/topology.ini
 
-SERVICE_PATH=/etc/systemd/system/limelight-dns.service
-envsubst '$DNS_SCRIPT_PATH' < $scriptpath/../data/limelight-dns.service > $SERVICE_PATH
+# One name per Limelight of the topology
+export LIMELIGHT_USB_NAMES=$(python3 $scriptpath/../data/topology.py option usb --env $scriptpath/../conf/env --topology $scriptpath/../conf/topology.ini)
+export LIMELIGHT_ETH_NAMES=$(python3 $scriptpath/../data/topology.py option eth --env $scriptpath/../conf/env --topology $scriptpath/../conf/topology.ini)
+envsubst '$LIMELIGHT_USB_NAMES,$LIMELIGHT_ETH_NAMES' < $scriptpath/../data/limenurse-resolver.conf > /etc/limenurse/resolver.conf
 
-echo "  ➡️  Prepared limelight dns service"
+echo "  ➡️  Configured limenurse name resolver"
 
-# Check if service already exists
+# Fleet mode : every robot reports its metrics to the laptops of the switch
+if [ -n "$ROBOT_ID" ]; then
+    envsubst '$ROBOT_ID' < $scriptpath/../data/limenurse-fleet.conf > /etc/limenurse/fleet.conf
+    echo "  ➡️  Configured limenurse fleet reporter for robot $ROBOT_ID"
+else
+    rm -f /etc/limenurse/fleet.conf
+fi
+
+# Remove the standalone resolver service from previous installations
 if systemctl list-unit-files | grep -q limelight-dns.service; then
+    systemctl disable --now limelight-dns.service || true
+    rm -f /etc/systemd/system/limelight-dns.service /usr/local/bin/limelight-dns.sh /usr/local/bin/name_resolver.py
+    echo "  🧹 Removed legacy limelight dns service"
+fi
+
+SERVICE_PATH=/etc/systemd/system/limenurse.service
+envsubst '$LIMENURSE_PATH' < $scriptpath/../data/limenurse.service > $SERVICE_PATH
+
+echo "  ➡️  Prepared limenurse service"
+
+# Check if service already exists
+if systemctl list-unit-files | grep -q limenurse.service; then
     echo "  🔁 Service already exists. Reloading, enabling, and restarting."
     systemctl daemon-reload
-    systemctl enable limelight-dns.service
-    systemctl restart limelight-dns.service
+    systemctl enable limenurse.service
+    systemctl restart limenurse.service
 else
     echo "  🆕 Installing new service."
     systemctl daemon-reload
-    systemctl enable limelight-dns.service
-    systemctl start limelight-dns.service
+    systemctl enable limenurse.service
+    systemctl start limenurse.service
 fi
 
-if ! systemctl is-active --quiet limelight-dns.service; then
-    echo "  ❌ Failed to start limelight dns service"
+if ! systemctl is-active --quiet limenurse.service; then
+    echo "  ❌ Failed to start limenurse service"
     exit 1
 fi
 
@@ -9,7 +9,7 @@
 # - Still enable ssh connection to the pi through eth0 
 # -------------------------------------------------------
 # Nadège LEMPERIERE, @2nd May 2025
-# Latest revision: 2nd May 2025
+# Latest revision: 19th October 2026
 # -------------------------------------------------------
 
 
@@ -30,24 +30,37 @@ echo "  ➡️  Enabled IPv4 forwarding"
 
 shall_reboot=false
 source $scriptpath/../conf/env
+# Fleet mode moves the ethernet network to the robot one
+eval "$(python3 $scriptpath/../data/topology.py env --env $scriptpath/../conf/env)"
 
 echo ""
-echo "❷ Configuring iptables rules"
+echo "❷ Configuring nftables rules"
 
-# Installing iptables
+# Installing nftables, and conntrack to report the offloaded flows
 apt -qq update
-apt -qq install -y iptables
-echo "  ➡️  Installed iptables"
+apt -qq install -y nftables conntrack
+echo "  ➡️  Installed nftables"
 
-# Creating iptables rules
+# Creating nftables rules from the gateway configuration
 
 source $scriptpath/../conf/env
+# Fleet mode moves the ethernet network to the robot one
+eval "$(python3 $scriptpath/../data/topology.py env --env $scriptpath/../conf/env)"
 export ROUTING_SCRIPT_PATH=/usr/local/bin/limelight-routing.sh
 
-cp $scriptpath/../data/udp_forwarder.py /usr/local/bin/udp_forwarder.py
+mkdir -p /usr/local/lib/limenurse
+cp $scriptpath/../data/routing_compiler.py $scriptpath/../data/traffic_priority.py $scriptpath/../data/topology.py $scriptpath/../data/mtu_probe.py $scriptpath/../data/cpu_steering.py /usr/local/lib/limenurse/
+mkdir -p /etc/limenurse
+cp $scriptpath/../conf/env /etc/limenurse/routing.env
+cp $scriptpath/../conf/topology.ini /etc/limenurse/topology.ini
+cp $scriptpath/../conf/steering.ini /etc/limenurse/steering.ini
 
-envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS' < $scriptpath/../data/limelight-routing.sh > $ROUTING_SCRIPT_PATH
-chmod +x $ROUTING_SCRIPT_PATH
+# Limelights of the topology, as the limenurse plugins options
+export LIMELIGHT_INTERFACES=$(python3 $scriptpath/../data/topology.py option interfaces --env $scriptpath/../conf/env --topology $scriptpath/../conf/topology.ini)
+export LIMELIGHT_DESTINATIONS=$(python3 $scriptpath/../data/topology.py option destinations --env $scriptpath/../conf/env --topology $scriptpath/../conf/topology.ini)
+export LIMELIGHT_PROBES=$(python3 $scriptpath/../data/topology.py option probes --env $scriptpath/../conf/env --topology $scriptpath/../conf/topology.ini)
+
+install -m 755 $scriptpath/../data/limelight-routing.sh $ROUTING_SCRIPT_PATH
 
 echo "  ➡️  Created limelight routing script"
 
@@ -56,6 +69,13 @@ envsubst '$ROUTING_SCRIPT_PATH' < $scriptpath/../data/limelight-routing.service
 
 echo "  ➡️  Prepared limelight routing service"
 
+# Rebuild the flowtable when a fast path interface comes back, a flowtable only hooks existing devices
+UDEV_RULE=/etc/udev/rules.d/99-limelight-routing.rules
+echo 'ACTION=="add", SUBSYSTEM=="net", KERNEL=="usb0|usb1|eth0|'${LIMELIGHT_INTERFACES//, /|}'", RUN+="/bin/systemctl --no-block restart limelight-routing.service"' > $UDEV_RULE
+udevadm control --reload-rules
+
+echo "  ➡️  Prepared limelight routing hot-plug rule"
+
 # Check if service already exists
 if systemctl list-unit-files | grep -q limelight-routing.service; then
     echo "  🔁 Service already exists. Reloading, enabling, and restarting."
@@ -74,8 +94,54 @@ if ! systemctl is-active --quiet limelight-routing.service; then
     exit 1
 fi
 
+# Removing the rules of previous iptables based installations once the nftables ones are loaded,
+# so that new connections are translated by either of them in the meantime
+if command -v iptables > /dev/null 2>&1; then
+    iptables -F
+    iptables -t nat -F
+    iptables -t raw -F
+    iptables -X
+    echo "  ➡️  Removed legacy iptables rules"
+fi
+
 echo "✅ Limelight routing installation complete"
 
+# 3 - Add the UDP forwarder plugin to the limenurse daemon
+echo ""
+echo "❸ Configuring UDP forwarder"
+
+export LIMENURSE_PATH=/usr/local/lib/limenurse
+
+mkdir -p $LIMENURSE_PATH
+cp $scriptpath/../data/*.py $LIMENURSE_PATH/
+
+mkdir -p /etc/limenurse
+envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS,$LIMELIGHT_DESTINATIONS,$DISCOVERY_SCOPES' < $scriptpath/../data/limenurse-forwarder.conf > /etc/limenurse/forwarder.conf
+envsubst '$VIDEO_RATE,$LIMELIGHT_PROBES' < $scriptpath/../data/limenurse-guard.conf > /etc/limenurse/guard.conf
+envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS,$LIMELIGHT_DESTINATIONS' < $scriptpath/../data/limenurse-accounting.conf > /etc/limenurse/accounting.conf
+
+# The TCP proxy only runs when ports are left to it instead of the DNAT of the routing ruleset
+if [ -n "$LIMELIGHT_PROXY_PORTS" ]; then
+    envsubst '$ETH_IP_GATEWAY,$USB_IP_GATEWAY_LINUX,$USB_IP_GATEWAY_WINDOWS,$LIMELIGHT_DESTINATIONS,$LIMELIGHT_PROXY_PORTS' < $scriptpath/../data/limenurse-proxy.conf > /etc/limenurse/proxy.conf
+    echo "  ➡️  Configured limenurse TCP proxy on ports $LIMELIGHT_PROXY_PORTS"
+else
+    rm -f /etc/limenurse/proxy.conf
+fi
+
+echo "  ➡️  Configured limenurse UDP forwarder, latency guard and flow accounting"
+
+# Remove the standalone forwarder from previous installations
+rm -f /usr/local/bin/udp_forwarder.py
+
+systemctl restart limenurse.service
+
+if ! systemctl is-active --quiet limenurse.service; then
+    echo "  ❌ Failed to restart limenurse service"
+    exit 1
+fi
+
+echo "✅ UDP forwarder installation complete"
+
 # 4 - Reboot to make sure everything is consistent
 echo ""
 echo "✅ All routes available."
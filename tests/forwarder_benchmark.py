@@ -0,0 +1,424 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+Benchmark the LimeNurse forwarder packet processing offline,
+from recorded pcap files
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from logging                        import config, getLogger
+from os                             import path, makedirs
+from sys                            import path as sys_path, getallocatedblocks, version_info
+from glob                           import glob
+from struct                         import pack, unpack_from
+from socket                         import inet_aton
+from random                         import Random
+from time                           import perf_counter_ns
+from platform                       import machine
+from json                           import load, dump
+from gc                             import disable, enable, collect
+from statistics                     import median, quantiles
+
+# Click includes
+from click                          import option, group
+
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from udp_forwarder                  import classify     # pylint: disable=C0413
+
+# Logger configuration settings
+logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
+fixtures_path = path.normpath(path.join(path.dirname(__file__), 'data/forwarder'))
+baseline_path = path.join(fixtures_path, 'baseline.json')
+
+# Forwarding port, as configured on the Pi
+PORT = 5809
+
+# Interquartile spreads of the relative cost samples a slowdown shall exceed to be a regression
+SPREADS = 3
+
+# pcap file format
+PCAP_MAGIC          = 0xa1b2c3d4
+PCAP_MAGIC_NANO     = 0xa1b23c4d
+LINKTYPE_ETHERNET   = 1
+ETHERTYPE_IPV4      = b'\x08\x00'
+
+
+def reference(pkt, port) :
+    """Do nothing, with the same call as the classification, to calibrate the measures."""
+    return None
+
+
+def read_pcap(filename) :
+    """
+    Return the IPv4 ethernet frames of a pcap file, as the forwarder raw sockets receive them.
+
+    Args:
+        filename (str): path of the pcap file, in either byte order.
+    """
+    result = []
+    with open(filename, 'rb') as file :
+        content = file.read()
+
+    order = '<'
+    magic = unpack_from('<I', content)[0]
+    if magic not in (PCAP_MAGIC, PCAP_MAGIC_NANO) : order = '>'
+    magic, major, minor, zone, accuracy, snaplen, linktype = unpack_from(order + 'IHHiIII', content)
+    if magic not in (PCAP_MAGIC, PCAP_MAGIC_NANO) or linktype != LINKTYPE_ETHERNET :
+        raise ValueError(f'{filename} is not an ethernet pcap file')
+
+    offset = 24
+    while offset + 16 <= len(content) :
+        seconds, fraction, captured, length = unpack_from(order + 'IIII', content, offset)
+        offset += 16
+        frame = content[offset:offset + captured]
+        offset += captured
+        if captured == length and frame[12:14] == ETHERTYPE_IPV4 : result.append(frame)
+    return result
+
+
+def write_pcap(filename, frames) :
+    """
+    Write ethernet frames to a pcap file, one millisecond apart.
+
+    Args:
+        filename (str): path of the pcap file.
+        frames (list): ethernet frames.
+    """
+    with open(filename, 'wb') as file :
+        file.write(pack('<IHHiIII', PCAP_MAGIC, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for i, frame in enumerate(frames) :
+            file.write(pack('<IIII', i // 1000, (i % 1000) * 1000, len(frame), len(frame)) + frame)
+
+
+class FrameBuilder:
+    """Builds the ethernet frames of the synthetic fixtures, padded as on the wire."""
+
+    def __init__(self, seed):
+        """
+        Constructor.
+
+        Args:
+            seed (int): seed of the random generator, so that fixtures are reproducible.
+        """
+        self.__random = Random(seed)
+        self.__identifier = 0
+
+    def random(self) :
+        """Return the fixture random generator."""
+        return self.__random
+
+    def ip(self, src, dst, protocol, payload, flags=0, offset=0, options=b'', identifier=None) :
+        """
+        Return an ethernet frame carrying an IPv4 packet.
+
+        Args:
+            src (str): source address.
+            dst (str): destination address.
+            protocol (int): IP protocol.
+            payload (bytes): IP payload.
+            flags (int): IP flags, 1 for more fragments.
+            offset (int): fragment offset, in bytes.
+            options (bytes): IP options, a multiple of 4 bytes long.
+            identifier (int): IP identifier, a new one if None.
+        """
+        if identifier is None :
+            self.__identifier = (self.__identifier + 1) & 0xFFFF
+            identifier = self.__identifier
+        header = pack('!BBHHHBBH4s4s', 0x45 + len(options) // 4, 0, 20 + len(options) + len(payload), identifier,
+                      (flags << 13) | (offset // 8), 64, protocol, 0, inet_aton(src), inet_aton(dst))
+        result = b'\xff' * 6 + b'\x02\x00\x00\x00\x00\x01' + ETHERTYPE_IPV4 + header + options + payload
+        # Ethernet minimal frame size
+        return result + b'\x00' * max(0, 60 - len(result))
+
+    def udp(self, src, sport, dst, dport, data) :
+        """Return an ethernet frame carrying an UDP datagram."""
+        return self.ip(src, dst, 17, pack('!HHHH', sport, dport, 8 + len(data), 0) + data)
+
+    def tcp(self, src, sport, dst, dport, data) :
+        """Return an ethernet frame carrying a TCP segment."""
+        sequence = self.__random.getrandbits(32)
+        return self.ip(src, dst, 6, pack('!HHIIBBHHH', sport, dport, sequence, 0, 0x50, 0x18, 65535, 0, 0) + data)
+
+    def fragments(self, src, sport, dst, dport, data, mtu=1500) :
+        """Return the ethernet frames carrying the fragments of an UDP datagram."""
+        result = []
+        payload = pack('!HHHH', sport, dport, 8 + len(data), 0) + data
+        self.__identifier = (self.__identifier + 1) & 0xFFFF
+        size = (mtu - 20) // 8 * 8
+        for offset in range(0, len(payload), size) :
+            more = 1 if offset + size < len(payload) else 0
+            result.append(self.ip(src, dst, 17, payload[offset:offset + size], more, offset, identifier=self.__identifier))
+        return result
+
+
+class ForwarderBenchmark:
+    """
+    Runs recorded frames through the forwarder classification, the pure part
+    of its hot path deciding for each received frame whether it is skipped,
+    handled as a discovery exchange or forwarded, and measures its cost.
+
+    Each pcap file of the fixtures folder is loaded in memory and classified
+    several times, reporting the time per packet, the memory blocks retained
+    per packet by its classification result, the throughput, and the
+    decisions taken. Results are compared with a stored baseline : a slower
+    classification beyond the tolerance, more retained blocks, or different
+    decisions are reported as regressions. Time is compared relatively to an
+    empty call measured alongside, so that the baseline holds across machines.
+    Each sample times the classification then the empty call, and the median
+    ratio of many short samples is kept : a single measure varies by a quarter
+    on a busy machine, their median by a few percents. The interquartile spread
+    of the ratios widens the tolerance when the machine is noisier.
+    """
+
+    #pylint: disable=R0913, C0301
+    def __init__(self):
+        """Initialize the benchmark by setting up logging."""
+
+        # Initialize logger
+        self.__logger = getLogger()
+        self.__logger.info('%s', 'INITIALIZING FORWARDER BENCHMARK')
+
+        self.__fixtures = {}
+
+    def configure(self, packets, repeat, tolerance) :
+        """
+        Load the fixtures.
+
+        Args:
+            packets (int): minimal number of packets classified per sample.
+            repeat (int): number of samples per fixture, the median one being kept.
+            tolerance (float): relative slowdown from the baseline reported as a regression, at least.
+        """
+
+        self.__logger.info('%s', 'CONFIGURING FORWARDER BENCHMARK')
+
+        self.__packets = packets
+        self.__repeat = repeat
+        self.__tolerance = tolerance
+
+        self.__fixtures = {}
+        for filename in sorted(glob(path.join(fixtures_path, '*.pcap'))) :
+            frames = read_pcap(filename)
+            if len(frames) > 0 :
+                self.__fixtures[path.splitext(path.basename(filename))[0]] = frames
+                self.__logger.info('%s', f'--> {path.basename(filename)} : {len(frames)} frames')
+
+    def run(self, update) :
+        """
+        Measure all fixtures and compare them with the baseline.
+
+        Args:
+            update (bool): True to store the results as the new baseline instead of comparing them.
+
+        Returns:
+            bool: True if no regression was found, otherwise False.
+        """
+
+        result = len(self.__fixtures) > 0
+
+        self.__logger.info('%s', 'RUNNING FORWARDER BENCHMARK')
+
+        results = {}
+        for name, frames in self.__fixtures.items() :
+            results[name] = self.__measure(frames)
+            measure = results[name]
+            self.__logger.info('%s', f"--> {name} : {measure['ns_per_packet']:.0f} ns/packet ({measure['relative_cost']:.2f} times an empty call, " + \
+                                     f"spread {measure['relative_spread'] * 100:.1f}%), {measure['retained_blocks_per_packet']:.2f} retained blocks/packet, " + \
+                                     f"{measure['packets_per_second'] / 1e3:.0f} kpackets/s, {measure['megabytes_per_second']:.0f} MB/s - " + \
+                                     ', '.join(f'{key} {value}' for key, value in sorted(measure['decisions'].items())))
+
+        if update :
+            with open(baseline_path, 'w') as file :
+                dump({ 'python' : '.'.join(str(v) for v in version_info[:3]), 'machine' : machine(), 'fixtures' : results }, file, indent=1, sort_keys=True)
+            self.__logger.info('%s', f'--> Baseline written to {baseline_path}')
+        elif result :
+            result = self.__compare(results)
+
+        if result :
+            self.__logger.info('%s', '--> Benchmark sucessfully executed')
+        else :
+            self.__logger.error('%s', '--> Benchmark found regressions - See logs for more info')
+
+        return result
+
+    def __measure(self, frames) :
+        """Classify a fixture and return its measures."""
+
+        rounds = max(1, self.__packets // len(frames))
+
+        # Decisions, and blocks retained by the results kept alive. Temporary
+        # allocations freed within the classification are not counted
+        results = [None] * len(frames)
+        collect()
+        blocks = getallocatedblocks()
+        ForwarderBenchmark.__classify_all(frames, results)
+        retained = getallocatedblocks() - blocks
+        decisions = {}
+        for packet in results :
+            decision = 'ignored' if packet is None else packet[0]
+            decisions[decision] = decisions.get(decision, 0) + 1
+        del results
+
+        # Samples without garbage collection pauses. The same loop calling a function
+        # doing nothing is measured right after the classification, the cost relative
+        # to it being far less sensitive to the machine and its frequency changes
+        timings = []
+        ratios = []
+        disable()
+        try :
+            for _ in range(self.__repeat) :
+                elapsed = ForwarderBenchmark.__time(classify, frames, rounds)
+                calibration = ForwarderBenchmark.__time(reference, frames, rounds)
+                timings.append(elapsed)
+                ratios.append(elapsed / calibration)
+        finally :
+            enable()
+
+        relative = median(ratios)
+        quartiles = quantiles(ratios, n=4) if len(ratios) > 1 else [relative] * 3
+        ns = median(timings) / (rounds * len(frames))
+        size = sum(len(frame) for frame in frames) / len(frames)
+        return {
+            'ns_per_packet'             : ns,
+            'relative_cost'             : relative,
+            'relative_spread'           : (quartiles[2] - quartiles[0]) / relative,
+            'retained_blocks_per_packet': retained / len(frames),
+            'packets_per_second'        : 1e9 / ns,
+            'megabytes_per_second'      : 1e9 / ns * size / 1e6,
+            'decisions'                 : decisions,
+        }
+
+    @staticmethod
+    def __time(function, frames, rounds) :
+        """Return the time in nanoseconds taken to process the frames several times."""
+        start = perf_counter_ns()
+        for _ in range(rounds) :
+            for frame in frames :
+                function(frame, PORT)
+        return perf_counter_ns() - start
+
+    @staticmethod
+    def __classify_all(frames, results) :
+        """Classify all frames, keeping their results."""
+        for i in range(len(frames)) :
+            results[i] = classify(frames[i], PORT)
+
+    def __compare(self, results) :
+        """Compare the measures with the baseline, and log the regressions."""
+
+        result = True
+
+        try :
+            with open(baseline_path, 'r') as file :
+                baseline = load(file)
+        except (OSError, ValueError) as e :
+            self.__logger.error('%s', f'--> No usable baseline ({e}), run with --update-baseline first')
+            return False
+
+        python = '.'.join(str(v) for v in version_info[:3])
+        if baseline.get('python') != python or baseline.get('machine') != machine() :
+            self.__logger.warning('%s', f"--> Baseline recorded with python {baseline.get('python')} on {baseline.get('machine')}, timings may not compare")
+
+        for name, measure in results.items() :
+            reference = baseline['fixtures'].get(name)
+            if reference is None :
+                self.__logger.warning('%s', f'--> {name} : not in baseline')
+                continue
+            if measure['decisions'] != reference['decisions'] :
+                self.__logger.error('%s', f"--> {name} : decisions changed from {reference['decisions']} to {measure['decisions']}")
+                result = False
+            # Noisier measures, now or when the baseline was recorded, widen the tolerance
+            tolerance = max(self.__tolerance, SPREADS * max(measure['relative_spread'], reference.get('relative_spread', 0)))
+            if measure['relative_cost'] > reference['relative_cost'] * (1 + tolerance) :
+                self.__logger.error('%s', f"--> {name} : {measure['relative_cost']:.2f} times an empty call, baseline {reference['relative_cost']:.2f}, " + \
+                                          f"tolerance {tolerance * 100:.0f}%")
+                result = False
+            if measure['retained_blocks_per_packet'] > reference.get('retained_blocks_per_packet', 0) + 0.01 :
+                self.__logger.error('%s', f"--> {name} : {measure['retained_blocks_per_packet']:.2f} retained blocks/packet, " + \
+                                          f"baseline {reference.get('retained_blocks_per_packet', 0):.2f}")
+                result = False
+
+        return result
+
+    @staticmethod
+    def generate() :
+        """Write the synthetic fixtures : a discovery burst, a MJPEG stream mix and fragmented traffic."""
+
+        makedirs(fixtures_path, exist_ok=True)
+        builder = FrameBuilder(5809)
+        random = builder.random()
+        clients = [f'172.30.0.{10 + i}' for i in range(5)] + [f'172.31.0.{10 + i}' for i in range(5)] + [f'172.40.0.{10 + i}' for i in range(10)]
+        request = b'{"type":"discover"}'
+        answer = b'{"name":"limelight","ip":"172.29.0.1","hw":{"cpu":"CM4","version":"3"},"id":"' + b'0' * 32 + b'"}'
+
+        # Discovery burst : every client asks at once, the limelight answers, with DHCP and mDNS noise
+        frames = []
+        for i in range(10) :
+            for client in clients :
+                frames.append(builder.udp(client, random.randint(40000, 60000), '255.255.255.255', PORT, request))
+            frames.append(builder.udp('172.29.0.1', PORT, '172.29.0.255', PORT, answer))
+            frames.append(builder.udp('0.0.0.0', 68, '255.255.255.255', 67, bytes(300)))
+            frames.append(builder.udp(random.choice(clients), 5353, '224.0.0.251', 5353, bytes(40)))
+        write_pcap(path.join(fixtures_path, 'discovery_burst.pcap'), frames)
+
+        # MJPEG mix : full size TCP segments of the camera stream and their acknowledgments, with some UDP
+        frames = []
+        for i in range(250) :
+            draw = random.random()
+            if draw < 0.75 :
+                frames.append(builder.tcp('172.29.0.1', 5800, random.choice(clients), 51000, bytes(1460)))
+            elif draw < 0.9 :
+                frames.append(builder.tcp(random.choice(clients), 51000, '172.29.0.1', 5800, b''))
+            elif draw < 0.97 :
+                frames.append(builder.udp('172.29.0.1', 5810, random.choice(clients), 5810, bytes(random.randint(20, 200))))
+            else :
+                frames.append(builder.udp(random.choice(clients), 50000, '255.255.255.255', PORT, request))
+        write_pcap(path.join(fixtures_path, 'mjpeg_mix.pcap'), frames)
+
+        # Fragmented traffic : large datagrams in several fragments, short padded datagrams, IP options
+        frames = []
+        for i in range(40) :
+            frames.extend(builder.fragments('172.29.0.1', 5811, random.choice(clients), 5811, bytes(random.randint(2000, 4000))))
+            frames.append(builder.udp(random.choice(clients), 5811, '172.29.0.1', 5811, b'ping'))
+            frames.append(builder.ip(random.choice(clients), '172.29.0.1', 17, pack('!HHHH', 5812, 5812, 12, 0) + b'data', options=b'\x94\x04\x00\x00'))
+        write_pcap(path.join(fixtures_path, 'fragmented.pcap'), frames)
+
+
+# pylint: disable=W0107
+# Main function using Click for command-line options
+@group()
+def main():
+    """Main command group for forwarder benchmark CLI tool."""
+    pass
+# pylint: enable=W0107, W0719
+
+@main.command('run')
+@option('--packets', type=int, default=40000, help='Minimal number of packets classified per sample')
+@option('--repeat', type=int, default=31, help='Number of samples per fixture, the median one being kept')
+@option('--tolerance', type=float, default=0.15, help='Relative slowdown reported as a regression, widened on noisy machines')
+@option('--update-baseline', is_flag=True, help='Store the results as the new baseline')
+def run_benchmark(packets, repeat, tolerance, update_baseline):
+    """Run the forwarder benchmark on the pcap fixtures."""
+
+    config.fileConfig(logg_conf_path)
+
+    benchmark = ForwarderBenchmark()
+    benchmark.configure(packets, repeat, tolerance)
+    if not benchmark.run(update_baseline) :
+        raise SystemExit(1)
+
+@main.command('fixtures')
+def generate_fixtures():
+    """Generate the synthetic pcap fixtures again."""
+    ForwarderBenchmark.generate()
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,16 @@ of view
 # System includes
 from logging                        import getLogger
 from os                             import path
+from sys                            import path as sys_path
 from subprocess                     import check_output, CalledProcessError, DEVNULL
 from re                             import search
 from psutil                         import process_iter, NoSuchProcess, AccessDenied
 
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from topology                       import read_env                                    # pylint: disable=C0413
+
 # Logger configuration settings
 logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
 env_path = path.normpath(path.join(path.dirname(__file__), '../conf/env'))
@@ -58,12 +64,8 @@ class NetworkInsideTester:
 
         self.__is_ready = False
 
-        # Read the Ethernet gateway IP address from the environment file
-        self.__reference_eth_ip = ""
-        with open(env_path, 'r') as file:
-            match = search(r'ETH_IP_GATEWAY=([\d\.]+)', file.read())
-            if match : 
-                self.__reference_eth_ip = match.group(1)
+        # Read the Ethernet gateway IP address from the environment file, moved to the robot network in fleet mode
+        self.__reference_eth_ip = read_env(env_path).get('ETH_IP_GATEWAY', '')
 
         # Read the USB gateway IP address from the environment file
         self.__reference_usb_linux_ip = ""
@@ -186,33 +188,33 @@ class NetworkInsideTester:
                 result = False   
 
             # Check custom dns management is active
-            enabled = NetworkInsideTester.run_command(f"systemctl is-enabled limelight-dns.service")
+            enabled = NetworkInsideTester.run_command(f"systemctl is-enabled limenurse.service")
             if enabled == "enabled" :
-                self.__logger.info("--> limelight-dns.service is enabled")
+                self.__logger.info("--> limenurse.service is enabled")
             else :
-                self.__logger.error("--> limelight-dns.service is not enabled")
+                self.__logger.error("--> limenurse.service is not enabled")
                 result = False
                 
-            active = NetworkInsideTester.run_command(f"systemctl is-active limelight-dns.service")
+            active = NetworkInsideTester.run_command(f"systemctl is-active limenurse.service")
             if active == "active" :
-                self.__logger.info("--> limelight-dns.service is active")
+                self.__logger.info("--> limenurse.service is active")
             else :
-                self.__logger.error("--> limelight-dns.service is not active")
+                self.__logger.error("--> limenurse.service is not active")
                 result = False   
 
             # Check that the python script is running
-            running = NetworkInsideTester.is_python_command_running("name_resolver.py")
+            running = NetworkInsideTester.is_python_command_running("limenurse.py")
             if running :
-                self.__logger.info("--> Python forwarder is running")
+                self.__logger.info("--> Python limenurse daemon is running")
             else :
-                self.__logger.error("--> Python forwarder is not running")
+                self.__logger.error("--> Python limenurse daemon is not running")
                 result = False   
 
-            has_error = NetworkInsideTester.file_contains_error("/var/log/name_resolver.log")
+            has_error = NetworkInsideTester.file_contains_error("/var/log/limenurse.log")
             if not has_error :
-                self.__logger.info("--> No error in forwarder log")
+                self.__logger.info("--> No error in limenurse log")
             else :
-                self.__logger.error("--> Error found in  forwarder log")
+                self.__logger.error("--> Error found in limenurse log")
                 result = False   
             
             return result
@@ -14,14 +14,21 @@ of view
 # System includes
 from logging                        import getLogger
 from os                             import path
+from sys                            import path as sys_path
 from subprocess                     import run, DEVNULL, PIPE
 from re                             import search
 from platform                       import system
 from socket                         import gethostbyname, AF_INET
 
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from topology                       import Topology, read_env, load                    # pylint: disable=C0413
+
 # Logger configuration settings
 logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
 env_path = path.normpath(path.join(path.dirname(__file__), '../conf/env'))
+topology_path = path.normpath(path.join(path.dirname(__file__), '../conf/topology.ini'))
 limelight_descriptors_path = path.normpath(path.join(path.dirname(__file__), '../data/limelight-gadget.json'))
 
 class NetworkOutsideTester:
@@ -58,11 +65,10 @@ class NetworkOutsideTester:
 
         self.__is_ready = False
 
-        self.__reference_eth_ip = ""
-        with open(env_path, 'r') as file:
-            match = search(r'ETH_IP_GATEWAY=([\d\.]+)', file.read())
-            if match : 
-                self.__reference_eth_ip = match.group(1)
+        # Ethernet gateway IP address moved to the robot network in fleet mode, where the ethernet names carry the robot id
+        topology = Topology()
+        self.__reference_eth_ip = read_env(env_path).get('ETH_IP_GATEWAY', '')
+        self.__eth_name = topology.limelights()[0].eth if topology.configure(read_env(env_path), load(topology_path)) else "limelight.eth.local"
 
         # Read the USB gateway IP address from the environment file
         usb_linux_ip = ""
@@ -82,7 +88,7 @@ class NetworkOutsideTester:
         self.__shall_use_sshpass = True
         
         if(platform == 'windows') : 
-            self.__shall_test_names = False
+            self.__shall_test_names = True
             self.__shall_use_sshpass = False
             self.__reference_usb_ip = usb_windows_ip
         elif (platform == 'linux') : 
@@ -124,7 +130,7 @@ class NetworkOutsideTester:
                     self.__logger.error('--> USB gadget name is not resolved')
 
             if self.__shall_test_names : 
-                eth_ip = NetworkOutsideTester.resolve("limelight.eth.local")
+                eth_ip = NetworkOutsideTester.resolve(self.__eth_name)
                 if eth_ip == self.__reference_eth_ip :
                     self.__logger.info('--> Ethernet name is correctly resolved to ip ' + self.__reference_eth_ip)
                 elif len(eth_ip) != 0 :
@@ -168,7 +174,7 @@ class NetworkOutsideTester:
                     result = False
 
             if self.__shall_test_names : 
-                is_pingable = NetworkOutsideTester.is_pingable("limelight.eth.local")
+                is_pingable = NetworkOutsideTester.is_pingable(self.__eth_name)
                 if is_pingable :
                     self.__logger.info('--> Ethernet name pingable')
                 else :
@@ -198,7 +204,7 @@ class NetworkOutsideTester:
                 result = False
 
             if self.__shall_test_names : 
-                can_login = NetworkOutsideTester.test_ssh("limelight.eth.local", self.__user, self.__password, self.__shall_use_sshpass)
+                can_login = NetworkOutsideTester.test_ssh(self.__eth_name, self.__user, self.__password, self.__shall_use_sshpass)
                 if can_login :
                     self.__logger.info('--> Login with ethernet name is possible ')
                 else :
@@ -0,0 +1,513 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+Measure the Control Hub results round trip time under laptop
+video load, with and without the traffic priority scheme, on
+virtual interfaces with no Pi hardware
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from logging                        import config, getLogger
+from os                             import path
+from sys                            import executable, stdin, stdout, path as sys_path
+from subprocess                     import Popen, PIPE, CalledProcessError
+from asyncio                        import run, get_running_loop, sleep, start_server, open_connection, wait_for, gather, \
+                                           TimeoutError as WaitTimeout
+from json                           import loads, dumps, dump
+from time                           import monotonic
+
+# Click includes
+from click                          import option, group
+
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from routing_compiler               import RoutingCompiler                              # pylint: disable=C0413
+from traffic_priority               import TrafficPriority                              # pylint: disable=C0413
+from topology                       import read_env, sequential, gateway_address, CLIENTS   # pylint: disable=C0413
+from resolver_benchmark             import isolate, configure_links, percentile         # pylint: disable=C0413
+
+# Logger configuration settings
+logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
+env_path = path.normpath(path.join(path.dirname(__file__), '../conf/env'))
+
+# Pi address on the n-th Limelight link
+PI_LIMELIGHT_IP = '172.29.{0}.2'
+
+# Limelight video stream and REST API ports
+VIDEO_PORT = 5800
+RESULTS_PORT = 5807
+
+# Video frame and results answer sizes, in bytes
+FRAME_SIZE = 32768
+RESULTS_SIZE = 512
+
+# Delay after which a results request is considered lost
+TIMEOUT = 2.0
+
+
+class PriorityBenchmark:
+    """
+    Routes a simulated Control Hub and a simulated laptop to a simulated
+    Limelight through the Pi routing ruleset, and measures the Control Hub
+    results round trip time, idle and while the laptop watches video, first
+    without the traffic priority scheme and then with it.
+
+    The Pi side lives in a private network namespace, with usb0, usb1, eth0
+    and eth1 as veth pairs. The Limelight end of eth1 is moved to a second
+    namespace, with a token bucket emulating the Limelight link rate and its
+    deep buffer, serving endless video streams and small results answers.
+    The client ends are moved to a third namespace, where the Control Hub
+    polls results through usb0 and the laptop reads video through eth0.
+
+    With several Limelights, each has its own namespace behind eth2, eth3...
+    and the Control Hub polls and the laptop watches all of them at once,
+    so that the measures show whether the video of one Limelight delays the
+    results of another.
+    """
+
+    #pylint: disable=R0913, C0301
+    def __init__(self):
+        """Initialize the benchmark by setting up logging."""
+
+        # Initialize logger
+        self.__logger = getLogger()
+        self.__logger.info('%s', 'INITIALIZING PRIORITY BENCHMARK')
+
+        self.__is_ready = False
+        self.__env = {}
+
+    def configure(self, streams, duration, interval, link_rate, output, limelights=1) :
+        """
+        Configure the benchmark load.
+
+        Args:
+            streams (int): number of video streams read by the laptop from each Limelight.
+            duration (float): duration of each measure in seconds.
+            interval (float): delay in seconds between two Control Hub results requests.
+            link_rate (str): rate of the simulated Limelight link, as a tc rate, None for the configured one.
+            output (str): file to write the json report to, None for logs only.
+            limelights (int): number of simulated Limelights.
+        """
+
+        self.__logger.info('%s', 'CONFIGURING PRIORITY BENCHMARK')
+
+        self.__is_ready = False
+        self.__streams = streams
+        self.__duration = duration
+        self.__interval = interval
+        self.__output = output
+        self.__limelights = limelights
+
+        self.__env = read_env(env_path)
+        if link_rate is not None : self.__env['LIMELIGHT_LINK_RATE'] = link_rate
+        self.__env.setdefault('LIMELIGHT_LINK_RATE', '100mbit')
+
+        self.__compiler = RoutingCompiler()
+        self.__priority = TrafficPriority()
+
+        topology = sequential(limelights)
+        if self.__compiler.configure(self.__env, topology) and self.__priority.configure(self.__env, topology) and \
+           streams > 0 and duration > 0 and interval > 0 :
+            self.__is_ready = True
+        else :
+            self.__logger.error('%s', '--> Invalid benchmark configuration : Giving up')
+
+    def run(self) :
+        """
+        Execute the benchmark and log its report.
+
+        Returns:
+            bool: True if the benchmark ran and all measures got answers, otherwise False.
+        """
+
+        result = False
+
+        if self.__is_ready :
+
+            self.__logger.info('%s', 'RUNNING PRIORITY BENCHMARK')
+
+            limelights = []
+            clients = None
+            interfaces = self.__priority.interfaces()
+
+            try :
+                isolate()
+                self.__create_links()
+                if not self.__compiler.apply(interfaces=interfaces) :
+                    raise RuntimeError('Routing ruleset not applied, nft is required')
+                self.__logger.info('%s', '--> Virtual interfaces routed')
+
+                for index in range(self.__limelights) :
+                    limelights.append(self.__start_peer(['limelight', '--link-rate', self.__env['LIMELIGHT_LINK_RATE'], '--index', str(index)],
+                                                        [f'eth{index + 1}-limelight']))
+                clients = self.__start_peer(['clients', '--streams', str(self.__streams), '--interval', str(self.__interval),
+                                             '--limelights', str(self.__limelights)], ['usb0-client', 'eth0-client'])
+                self.__logger.info('%s', f'--> {self.__limelights} Limelight links at {self.__env["LIMELIGHT_LINK_RATE"]}, ' + \
+                                         f'{self.__streams} video streams each')
+
+                report = { 'link_rate' : self.__env['LIMELIGHT_LINK_RATE'], 'streams' : self.__streams, 'interval' : self.__interval,
+                           'limelights' : self.__limelights }
+                for scheme in ['without', 'with'] :
+                    if scheme == 'with' :
+                        if not self.__priority.apply(interfaces=interfaces) :
+                            raise RuntimeError('Traffic priority scheme not applied')
+                    else :
+                        self.__priority.remove(interfaces=interfaces)
+                    report[scheme] = {}
+                    for phase in ['idle', 'video'] :
+                        clients.stdin.write(f'{phase} {self.__duration}\n')
+                        clients.stdin.flush()
+                        line = clients.stdout.readline()
+                        if not line : raise RuntimeError('Clients stopped')
+                        report[scheme][phase] = loads(line)
+
+                result = self.__report(report)
+
+            except (OSError, CalledProcessError, RuntimeError, ValueError) as e :
+                self.__logger.error('%s', f'--> Benchmark failed : {e}')
+
+            finally :
+                for process in [clients] + limelights :
+                    if process is not None and process.poll() is None :
+                        process.kill()
+                        process.wait()
+
+        return result
+
+    def __create_links(self) :
+        """Create the Pi interfaces as veth pairs, with a gateway address per Limelight, and enable forwarding between them."""
+        commands = ['link set lo up']
+        for interface, variable in CLIENTS :
+            commands.append(f'link add {interface} type veth peer name {interface}-client')
+            for index in range(self.__limelights) :
+                commands.append(f'addr add {gateway_address(self.__env[variable], index)}/24 dev {interface}')
+            commands.append(f'link set {interface} up')
+        for index in range(self.__limelights) :
+            commands.append(f'link add eth{index + 1} type veth peer name eth{index + 1}-limelight')
+            commands.append(f'addr add {PI_LIMELIGHT_IP.format(index)}/24 dev eth{index + 1}')
+            commands.append(f'link set eth{index + 1} up')
+        configure_links(commands)
+
+        with open('/proc/sys/net/ipv4/ip_forward', 'w') as file :
+            file.write('1\n')
+
+    def __start_peer(self, arguments, links) :
+        """Start a peer in its own namespace, and hand it its links."""
+
+        peer = Popen([executable, path.abspath(__file__)] + arguments, stdin=PIPE, stdout=PIPE, text=True)
+
+        # The peer is in its namespace once it says so, links can then be moved to it
+        self.__expect(peer, 'ready')
+        configure_links([f'link set {link} netns {peer.pid}' for link in links])
+        peer.stdin.write('go\n')
+        peer.stdin.flush()
+        self.__expect(peer, 'started')
+
+        return peer
+
+    def __expect(self, peer, step) :
+        """Wait for a peer to reach a step."""
+        line = peer.stdout.readline().strip()
+        if line != step :
+            raise RuntimeError(f'Peer failed before {step}')
+
+    def __report(self, report) :
+        """Log the benchmark report and write it to the output file if any. Return True if all measures got answers."""
+
+        result = True
+
+        for scheme in ['without', 'with'] :
+            for phase in ['idle', 'video'] :
+                for index, measure in enumerate(report[scheme][phase]) :
+                    name = f", limelight {index + 1}" if self.__limelights > 1 else ''
+                    self.__log_measure(f"--> {scheme} scheme, {phase}{name}", phase, measure)
+                    if measure['rtt'] is None or measure['lost'] > 0 : result = False
+
+        if result :
+            without = max(measure['rtt']['p99'] for measure in report['without']['video'])
+            within = max(measure['rtt']['p99'] for measure in report['with']['video'])
+            self.__logger.info('%s', f'--> Control Hub p99 rtt under video load : {without * 1000:.2f}ms without the scheme, ' + \
+                                     f'{within * 1000:.2f}ms with it')
+
+        if self.__output is not None :
+            with open(self.__output, 'w') as file :
+                dump(report, file, indent=1, sort_keys=True)
+            self.__logger.info('%s', f'--> Report written to {self.__output}')
+
+        if result :
+            self.__logger.info('%s', '--> Benchmark sucessfully executed')
+        else :
+            self.__logger.error('%s', '--> Benchmark lost results requests - See logs for more info')
+
+        return result
+
+    def __log_measure(self, prefix, phase, measure) :
+        """Log the measure of a Limelight, as an error if results requests were lost."""
+        line = f"{prefix} : {measure['answered']} results, {measure['lost']} lost"
+        if measure['rtt'] is not None :
+            line += ' - rtt ' + ' '.join(f'{key} {value * 1000:.2f}ms' for key, value in measure['rtt'].items())
+        if phase == 'video' :
+            line += f" - video {measure['video_mbps']:.1f}Mbit/s"
+        if measure['rtt'] is None or measure['lost'] > 0 :
+            self.__logger.error('%s', line)
+        else :
+            self.__logger.info('%s', line)
+
+
+class Peer:
+    """
+    Base of the simulated devices, running in their own network namespace.
+    Progress steps and reports are written on standard output for the
+    benchmark to read, nothing else shall be.
+    """
+
+    def run(self) :
+        """Isolate the peer, wait for its links, configure them, and serve."""
+
+        isolate()
+        Peer.step('ready')
+        stdin.readline()
+
+        configure_links(['link set lo up'] + self.links())
+        run(self.serve())
+
+    def links(self) :
+        """Return the ip commands configuring the peer links."""
+        return []
+
+    async def serve(self) :
+        """Serve until the benchmark stops the peer."""
+
+    @staticmethod
+    async def command() :
+        """Wait for the next benchmark command, an empty string meaning the benchmark is gone."""
+        result = await get_running_loop().run_in_executor(None, stdin.readline)
+        return result.strip()
+
+    @staticmethod
+    def step(step) :
+        """Tell the benchmark the peer reached a step."""
+        stdout.write(step + '\n')
+        stdout.flush()
+
+
+class LimelightSimulator(Peer):
+    """
+    Simulated Limelight, streaming video as fast as its link allows and
+    answering results requests at once. Its link is a token bucket with
+    a deep buffer, in which video piles up when nothing shapes it before.
+    """
+
+    def __init__(self, link_rate, index=0):
+        """
+        Constructor.
+
+        Args:
+            link_rate (str): link rate, as a tc rate.
+            index (int): position of the Limelight in the topology, from 0.
+        """
+        self.__link_rate = link_rate
+        topology = sequential(index + 1)
+        self.__limelight = topology[topology.sections()[index]]
+        self.__link = f"{self.__limelight['interface']}-limelight"
+
+    def links(self) :
+        """Return the ip commands configuring the Limelight link."""
+        return [f"addr add {self.__limelight['address']}/24 dev {self.__link}", f'link set {self.__link} up']
+
+    async def serve(self) :
+        """Shape the link, and serve video and results until the benchmark stops."""
+
+        loop = get_running_loop()
+        shaping = await loop.run_in_executor(None, lambda : Popen(['tc', 'qdisc', 'replace', 'dev', self.__link, 'root', 'tbf',
+                                                                  'rate', self.__link_rate, 'burst', '64kb', 'latency', '100ms']).wait())
+        if shaping != 0 : return
+
+        video = await start_server(self.__video, '0.0.0.0', VIDEO_PORT)
+        results = await start_server(self.__results, '0.0.0.0', RESULTS_PORT)
+        Peer.step('started')
+
+        while await Peer.command() not in ('', 'quit') : pass
+
+        video.close()
+        results.close()
+
+    async def __video(self, reader, writer) :
+        """Stream frames until the client goes away."""
+        frame = bytes(FRAME_SIZE)
+        try :
+            while True :
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, OSError) :
+            pass
+        finally :
+            writer.close()
+
+    async def __results(self, reader, writer) :
+        """Answer each results request line with a results block."""
+        answer = bytes(RESULTS_SIZE - 1) + b'\n'
+        try :
+            while len(await reader.readline()) > 0 :
+                writer.write(answer)
+                await writer.drain()
+        except (ConnectionError, OSError) :
+            pass
+        finally :
+            writer.close()
+
+
+class ClientSimulator(Peer):
+    """
+    Simulated Control Hub and laptop. On each benchmark command, the Control
+    Hub polls results through usb0 at a fixed interval for the requested
+    duration, while the laptop reads video streams through eth0 if asked to,
+    and the round trip times are reported. With several Limelights, each of
+    them is polled and watched at once, and reported separately.
+    """
+
+    def __init__(self, streams, interval, env, limelights=1):
+        """
+        Constructor.
+
+        Args:
+            streams (int): number of video streams read by the laptop from each Limelight.
+            interval (float): delay in seconds between two results requests.
+            env (dict): configuration, with the gateway addresses.
+            limelights (int): number of simulated Limelights.
+        """
+        self.__streams = streams
+        self.__interval = interval
+        self.__hub = env['USB_IP_GATEWAY_LINUX']
+        self.__laptop = env['ETH_IP_GATEWAY']
+        self.__limelights = limelights
+
+    def links(self) :
+        """Return the ip commands configuring the Control Hub and laptop links."""
+        commands = []
+        for link, gateway in [('usb0-client', self.__hub), ('eth0-client', self.__laptop)] :
+            commands.append(f"addr add {gateway.rsplit('.', 1)[0]}.10/24 dev {link}")
+            commands.append(f'link set {link} up')
+        return commands
+
+    async def serve(self) :
+        """Run the measures requested by the benchmark."""
+
+        Peer.step('started')
+
+        while True :
+            command = (await Peer.command()).split()
+            if len(command) != 2 : break
+            phase, duration = command[0], float(command[1])
+            report = await gather(*[self.__measure(index, phase == 'video', duration) for index in range(self.__limelights)])
+            stdout.write(dumps(report) + '\n')
+            stdout.flush()
+
+    async def __measure(self, index, video, duration) :
+        """Poll the results of a Limelight for a duration, while reading its video if requested, and report the round trip times."""
+
+        received = [0]
+        streams = []
+        if video :
+            for i in range(self.__streams) :
+                reader, writer = await open_connection(gateway_address(self.__laptop, index), VIDEO_PORT)
+                streams.append((get_running_loop().create_task(self.__watch(reader, received)), writer))
+            # Let the video fill the link before measuring
+            await sleep(1.0)
+
+        rtts = []
+        lost = 0
+        reader, writer = await open_connection(gateway_address(self.__hub, index), RESULTS_PORT)
+        start = monotonic()
+        video_start, video_received = monotonic(), received[0]
+        while monotonic() - start < duration :
+            sent = monotonic()
+            writer.write(b'GET /results\n')
+            try :
+                await wait_for(reader.readline(), TIMEOUT)
+                rtts.append(monotonic() - sent)
+            except WaitTimeout :
+                lost += 1
+                break
+            await sleep(max(0, sent + self.__interval - monotonic()))
+        video_elapsed = monotonic() - video_start
+        video_bytes = received[0] - video_received
+        writer.close()
+
+        for task, stream in streams :
+            task.cancel()
+            stream.close()
+        await gather(*(task for task, stream in streams), return_exceptions=True)
+
+        rtts.sort()
+        result = {
+            'answered'      : len(rtts),
+            'lost'          : lost,
+            'rtt'           : None,
+            'video_mbps'    : 8 * video_bytes / video_elapsed / 1e6,
+        }
+        if len(rtts) > 0 :
+            result['rtt'] = { 'p50' : percentile(rtts, 50), 'p90' : percentile(rtts, 90), 'p99' : percentile(rtts, 99), 'max' : rtts[-1] }
+
+        return result
+
+    @staticmethod
+    async def __watch(reader, received) :
+        """Read a video stream, counting the received bytes."""
+        while True :
+            data = await reader.read(65536)
+            if len(data) == 0 : break
+            received[0] += len(data)
+
+
+# pylint: disable=W0107
+# Main function using Click for command-line options
+@group()
+def main():
+    """Main command group for priority benchmark CLI tool."""
+    pass
+# pylint: enable=W0107, W0719
+
+# pylint: disable=R0913
+@main.command('run')
+@option('--streams', type=int, default=2, help='Number of video streams read by the laptop from each Limelight')
+@option('--duration', type=float, default=10.0, help='Duration of each measure in seconds')
+@option('--interval', type=float, default=0.02, help='Delay between two Control Hub results requests')
+@option('--link-rate', default=None, help='Rate of the simulated Limelight link, LIMELIGHT_LINK_RATE of conf/env by default')
+@option('--output', default=None, help='File to write the json report to')
+@option('--limelights', type=int, default=1, help='Number of simulated Limelights, plugged on eth1, eth2...')
+def run_benchmark(streams, duration, interval, link_rate, output, limelights):
+    """Measure the Control Hub results round trip time under video load, with and without the priority scheme."""
+
+    # Logging is only configured here, the peers standard output being reserved to the benchmark
+    config.fileConfig(logg_conf_path)
+
+    benchmark = PriorityBenchmark()
+    benchmark.configure(streams, duration, interval, link_rate, output, limelights)
+    if not benchmark.run() :
+        raise SystemExit(1)
+
+@main.command('limelight')
+@option('--link-rate')
+@option('--index', type=int, default=0)
+def limelight_simulator(link_rate, index):
+    """Internal : simulate a Limelight from its own namespace."""
+    LimelightSimulator(link_rate, index).run()
+
+@main.command('clients')
+@option('--streams', type=int)
+@option('--interval', type=float)
+@option('--limelights', type=int, default=1)
+def clients_simulator(streams, interval, limelights):
+    """Internal : simulate the Control Hub and the laptop from their own namespace."""
+    ClientSimulator(streams, interval, read_env(env_path), limelights).run()
+
+if __name__ == "__main__":
+    main()
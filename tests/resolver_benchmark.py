@@ -0,0 +1,607 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+Benchmark the LimeNurse name resolver on virtual interfaces,
+with no Pi hardware
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from logging                        import config, getLogger
+from os                             import path, environ
+from sys                            import executable, stdin, stdout, path as sys_path
+from ctypes                         import CDLL, get_errno
+from subprocess                     import Popen, run as run_command, DEVNULL, PIPE, CalledProcessError
+from tempfile                       import TemporaryDirectory
+from collections                    import deque
+from asyncio                        import run, get_running_loop, sleep
+from socket                         import socket, inet_aton, inet_ntoa, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_REUSEADDR, \
+                                           SO_REUSEPORT, IPPROTO_IP, IP_MULTICAST_IF, IP_MULTICAST_TTL
+from struct                         import pack, unpack_from
+from json                           import load, loads, dumps, dump
+from math                           import ceil
+from time                           import monotonic, sleep as wait
+from re                             import search
+from signal                         import SIGTERM
+
+# Click includes
+from click                          import option, group, Choice
+
+# Psutil includes
+from psutil                         import Process
+
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from mdns_probe                     import query, answers, MDNS_ADDRESS, MDNS_PORT, CLASS_IN   # pylint: disable=C0413
+
+# Logger configuration settings
+logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
+env_path = path.normpath(path.join(path.dirname(__file__), '../conf/env'))
+
+# Pi interfaces, with the environment variable holding their gateway address
+# and the resolver option of the name they publish
+INTERFACES = {
+    'usb0' : ('USB_IP_GATEWAY_LINUX', 'usb'),
+    'usb1' : ('USB_IP_GATEWAY_WINDOWS', 'usb'),
+    'eth0' : ('ETH_IP_GATEWAY', 'eth'),
+}
+
+# Linux unshare flag for a new network namespace
+CLONE_NEWNET = 0x40000000
+
+# mDNS unicast response requested bit of the question class (RFC 6762 §5.4)
+CLASS_UNICAST = 0x8000
+
+
+def isolate() :
+    """
+    Move the calling process to a new, empty network namespace, so that the
+    benchmark never touches the interfaces of the host it runs on.
+    Requires root, or running inside ``unshare -rn``.
+    """
+    libc = CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWNET) != 0 :
+        error = get_errno()
+        raise OSError(error, 'Unable to create a network namespace, run as root or inside unshare -rn')
+
+
+def configure_links(commands) :
+    """
+    Apply a list of ip commands at once.
+
+    Args:
+        commands (list): ip commands, without the leading ip.
+    """
+    run_command(['ip', '-batch', '-'], input='\n'.join(commands) + '\n', text=True, check=True, capture_output=True)
+
+
+def percentile(values, rank) :
+    """
+    Return the nearest rank percentile of a sorted list, or None if it is empty.
+
+    Args:
+        values (list): sorted values.
+        rank (float): percentile rank, between 0 and 100.
+    """
+    result = None
+    if len(values) > 0 :
+        result = values[max(0, min(len(values) - 1, int(ceil(rank / 100 * len(values))) - 1))]
+    return result
+
+
+class ResolverBenchmark:
+    """
+    Runs the LimeNurse daemon with its resolver plugin alone on virtual usb0,
+    usb1 and eth0 interfaces, and loads it with mDNS queries from simulated
+    clients.
+
+    The daemon side lives in a private network namespace, holding one end of
+    a veth pair per Pi interface with the configured gateway addresses. The
+    other ends are moved to a second namespace, where a load generator binds
+    one socket per simulated client and queries both published names on all
+    interfaces at a controlled rate.
+
+    The benchmark reports, per interface and per name, the answer latency
+    percentiles and the answers correctness, a name shall only be answered
+    on the interfaces it is published on, with the address of the interface.
+    It also reports the resolver CPU use during the load, and its own metrics.
+    """
+
+    #pylint: disable=R0913, C0301
+    def __init__(self):
+        """Initialize the benchmark by setting up logging."""
+
+        # Initialize logger
+        self.__logger = getLogger()
+        self.__logger.info('%s', 'INITIALIZING RESOLVER BENCHMARK')
+
+        self.__is_ready = False
+        self.__gateways = {}
+        self.__names = {}
+
+    def configure(self, rate, clients, duration, mode, engine, timeout, output) :
+        """
+        Configure the benchmark load.
+
+        Args:
+            rate (int): total number of queries sent per second.
+            clients (int): number of simulated clients per interface.
+            duration (float): duration of the load in seconds.
+            mode (str): legacy for queries from an ephemeral port, answered directly, qu for queries requesting an unicast response.
+            engine (str): resolver responder engine, builtin or zeroconf.
+            timeout (float): delay in seconds after which an expected answer is considered lost.
+            output (str): file to write the json report to, None for logs only.
+        """
+
+        self.__logger.info('%s', 'CONFIGURING RESOLVER BENCHMARK')
+
+        self.__is_ready = False
+        self.__rate = rate
+        self.__clients = clients
+        self.__duration = duration
+        self.__mode = mode
+        self.__engine = engine
+        self.__timeout = timeout
+        self.__output = output
+
+        self.__names = { 'usb' : 'limelight.local', 'eth' : 'limelight.eth.local' }
+
+        # Read the gateway addresses from the environment file
+        with open(env_path, 'r') as file:
+            content = file.read()
+        self.__gateways = {}
+        for interface, (variable, name) in INTERFACES.items() :
+            match = search(variable + r'=([\d\.]+)', content)
+            if match :
+                self.__gateways[interface] = match.group(1)
+
+        if len(self.__gateways) == len(INTERFACES) and 0 < clients < 240 and rate > 0 and duration > 0 :
+            self.__is_ready = True
+        else :
+            self.__logger.error('%s', '--> Invalid benchmark configuration : Giving up')
+
+    def run(self) :
+        """
+        Execute the benchmark and log its report.
+
+        Returns:
+            bool: True if the benchmark ran and all queries were answered as expected, otherwise False.
+        """
+
+        result = False
+
+        if self.__is_ready :
+
+            self.__logger.info('%s', 'RUNNING RESOLVER BENCHMARK')
+
+            daemon = None
+            generator = None
+
+            with TemporaryDirectory(prefix='limenurse-benchmark-') as folder :
+                try :
+                    isolate()
+                    self.__create_links()
+                    self.__logger.info('%s', '--> Virtual interfaces created')
+
+                    daemon = self.__start_daemon(folder)
+                    if not self.__wait_ready(daemon, folder) :
+                        raise RuntimeError('Resolver not ready')
+                    self.__logger.info('%s', '--> Resolver ready')
+
+                    generator, report = self.__load(daemon)
+
+                    daemon.send_signal(SIGTERM)
+                    daemon.wait(10)
+                    report['resolver']['metrics'] = self.__resolver_metrics(folder)
+
+                    result = self.__report(report)
+
+                except (OSError, CalledProcessError, RuntimeError, ValueError) as e :
+                    self.__logger.error('%s', f'--> Benchmark failed : {e}')
+                    self.__dump_log(folder)
+
+                finally :
+                    for process in (generator, daemon) :
+                        if process is not None and process.poll() is None :
+                            process.kill()
+                            process.wait()
+
+        return result
+
+    def __create_links(self) :
+        """Create the Pi interfaces as veth pairs, the client end being named after the Pi end."""
+        commands = ['link set lo up']
+        for interface, gateway in self.__gateways.items() :
+            commands.append(f'link add {interface} type veth peer name {interface}-client')
+            commands.append(f'addr add {gateway}/24 dev {interface}')
+            commands.append(f'link set {interface} up')
+        configure_links(commands)
+
+    def __start_daemon(self, folder) :
+        """Write a configuration with the resolver alone, and start the daemon on it."""
+
+        with open(path.join(folder, 'limenurse.conf'), 'w') as file :
+            file.write('[daemon]\n')
+            file.write(f'log = {path.join(folder, "limenurse.log")}\n')
+            file.write(f'metrics = {path.join(folder, "metrics.json")}\n')
+            file.write('metrics_period = 0.5\n')
+            file.write('[resolver]\n')
+            file.write(f'usb = {self.__names["usb"]}\n')
+            file.write(f'eth = {self.__names["eth"]}\n')
+            file.write(f'engine = {self.__engine}\n')
+            file.write('dns_port = 0\n')
+
+        # Never notify the systemd instance of the host
+        env = dict(environ)
+        env.pop('NOTIFY_SOCKET', None)
+        env.pop('WATCHDOG_USEC', None)
+
+        return Popen([executable, path.join(data_path, 'limenurse.py'), '--config', folder], env=env, stdout=DEVNULL, stderr=DEVNULL)
+
+    def __wait_ready(self, daemon, folder, timeout=30.0) :
+        """Wait until the daemon published the names on all interfaces."""
+
+        result = False
+
+        start = monotonic()
+        while not result and daemon.poll() is None and monotonic() - start < timeout :
+            metrics = self.__resolver_metrics(folder)
+            if metrics.get('resolver_registrations', 0) >= len(self.__gateways) :
+                result = True
+                self.__logger.info('%s', f'--> Names published after {monotonic() - start:.3f}s')
+            else :
+                wait(0.1)
+
+        return result
+
+    def __load(self, daemon) :
+        """
+        Start the load generator in its own namespace, hand it the client ends
+        of the interfaces, and measure the daemon CPU use while it runs.
+        """
+
+        plan = []
+        for interface, gateway in self.__gateways.items() :
+            variable, option = INTERFACES[interface]
+            expected = {}
+            for key, name in self.__names.items() :
+                expected[name] = gateway if key == option else None
+            plan.append({ 'interface' : interface, 'link' : f'{interface}-client', 'gateway' : gateway, 'expected' : expected })
+
+        generator = Popen([executable, path.abspath(__file__), 'load',
+                           '--rate', str(self.__rate), '--clients', str(self.__clients),
+                           '--duration', str(self.__duration), '--mode', self.__mode,
+                           '--timeout', str(self.__timeout), '--plan', dumps(plan)],
+                          stdin=PIPE, stdout=PIPE, text=True)
+
+        # The generator is in its namespace once it says so, links can then be moved to it
+        self.__expect(generator, 'ready')
+        configure_links([f'link set {entry["link"]} netns {generator.pid}' for entry in plan])
+        generator.stdin.write('go\n')
+        generator.stdin.flush()
+
+        resolver = Process(daemon.pid)
+        self.__expect(generator, 'started')
+        start, before = monotonic(), resolver.cpu_times()
+        self.__logger.info('%s', f'--> Sending {self.__rate} queries/s for {self.__duration}s from {self.__clients} clients per interface')
+        self.__expect(generator, 'done')
+        elapsed, after = monotonic() - start, resolver.cpu_times()
+
+        report = loads(generator.stdout.readline())
+        generator.wait(10)
+
+        cpu = (after.user - before.user) + (after.system - before.system)
+        report['resolver'] = {
+            'engine'            : self.__engine,
+            'cpu_seconds'       : cpu,
+            'cpu_percent'       : 100 * cpu / elapsed,
+            'cpu_ms_per_1000'   : 1e6 * cpu / max(1, report['sent']),
+            'rss_bytes'         : resolver.memory_info().rss,
+        }
+
+        return generator, report
+
+    def __expect(self, generator, step) :
+        """Wait for the load generator to reach a step."""
+        line = generator.stdout.readline().strip()
+        if line != step :
+            raise RuntimeError(f'Load generator failed before {step}')
+
+    def __resolver_metrics(self, folder) :
+        """Return the resolver metrics exported by the daemon, or an empty dictionary if not yet exported."""
+        result = {}
+        try :
+            with open(path.join(folder, 'metrics.json'), 'r') as file :
+                result = { key : value for key, value in load(file).items() if key.startswith('resolver_') }
+        except (OSError, ValueError) :
+            pass
+        return result
+
+    def __dump_log(self, folder) :
+        """Log the end of the daemon log, to analyze a failed run."""
+        try :
+            with open(path.join(folder, 'limenurse.log'), 'r') as file :
+                for line in file.readlines()[-20:] :
+                    self.__logger.error('%s', '    ' + line.rstrip())
+        except OSError :
+            pass
+
+    def __report(self, report) :
+        """Log the benchmark report and write it to the output file if any. Return True if all answers were correct."""
+
+        result = True
+
+        for entry in report['interfaces'] :
+            for name, statistics in entry['names'].items() :
+                line = f"--> {entry['interface']} {name} : {statistics['sent']} sent, {statistics['answered']} answered, " + \
+                       f"{statistics['wrong']} wrong, {statistics['lost']} lost"
+                if statistics['latency'] is not None :
+                    line += ' - latency ' + ' '.join(f'{key} {value * 1000:.3f}ms' for key, value in statistics['latency'].items())
+                if statistics['wrong'] > 0 or statistics['lost'] > 0 :
+                    self.__logger.error('%s', line)
+                    result = False
+                else :
+                    self.__logger.info('%s', line)
+
+        latency = report['latency']
+        if latency is not None :
+            self.__logger.info('%s', '--> Overall latency ' + ' '.join(f'{key} {value * 1000:.3f}ms' for key, value in latency.items()))
+
+        resolver = report['resolver']
+        self.__logger.info('%s', f"--> Resolver CPU {resolver['cpu_percent']:.1f}% " + \
+                                 f"({resolver['cpu_ms_per_1000']:.1f}ms per 1000 queries), RSS {resolver['rss_bytes'] / 1e6:.1f}MB")
+        for key, value in sorted(resolver['metrics'].items()) :
+            self.__logger.info('%s', f'    {key} = {value}')
+
+        if self.__output is not None :
+            with open(self.__output, 'w') as file :
+                dump(report, file, indent=1, sort_keys=True)
+            self.__logger.info('%s', f'--> Report written to {self.__output}')
+
+        if result :
+            self.__logger.info('%s', '--> Benchmark sucessfully executed')
+        else :
+            self.__logger.error('%s', '--> Benchmark found incorrect answers - See logs for more info')
+
+        return result
+
+
+class LoadGenerator:
+    """
+    Simulated mDNS clients, sending queries to the resolver from their own
+    network namespace. Progress steps and the final report are written on
+    standard output for the benchmark to read, nothing else shall be.
+    """
+
+    #pylint: disable=R0913, C0301
+    def __init__(self, rate, clients, duration, mode, timeout, plan):
+        """
+        Constructor.
+
+        Args:
+            rate (int): total number of queries sent per second.
+            clients (int): number of simulated clients per interface.
+            duration (float): duration of the load in seconds.
+            mode (str): legacy or qu.
+            timeout (float): delay in seconds after which an expected answer is considered lost.
+            plan (list): interfaces, with the client link name, the gateway address, and the expected answer address of each name.
+        """
+        self.__rate = rate
+        self.__clients = clients
+        self.__duration = duration
+        self.__mode = mode
+        self.__timeout = timeout
+        self.__plan = plan
+
+        # Simulated clients, as (socket, interface entry) tuples
+        self.__sockets = []
+
+        # Queries waiting for an answer, indexed by (client, identifier) in legacy mode and by (client, name) in qu mode
+        self.__pending = {}
+
+        # Statistics indexed by interface then name
+        self.__statistics = {}
+
+    def run(self) :
+        """Isolate the generator, wait for its links, and run the load."""
+
+        isolate()
+        self.__step('ready')
+        stdin.readline()
+
+        commands = ['link set lo up']
+        for entry in self.__plan :
+            prefix = entry['gateway'].rsplit('.', 1)[0]
+            for i in range(self.__clients) :
+                commands.append(f"addr add {prefix}.{10 + i}/24 dev {entry['link']}")
+            commands.append(f"link set {entry['link']} up")
+        configure_links(commands)
+
+        report = run(self.__load())
+
+        self.__step('done')
+        stdout.write(dumps(report) + '\n')
+        stdout.flush()
+
+    async def __load(self) :
+        """Send the queries at the requested rate, then wait for the last answers."""
+
+        loop = get_running_loop()
+
+        for entry in self.__plan :
+            self.__statistics[entry['interface']] = {}
+            for name in entry['expected'] :
+                self.__statistics[entry['interface']][name] = { 'sent' : 0, 'answered' : 0, 'wrong' : 0, 'latencies' : [] }
+
+            prefix = entry['gateway'].rsplit('.', 1)[0]
+            for i in range(self.__clients) :
+                address = f'{prefix}.{10 + i}'
+                sock = socket(AF_INET, SOCK_DGRAM)
+                if self.__mode == 'qu' :
+                    # All qu clients share the mDNS port, each on its own address
+                    sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+                    sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+                sock.bind((address, MDNS_PORT if self.__mode == 'qu' else 0))
+                sock.setsockopt(IPPROTO_IP, IP_MULTICAST_IF, inet_aton(address))
+                sock.setsockopt(IPPROTO_IP, IP_MULTICAST_TTL, 255)
+                sock.setblocking(False)
+                client = len(self.__sockets)
+                loop.add_reader(sock.fileno(), self.__receive, client)
+                self.__sockets.append((sock, entry))
+
+        # Let the links come up on both sides before loading
+        await sleep(0.5)
+
+        names = list(self.__plan[0]['expected'].keys())
+        total = int(self.__rate * self.__duration)
+
+        self.__step('started')
+        start = monotonic()
+        for k in range(total) :
+            delay = start + k / self.__rate - monotonic()
+            if delay > 0 : await sleep(delay)
+            client = k % len(self.__sockets)
+            self.__send(client, names[(k // len(self.__sockets)) % len(names)], k & 0xFFFF)
+        await sleep(self.__timeout)
+
+        for sock, entry in self.__sockets :
+            loop.remove_reader(sock.fileno())
+            sock.close()
+
+        return self.__summarize(total, monotonic() - start)
+
+    def __send(self, client, name, identifier) :
+        """Send a query for a name from a client."""
+
+        sock, entry = self.__sockets[client]
+        packet = query(name, identifier)
+        if self.__mode == 'qu' :
+            packet = packet[:-2] + pack('!H', CLASS_IN | CLASS_UNICAST)
+            self.__pending.setdefault((client, name), deque()).append(monotonic())
+        else :
+            self.__pending[(client, identifier)] = (name, monotonic())
+
+        try :
+            sock.sendto(packet, (MDNS_ADDRESS, MDNS_PORT))
+            self.__statistics[entry['interface']][name]['sent'] += 1
+        except OSError :
+            pass
+
+    def __receive(self, client) :
+        """Match the answers received by a client with its pending queries."""
+
+        sock, entry = self.__sockets[client]
+        while True :
+            try :
+                packet, sender = sock.recvfrom(9000)
+            except (BlockingIOError, OSError) :
+                break
+            received = monotonic()
+
+            for name, address in answers(packet) :
+                sent = None
+                if self.__mode == 'qu' :
+                    queue = self.__pending.get((client, name))
+                    if queue : sent = queue.popleft()
+                else :
+                    identifier = unpack_from('!H', packet)[0]
+                    pending = self.__pending.get((client, identifier))
+                    if pending is not None and pending[0] == name :
+                        sent = self.__pending.pop((client, identifier))[1]
+
+                statistics = self.__statistics[entry['interface']].get(name)
+                if sent is None or statistics is None : continue
+                statistics['answered'] += 1
+                statistics['latencies'].append(received - sent)
+                if inet_ntoa(address) != entry['expected'][name] : statistics['wrong'] += 1
+
+    def __summarize(self, total, elapsed) :
+        """Build the load report from the statistics."""
+
+        result = { 'mode' : self.__mode, 'rate' : self.__rate, 'sent' : 0, 'elapsed' : elapsed, 'interfaces' : [] }
+
+        everything = []
+        for entry in self.__plan :
+            names = {}
+            for name, statistics in self.__statistics[entry['interface']].items() :
+                latencies = sorted(statistics.pop('latencies'))
+                everything.extend(latencies)
+                if entry['expected'][name] is None :
+                    # Name not published on this interface, any answer is wrong
+                    statistics['wrong'] = statistics['answered']
+                    statistics['lost'] = 0
+                else :
+                    statistics['lost'] = statistics['sent'] - statistics['answered']
+                statistics['latency'] = LoadGenerator.latency(latencies)
+                names[name] = statistics
+                result['sent'] += statistics['sent']
+            result['interfaces'].append({ 'interface' : entry['interface'], 'names' : names })
+
+        result['latency'] = LoadGenerator.latency(sorted(everything))
+
+        return result
+
+    @staticmethod
+    def latency(values) :
+        """Return the latency percentiles of a sorted list, or None if it is empty."""
+        result = None
+        if len(values) > 0 :
+            result = { 'p50' : percentile(values, 50), 'p90' : percentile(values, 90), 'p99' : percentile(values, 99), 'max' : values[-1] }
+        return result
+
+    @staticmethod
+    def __step(step) :
+        """Tell the benchmark the generator reached a step."""
+        stdout.write(step + '\n')
+        stdout.flush()
+
+
+# pylint: disable=W0107
+# Main function using Click for command-line options
+@group()
+def main():
+    """Main command group for resolver benchmark CLI tool."""
+    pass
+# pylint: enable=W0107, W0719
+
+# pylint: disable=R0913
+@main.command('run')
+@option('--rate', type=int, default=1000, help='Total number of queries per second')
+@option('--clients', type=int, default=10, help='Number of simulated clients per interface')
+@option('--duration', type=float, default=10.0, help='Duration of the load in seconds')
+@option('--mode', type=Choice(['legacy', 'qu']), default='legacy', help='Legacy unicast queries or queries requesting an unicast response')
+@option('--engine', type=Choice(['builtin', 'zeroconf']), default='builtin', help='Resolver responder engine')
+@option('--timeout', type=float, default=1.0, help='Delay after which an answer is considered lost')
+@option('--output', default=None, help='File to write the json report to')
+def run_benchmark(rate, clients, duration, mode, engine, timeout, output):
+    """Run the resolver benchmark with specified load parameters."""
+
+    # Logging is only configured here, the load generator standard output being reserved to the benchmark
+    config.fileConfig(logg_conf_path)
+
+    benchmark = ResolverBenchmark()
+    benchmark.configure(rate, clients, duration, mode, engine, timeout, output)
+    if not benchmark.run() :
+        raise SystemExit(1)
+
+@main.command('load')
+@option('--rate', type=int)
+@option('--clients', type=int)
+@option('--duration', type=float)
+@option('--mode')
+@option('--timeout', type=float)
+@option('--plan')
+def load_generator(rate, clients, duration, mode, timeout, plan):
+    """Internal : generate the load from the benchmark clients namespace."""
+
+    generator = LoadGenerator(rate, clients, duration, mode, timeout, loads(plan))
+    generator.run()
+
+if __name__ == "__main__":
+    main()
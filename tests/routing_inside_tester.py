@@ -75,20 +75,63 @@ class RoutingInsideTester:
                 self.__logger.info("--> limelight-routing.service is active")
             else :
                 self.__logger.error("--> limelight-routing.service is not active")
-                result = False   
+                result = False
+
+            flowtable = RoutingInsideTester.run_command(f"nft list flowtable ip limelight fastpath")
+            if "eth1" in flowtable :
+                self.__logger.info("--> Limelight flowtable fast path is loaded on eth1")
+            else :
+                self.__logger.error("--> Limelight flowtable fast path is not loaded on eth1")
+                result = False
+
+            if path.isfile("/etc/limenurse/topology.ini") :
+                self.__logger.info("--> Limelight topology is configured")
+            else :
+                self.__logger.error("--> Limelight topology is not configured")
+                result = False
+
+            drift = RoutingInsideTester.run_command(f"/usr/local/bin/limelight-routing.sh --check > /dev/null 2>&1 && echo up-to-date")
+            if drift == "up-to-date" :
+                self.__logger.info("--> Live routing ruleset and traffic priority match the configuration")
+            else :
+                self.__logger.error("--> Live routing ruleset or traffic priority drifted from the configuration")
+                result = False
 
-            running = RoutingInsideTester.is_python_command_running("udp_forwarder.py")
+            status = RoutingInsideTester.run_command(f"/usr/local/bin/limelight-routing.sh --status")
+            for line in status.splitlines() :
+                if 'Offloaded flows' in line :
+                    self.__logger.info("--> " + line.replace('➡️', '').strip())
+
+            running = RoutingInsideTester.is_python_command_running("limenurse.py")
             if running :
-                self.__logger.info("--> Python forwarder is running")
+                self.__logger.info("--> Python limenurse daemon is running")
+            else :
+                self.__logger.error("--> Python limenurse daemon is not running")
+                result = False   
+
+            if path.isfile("/etc/limenurse/forwarder.conf") :
+                self.__logger.info("--> UDP forwarder plugin is configured")
+            else :
+                self.__logger.error("--> UDP forwarder plugin is not configured")
+                result = False   
+
+            if path.isfile("/etc/limenurse/guard.conf") :
+                self.__logger.info("--> Latency guard plugin is configured")
+            else :
+                self.__logger.error("--> Latency guard plugin is not configured")
+                result = False   
+
+            if path.isfile("/etc/limenurse/accounting.conf") :
+                self.__logger.info("--> Flow accounting plugin is configured")
             else :
-                self.__logger.error("--> Python forwarder is not running")
+                self.__logger.error("--> Flow accounting plugin is not configured")
                 result = False   
 
-            has_error = RoutingInsideTester.file_contains_error("/var/log/udp_forwarder.log")
+            has_error = RoutingInsideTester.file_contains_error("/var/log/limenurse.log")
             if not has_error :
-                self.__logger.info("--> No error in forwarder log")
+                self.__logger.info("--> No error in limenurse log")
             else :
-                self.__logger.error("--> Error found in forwarder log")
+                self.__logger.error("--> Error found in limenurse log")
                 result = False   
 
             return result
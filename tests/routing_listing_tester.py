@@ -0,0 +1,212 @@
+# -------------------------------------------------------
+# Copyright (c) [2025] Nadege Lemperiere
+# All rights reserved
+# -------------------------------------------------------
+"""
+Check the routing compiler against a listing of the ruleset
+it applied on the Pi, offline
+"""
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @19th October 2026
+# Latest revision: 19th October 2026
+# -------------------------------------------------------
+
+# System includes
+from logging                        import config, getLogger
+from os                             import path, makedirs
+from sys                            import path as sys_path
+from shutil                         import copyfile
+from subprocess                     import run, PIPE
+from socket                         import gethostname
+from json                           import load as load_json, dump
+
+# Click includes
+from click                          import option, group
+
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from routing_compiler               import RoutingCompiler, TABLE     # pylint: disable=C0413
+from topology                       import read_env, load            # pylint: disable=C0413
+
+# Logger configuration settings
+logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
+fixtures_path = path.normpath(path.join(path.dirname(__file__), 'data/routing'))
+
+
+class RoutingListingTester:
+    """
+    Check that the ruleset compiled from a configuration reads back unchanged
+    from the nft listing of the same ruleset loaded in the kernel.
+
+    The fixture is the configuration the ruleset was applied with on the Pi,
+    the interfaces present then, and the nft -s listing of the limelight
+    table afterwards. nft lists some rules differently from the way they were
+    written, hence the compiler normalization : once parsed, the listing
+    shall show no drift and need no transaction, otherwise every restart of
+    the routing service would replace rules which are already up to date.
+    """
+
+    #pylint: disable=R0913, C0301
+    def __init__(self):
+        """Initialize the tester by setting up logging."""
+
+        # Initialize logger
+        self.__logger = getLogger()
+        self.__logger.info('%s', 'INITIALIZING ROUTING LISTING TEST')
+
+        self.__compiler = RoutingCompiler()
+        self.__interfaces = []
+        self.__listing = ''
+        self.__is_ready = False
+
+    def configure(self, fixtures) :
+        """
+        Load the fixture.
+
+        Args:
+            fixtures (str): directory with the env and topology.ini configuration, the capture.json
+                            description of the capture and the listing.nft listing.
+        """
+
+        self.__logger.info('%s', 'CONFIGURING ROUTING LISTING TEST')
+
+        self.__is_ready = False
+
+        with open(path.join(fixtures, 'capture.json'), 'r', encoding='utf-8') as file :
+            capture = load_json(file)
+        self.__interfaces = capture['interfaces']
+        self.__logger.info('%s', f"--> Listing from {capture['origin']}, with {capture['nft']}")
+
+        with open(path.join(fixtures, 'listing.nft'), 'r', encoding='utf-8') as file :
+            self.__listing = file.read()
+
+        self.__is_ready = self.__compiler.configure(read_env(path.join(fixtures, 'env')), load(path.join(fixtures, 'topology.ini')))
+
+    def run(self) :
+        """
+        Compare the compiled ruleset with the parsed listing.
+
+        Returns:
+            bool: True if the listing shows no drift and needs no transaction, otherwise False.
+        """
+
+        result = False
+
+        if self.__is_ready :
+
+            result = True
+
+            self.__logger.info('%s', 'RUNNING ROUTING LISTING TEST')
+
+            desired = self.__compiler.compile(self.__interfaces)
+            listed = self.__compiler.parse(self.__listing)
+
+            for chain, content in desired['chains'].items() :
+                count = len(listed['chains'].get(chain, { 'rules' : [] })['rules'])
+                self.__logger.info('%s', f'--> Chain {chain} : {len(content["rules"])} rules compiled, {count} listed')
+
+            drift = self.__compiler.diff(desired, listed)
+            if len(drift) == 0 :
+                self.__logger.info('%s', '--> Listing shows no drift from the compiled ruleset')
+            else :
+                for line in drift :
+                    self.__logger.error('%s', f'--> Drift : {line}')
+                result = False
+
+            transaction = self.__compiler.transaction(desired, listed)
+            if len(transaction) == 0 :
+                self.__logger.info('%s', '--> Listing needs no transaction')
+            else :
+                for line in transaction.splitlines() :
+                    self.__logger.error('%s', f'--> Transaction : {line}')
+                result = False
+
+        if result :
+            self.__logger.info('%s', '--> Test sucessfully executed')
+        else :
+            self.__logger.error('%s', '--> Test failed - See logs for more info')
+
+        return result
+
+    @staticmethod
+    def capture(env, topology, fixtures) :
+        """
+        Apply the compiled ruleset on the Pi and record its listing as the fixture. Needs root.
+
+        Args:
+            env (str): env file the routing service uses.
+            topology (str): topology file the routing service uses.
+            fixtures (str): directory to record the fixture in.
+
+        Returns:
+            bool: True if the ruleset was applied and recorded, otherwise False.
+        """
+
+        logger = getLogger()
+        result = False
+
+        compiler = RoutingCompiler()
+        # Interfaces present on the Pi, as the flowtable devices they become
+        interfaces = compiler.compile()['devices'] if compiler.configure(read_env(env), load(topology)) else []
+        if len(interfaces) > 0 and compiler.apply(interfaces) :
+            listing = run(['nft', '-s', 'list', 'table'] + TABLE.split(), stdout=PIPE, stderr=PIPE, text=True)
+            version = run(['nft', '--version'], stdout=PIPE, stderr=PIPE, text=True)
+            if listing.returncode == 0 :
+                makedirs(fixtures, exist_ok=True)
+                with open(path.join(fixtures, 'listing.nft'), 'w', encoding='utf-8') as file :
+                    file.write(listing.stdout)
+                with open(path.join(fixtures, 'capture.json'), 'w', encoding='utf-8') as file :
+                    dump({ 'origin' : gethostname(), 'nft' : version.stdout.strip(), 'interfaces' : interfaces }, file, indent=1)
+                    file.write('\n')
+                copyfile(env, path.join(fixtures, 'env'))
+                copyfile(topology, path.join(fixtures, 'topology.ini'))
+                logger.info('%s', f'--> Listing of {len(interfaces)} interfaces recorded in {fixtures}')
+                result = True
+            else :
+                logger.error('%s', f'--> Failed to list the routing ruleset : {listing.stderr.strip()}')
+        else :
+            logger.error('%s', '--> Failed to apply the routing ruleset')
+
+        return result
+
+
+# pylint: disable=W0107
+# Main function using Click for command-line options
+@group()
+def main():
+    """Main command group for routing listing tester CLI tool."""
+    pass
+# pylint: enable=W0107, W0719
+
+@main.command('check')
+@option('--fixtures', default=fixtures_path, help='Directory of the recorded listing and its configuration')
+def check_listing(fixtures):
+    """Check the compiler against the recorded listing."""
+
+    config.fileConfig(logg_conf_path)
+
+    tester = RoutingListingTester()
+    tester.configure(fixtures)
+    if not tester.run() :
+        raise SystemExit(1)
+
+@main.command('capture')
+@option('--env', default='/etc/limenurse/routing.env', help='Env file of the routing service')
+@option('--topology', default='/etc/limenurse/topology.ini', help='Topology file of the routing service')
+@option('--fixtures', default=fixtures_path, help='Directory to record the listing and its configuration in')
+def capture_listing(env, topology, fixtures):
+    """Apply the ruleset on the Pi, record its listing and check it."""
+
+    config.fileConfig(logg_conf_path)
+
+    if not RoutingListingTester.capture(env, topology, fixtures) :
+        raise SystemExit(1)
+
+    tester = RoutingListingTester()
+    tester.configure(fixtures)
+    if not tester.run() :
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -13,15 +13,22 @@ of view
 
 from logging                        import getLogger
 from os                             import path
+from sys                            import path as sys_path
 from re                             import search
 from http                           import client
 
 # Limelight includes
 from limelight                      import discover_limelights, Limelight
 
+# Local includes
+data_path = path.normpath(path.join(path.dirname(__file__), '../data'))
+sys_path.append(data_path)
+from topology                       import Topology, read_env, load                    # pylint: disable=C0413
+
 # Logger configuration settings
 logg_conf_path = path.normpath(path.join(path.dirname(__file__), '../conf/logging.conf'))
 env_path = path.normpath(path.join(path.dirname(__file__), '../conf/env'))
+topology_path = path.normpath(path.join(path.dirname(__file__), '../conf/topology.ini'))
 limelight_descriptors_path = path.normpath(path.join(path.dirname(__file__), '../data/limelight-gadget.json'))
 
 class RoutingOutsideTester:
@@ -55,11 +62,10 @@ class RoutingOutsideTester:
 
         self.__is_ready = False
 
-        self.__reference_eth_ip = ""
-        with open(env_path, 'r') as file:
-            match = search(r'ETH_IP_GATEWAY=([\d\.]+)', file.read())
-            if match : 
-                self.__reference_eth_ip = match.group(1)
+        # Ethernet gateway IP address moved to the robot network in fleet mode, where the ethernet names carry the robot id
+        topology = Topology()
+        self.__reference_eth_ip = read_env(env_path).get('ETH_IP_GATEWAY', '')
+        self.__eth_name = topology.limelights()[0].eth if topology.configure(read_env(env_path), load(topology_path)) else "limelight.eth.local"
 
         # Read the USB gateway IP address from the environment file
         usb_linux_ip = ""
@@ -78,7 +84,7 @@ class RoutingOutsideTester:
         self.__shall_test_names = True
         
         if(platform == 'windows') : 
-            self.__shall_test_names = False
+            self.__shall_test_names = True
             self.__reference_usb_ip = usb_windows_ip
         elif (platform == 'linux') : 
             self.__shall_test_names = True
@@ -140,7 +146,7 @@ class RoutingOutsideTester:
                 result = False
 
         if self.__shall_test_names :
-            for name in ["limelight.eth.local", "limelight.local"]:
+            for name in [self.__eth_name, "limelight.local"]:
                 try:
                     conn = client.HTTPConnection(name, 5801, timeout=2)
                     conn.request("GET", "/")